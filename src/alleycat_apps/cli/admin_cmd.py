@@ -7,9 +7,15 @@ Author: Andrew Watkins <andrew@groat.nz>
 """
 
 import asyncio
+import enum
 import logging
+import shlex
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Any
 
 import typer
 from rich.console import Console
@@ -18,7 +24,11 @@ from rich.table import Table
 
 from alleycat_core import logging as alleycat_logging
 from alleycat_core.config.settings import Settings
+from alleycat_core.kb.base import KBProvider
+from alleycat_core.kb.gc import GC_PURPOSES, OrphanReport, delete_orphans, find_orphans
+from alleycat_core.kb.index import KBFile, KBIndex, file_hash
 from alleycat_core.kb.provider import get_kb_provider
+from alleycat_core.usage import UsageLedger
 
 app = typer.Typer(
     help="Alleycat admin commands",
@@ -30,14 +40,32 @@ kb_app = typer.Typer(
     no_args_is_help=True,
 )
 app.add_typer(kb_app, name="kb")
+files_app = typer.Typer(
+    help="Account file commands",
+    no_args_is_help=True,
+)
+app.add_typer(files_app, name="files")
 
 console = Console()
 
+
+class UsageGroup(enum.StrEnum):
+    """Grouping options for usage statistics."""
+
+    DAY = "day"
+    MODEL = "model"
+    TAG = "tag"
+
+
 # Common options
 verbose_option = typer.Option(False, "--verbose", "-v", help="Enable verbose debug output")
 
 # Define arguments at module level
 kb_add_file_paths_arg = typer.Argument(..., help="Paths to files to add")
+usage_by_option = typer.Option(UsageGroup.DAY, "--by", "-b", help="Group usage by day, model or tag")
+usage_days_option = typer.Option(30, "--days", "-d", help="Only include requests from the last N days (0 for all)")
+usage_model_option = typer.Option(None, "--model", help="Only include requests for this model")
+usage_tag_option = typer.Option(None, "--tag", help="Only include requests with this tag")
 
 
 @app.callback()
@@ -94,6 +122,255 @@ def _init_config() -> None:
     console.print(f"[green]Configuration saved to {settings.config_file}[/green]")
 
 
+@app.command("usage", help="Show token usage and latency statistics from the usage ledger")
+def usage_cmd(
+    by: UsageGroup = usage_by_option,
+    days: int = usage_days_option,
+    model: str | None = usage_model_option,
+    tag: str | None = usage_tag_option,
+) -> None:
+    """Show aggregated usage statistics."""
+    settings = Settings()
+    if settings.usage_db is None or not Path(settings.usage_db).exists():
+        console.print("[yellow]No usage has been recorded yet.[/yellow]")
+        return
+
+    ledger = UsageLedger(Path(settings.usage_db))
+    try:
+        since = time.time() - days * 86400 if days > 0 else None
+        summaries = ledger.summarize(by.value, since=since, model=model, tag=tag)
+    finally:
+        ledger.close()
+
+    if not summaries:
+        console.print("[yellow]No usage recorded for the selected period.[/yellow]")
+        return
+
+    table = Table(title=f"Usage by {by.value}:")
+    table.add_column(by.value.capitalize(), style="cyan", no_wrap=True)
+    table.add_column("Requests", justify="right")
+    table.add_column("Prompt", justify="right")
+    table.add_column("Completion", justify="right")
+    table.add_column("Total", justify="right", style="green")
+    table.add_column("Cached", justify="right")
+    table.add_column("Cache hit", justify="right")
+    table.add_column("p50 ms", justify="right", style="magenta")
+    table.add_column("p95 ms", justify="right", style="magenta")
+    table.add_column("Tokens/s", justify="right", style="yellow")
+    table.add_column("Stalls", justify="right")
+
+    for summary in summaries:
+        table.add_row(
+            summary.key,
+            str(summary.requests),
+            str(summary.prompt_tokens),
+            str(summary.completion_tokens),
+            str(summary.total_tokens),
+            str(summary.cached_tokens),
+            f"{summary.cache_hit_rate:.0%}",
+            f"{summary.p50_latency_ms:.0f}",
+            f"{summary.p95_latency_ms:.0f}",
+            f"{summary.tokens_per_second:.1f}",
+            str(summary.stalls),
+        )
+
+    console.print(table)
+
+
+def open_kb_index(settings: Settings) -> KBIndex:
+    """Open the KB file index, moving any file mappings still in config.yml into it."""
+    if settings.kb_index is None:
+        raise ValueError("No KB index path configured")
+    index = KBIndex(settings.kb_index)
+    if settings.kb_files:
+        count = index.import_mapping(settings.kb_files)
+        settings.kb_files = {}
+        settings.save_to_file()
+        console.print(f"[yellow]Moved {count} KB file mappings from the config file to {settings.kb_index}[/yellow]")
+    return index
+
+
+class KBSession:
+    """Knowledge base operations sharing one KB provider and KB index.
+
+    The provider is created on first use, so a session that only reads settings
+    never connects. Changes to the knowledge bases are made to settings, which
+    the caller saves.
+    """
+
+    def __init__(self, settings: Settings):
+        """Initialize the session.
+
+        Args:
+            settings: Application settings
+
+        """
+        self.settings = settings
+        self._provider: KBProvider | None = None
+        self._provider_lock = asyncio.Lock()
+        self._index: KBIndex | None = None
+
+    @property
+    def index(self) -> KBIndex:
+        """The KB file index, opened on first use."""
+        if self._index is None:
+            self._index = open_kb_index(self.settings)
+        return self._index
+
+    async def provider(self) -> KBProvider:
+        """Get the KB provider, creating it on first use."""
+        async with self._provider_lock:
+            if self._provider is None:
+                self._provider = await get_kb_provider(self.settings, self.index)
+        return self._provider
+
+    async def close(self) -> None:
+        """Close the provider and the index."""
+        if self._provider is not None:
+            await self._provider.close()
+            self._provider = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def vector_store_id(self, name: str) -> str:
+        """Get the vector store ID of a knowledge base.
+
+        Raises:
+            ValueError: If the knowledge base does not exist
+
+        """
+        if name not in self.settings.knowledge_bases:
+            raise ValueError(f"Knowledge base '{name}' does not exist")
+        return self.settings.knowledge_bases[name]
+
+    async def create(self, name: str) -> str:
+        """Create a knowledge base, making it the default if it is the first.
+
+        Returns:
+            The vector store ID
+
+        Raises:
+            ValueError: If the knowledge base already exists
+
+        """
+        if name in self.settings.knowledge_bases:
+            raise ValueError(f"Knowledge base '{name}' already exists")
+        result = await (await self.provider()).create_vector_store(name=name)
+        vs_id: str = result["id"]
+        self.settings.knowledge_bases[name] = vs_id
+        if self.settings.default_kb is None:
+            self.settings.default_kb = name
+        return vs_id
+
+    async def files(self, name: str) -> list[tuple[str, str, str]]:
+        """List the files of a knowledge base.
+
+        Files added outside alleycat are recorded in the index, so they are counted
+        and can be looked up.
+
+        Returns:
+            The ID, path and status of each file
+
+        """
+        vs_id = self.vector_store_id(name)
+        files = await (await self.provider()).list_files(vs_id)
+        if self.index.add_missing(vs_id, [file["id"] for file in files]):
+            console.print("[yellow]Found files without path information. Updating the KB index...[/yellow]")
+        vs_files = self.index.files(vs_id)
+        return [
+            (file["id"], vs_files.get(file["id"], "Unknown path"), file.get("status", "Available")) for file in files
+        ]
+
+    async def remove(self, name: str) -> None:
+        """Remove a knowledge base and its files.
+
+        Raises:
+            ValueError: If the knowledge base does not exist or the provider fails to remove it
+
+        """
+        vs_id = self.vector_store_id(name)
+        if not await (await self.provider()).delete_vector_store(vs_id):
+            raise ValueError(f"Failed to remove knowledge base '{name}'")
+        kb_dict = dict(self.settings.knowledge_bases)
+        kb_dict.pop(name, None)
+        self.settings.knowledge_bases = kb_dict
+        self.index.remove_store(vs_id)
+        if self.settings.default_kb == name:
+            self.settings.default_kb = None
+
+    async def add(self, name: str, paths: list[Path]) -> int:
+        """Add files to a knowledge base, recording them in the index with a content hash.
+
+        Returns:
+            The number of files added
+
+        """
+        vs_id = self.vector_store_id(name)
+        logging.debug("Adding %d files to vector store %s", len(paths), vs_id)
+        results = await (await self.provider()).add_files(vs_id, paths)
+        logging.debug("Results from adding files: %s", results)
+
+        kb_files: list[KBFile] = []
+        for result in results:
+            file_path = Path(result["file_path"])
+            digest = await asyncio.to_thread(file_hash, file_path) if file_path.is_file() else None
+            kb_files.append(KBFile(vector_store_id=vs_id, file_id=result["file_id"], path=str(file_path), hash=digest))
+            logging.debug("Added file ID %s -> %s", result["file_id"], file_path)
+        self.index.add(*kb_files)
+        return len(results)
+
+    async def delete(self, name: str, file_id: str) -> None:
+        """Delete a file from a knowledge base.
+
+        Raises:
+            ValueError: If the knowledge base does not exist or the provider fails to delete the file
+
+        """
+        vs_id = self.vector_store_id(name)
+        if not await (await self.provider()).delete_file(vs_id, file_id):
+            raise ValueError(f"Failed to remove file '{file_id}' from knowledge base '{name}'")
+        self.index.remove(vs_id, file_id)
+
+
+def run_kb[T](settings: Settings, operation: Callable[[KBSession], Awaitable[T]]) -> T:
+    """Run an operation in a KB session of its own."""
+
+    async def run() -> T:
+        session = KBSession(settings)
+        try:
+            return await operation(session)
+        finally:
+            await session.close()
+
+    return asyncio.run(run())
+
+
+def kbs_table(settings: Settings, index: KBIndex) -> Table:
+    """Build a table of the knowledge bases."""
+    table = Table(title="Knowledge Bases:")
+    table.add_column("Name", style="cyan")
+    table.add_column("Vector Store ID", style="green")
+    table.add_column("File Count", style="magenta")
+    table.add_column("Default", style="yellow")
+
+    for name, vs_id in settings.knowledge_bases.items():
+        is_default = "(default)" if settings.default_kb == name else ""
+        table.add_row(name, vs_id, str(index.count(vs_id)), is_default)
+    return table
+
+
+def files_table(name: str, files: list[tuple[str, str, str]]) -> Table:
+    """Build a table of the files in a knowledge base."""
+    table = Table(title=f"Files in knowledge base '{name}':")
+    table.add_column("File ID", style="cyan")
+    table.add_column("File Path", style="green")
+    table.add_column("Status", style="yellow")
+    for file_id, file_path, file_status in files:
+        table.add_row(file_id, file_path, file_status)
+    return table
+
+
 @kb_app.callback()
 def kb_main(verbose: bool = verbose_option) -> None:
     """Knowledge base management commands."""
@@ -115,17 +392,7 @@ def kb_create(name: str, verbose: bool = verbose_option) -> None:
         return
 
     try:
-        # Create the vector store
-        result = asyncio.run(_create_vector_store(name, settings))
-        vs_id = result["id"]
-
-        # Update settings
-        settings.knowledge_bases[name] = vs_id
-        settings.kb_files[vs_id] = {}
-
-        # Set as default if it's the first KB
-        if settings.default_kb is None:
-            settings.default_kb = name
+        vs_id = run_kb(settings, lambda session: session.create(name))
 
         # Save settings
         settings.save_to_file()
@@ -139,14 +406,6 @@ def kb_create(name: str, verbose: bool = verbose_option) -> None:
         console.print(f"[red]Error creating knowledge base: {e}[/red]")
 
 
-async def _create_vector_store(name: str, settings: Settings) -> dict[str, Any]:
-    """Create a vector store for the knowledge base."""
-    provider = await get_kb_provider(settings)
-    result = await provider.create_vector_store(name=name)
-    await provider.close()
-    return result
-
-
 @kb_app.command("ls", help="List knowledge bases or files in a knowledge base")
 def kb_ls(
     name: str | None = typer.Option(None, "--name", help="Name of knowledge base to list files for"),
@@ -168,62 +427,9 @@ def kb_ls(
         console.print(f"[red]Knowledge base '{name}' does not exist[/red]")
         return
 
-    # Get the vector store ID
-    vs_id = settings.knowledge_bases[name]
-
     try:
-        # List files in the KB
-        files = asyncio.run(_list_kb_files(vs_id, settings))
-
-        # Create a table to display the files
-        table = Table(title=f"Files in knowledge base '{name}':")
-        table.add_column("File ID", style="cyan")
-        table.add_column("File Path", style="green")
-        table.add_column("Status", style="yellow")
-
-        # Get existing file paths from settings
-        kb_files_dict = dict(settings.kb_files)
-        vs_files = kb_files_dict.get(vs_id, {})
-
-        # Check if we need to update file information
-        unknown_files = False
-        for file in files:
-            file_id = file["id"]
-            if file_id not in vs_files:
-                unknown_files = True
-                break
-
-        # Update file information if needed
-        if unknown_files:
-            console.print("[yellow]Found files without path information. Updating settings...[/yellow]")
-
-            # Ensure the vs_id exists in kb_files
-            if vs_id not in kb_files_dict:
-                kb_files_dict[vs_id] = {}
-
-            # Update the file information with what we have
-            for file in files:
-                file_id = file["id"]
-                # If we don't have this file in settings, add it with Unknown path
-                # We'll keep existing paths if we have them
-                if file_id not in kb_files_dict[vs_id]:
-                    kb_files_dict[vs_id][file_id] = "Unknown (added to KB)"
-
-            # Update settings and save
-            settings.kb_files = kb_files_dict
-            settings.save_to_file()
-
-            # Update our local reference after saving
-            vs_files = kb_files_dict.get(vs_id, {})
-
-        # Add the files to the table
-        for file in files:
-            file_id = file["id"]
-            file_path = vs_files.get(file_id, "Unknown path")
-            file_status = file.get("status", "Available")
-            table.add_row(file_id, file_path, file_status)
-
-        console.print(table)
+        files = run_kb(settings, lambda session: session.files(name))
+        console.print(files_table(name, files))
 
     except Exception as e:
         console.print(f"[red]Error listing files: {e}[/red]")
@@ -234,27 +440,11 @@ def kb_ls(
 
 def _list_all_kbs(settings: Settings) -> None:
     """List all knowledge bases."""
-    table = Table(title="Knowledge Bases:")
-    table.add_column("Name", style="cyan")
-    table.add_column("Vector Store ID", style="green")
-    table.add_column("File Count", style="magenta")
-    table.add_column("Default", style="yellow")
-
-    # Add the KBs to the table
-    for name, vs_id in settings.knowledge_bases.items():
-        file_count = len(settings.kb_files.get(vs_id, {}))
-        is_default = "(default)" if settings.default_kb == name else ""
-        table.add_row(name, vs_id, str(file_count), is_default)
-
-    console.print(table)
-
-
-async def _list_kb_files(vs_id: str, settings: Settings) -> list[dict[str, Any]]:
-    """List files in a knowledge base."""
-    provider = await get_kb_provider(settings)
-    files = await provider.list_files(vs_id)
-    await provider.close()
-    return files
+    index = open_kb_index(settings)
+    try:
+        console.print(kbs_table(settings, index))
+    finally:
+        index.close()
 
 
 @kb_app.command("rm", help="Remove a knowledge base")
@@ -274,55 +464,25 @@ def kb_rm(
         console.print(f"[red]Knowledge base '{name}' does not exist[/red]")
         return
 
-    # Get the vector store ID
-    vs_id = settings.knowledge_bases[name]
-
     # Confirm removal
     if not force and not Confirm.ask(f"Are you sure you want to remove knowledge base '{name}'?"):
         console.print("Aborted")
         return
 
     try:
-        # Remove the vector store
-        result = asyncio.run(_delete_vector_store(vs_id, settings))
-
-        if result:
-            # Update settings - use dictionary operations
-            kb_dict = dict(settings.knowledge_bases)
-            kb_files_dict = dict(settings.kb_files)
-
-            # Remove from dictionaries
-            if name in kb_dict:
-                del kb_dict[name]
-                settings.knowledge_bases = kb_dict
-
-            if vs_id in kb_files_dict:
-                del kb_files_dict[vs_id]
-                settings.kb_files = kb_files_dict
+        run_kb(settings, lambda session: session.remove(name))
 
-            # Clear default KB if it was this one
-            if settings.default_kb == name:
-                settings.default_kb = None
-
-            # Save settings
-            settings.save_to_file()
+        # Save settings
+        settings.save_to_file()
 
-            console.print(f"[green]Removed knowledge base '{name}'[/green]")
-        else:
-            console.print(f"[red]Failed to remove knowledge base '{name}'[/red]")
+        console.print(f"[green]Removed knowledge base '{name}'[/green]")
 
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
     except Exception as e:
         console.print(f"[red]Error removing knowledge base: {e}[/red]")
 
 
-async def _delete_vector_store(vs_id: str, settings: Settings) -> bool:
-    """Delete a vector store."""
-    provider = await get_kb_provider(settings)
-    result = await provider.delete_vector_store(vs_id)
-    await provider.close()
-    return result
-
-
 @kb_app.command("add", help="Add files to a knowledge base")
 def kb_add(
     name: str,
@@ -345,10 +505,6 @@ def kb_add(
         logging.debug(f"Available KBs: {list(dict(settings.knowledge_bases).keys())}")
         return
 
-    # Get the vector store ID
-    vs_id = settings.knowledge_bases[name]
-    logging.debug(f"Using vector store ID: {vs_id}")
-
     # Convert file paths to Path objects and validate they exist
     paths: list[Path] = []
     for path_str in file_paths:
@@ -369,31 +525,8 @@ def kb_add(
         return
 
     try:
-        # Add the files to the vector store
-        logging.debug(f"Adding {len(paths)} files to vector store {vs_id}")
-        results = asyncio.run(_add_files_to_kb(vs_id, paths, settings))
-
-        # Update settings with file paths - use dictionary operations
-        kb_files_dict = dict(settings.kb_files)
-        if vs_id not in kb_files_dict:
-            kb_files_dict[vs_id] = {}
-
-        logging.debug(f"Results from adding files: {results}")
-
-        for result in results:
-            file_id = result["file_id"]
-            file_path = str(result["file_path"])
-            kb_files_dict[vs_id][file_id] = file_path
-            logging.debug(f"Added file ID {file_id} -> {file_path}")
-
-        # Update the settings object with the modified dictionary
-        settings.kb_files = kb_files_dict
-
-        # Save settings
-        logging.debug(f"Saving settings with updated kb_files: {settings.kb_files}")
-        settings.save_to_file()
-
-        console.print(f"[green]Added {len(results)} files to knowledge base '{name}'[/green]")
+        count = run_kb(settings, lambda session: session.add(name, paths))
+        console.print(f"[green]Added {count} files to knowledge base '{name}'[/green]")
 
     except Exception as e:
         console.print(f"[red]Error adding files: {e}[/red]")
@@ -402,14 +535,6 @@ def kb_add(
         console.print(f"[red]{traceback.format_exc()}[/red]")
 
 
-async def _add_files_to_kb(vs_id: str, paths: list[Path], settings: Settings) -> list[dict[str, Any]]:
-    """Add files to a knowledge base."""
-    provider = await get_kb_provider(settings)
-    results = await provider.add_files(vs_id, paths)
-    await provider.close()
-    return results
-
-
 @kb_app.command("delete", help="Delete a file from a knowledge base")
 def kb_delete_file(name: str, file_id: str, verbose: bool = verbose_option) -> None:
     """Delete a file from a knowledge base."""
@@ -423,41 +548,16 @@ def kb_delete_file(name: str, file_id: str, verbose: bool = verbose_option) -> N
         console.print(f"[red]Knowledge base '{name}' does not exist[/red]")
         return
 
-    # Get the vector store ID
-    vs_id = settings.knowledge_bases[name]
-
-    # Check if the file exists in our records - use dictionary operations
-    kb_files_dict = dict(settings.kb_files)
-
     try:
-        # Delete the file from the vector store
-        result = asyncio.run(_delete_file_from_kb(vs_id, file_id, settings))
-
-        if result:
-            # Update settings - use dictionary operations
-            if vs_id in kb_files_dict and file_id in kb_files_dict[vs_id]:
-                del kb_files_dict[vs_id][file_id]
-                settings.kb_files = kb_files_dict
-
-            # Save settings
-            settings.save_to_file()
-
-            console.print(f"[green]Removed file '{file_id}' from knowledge base '{name}'[/green]")
-        else:
-            console.print(f"[red]Failed to remove file '{file_id}' from knowledge base '{name}'[/red]")
+        run_kb(settings, lambda session: session.delete(name, file_id))
+        console.print(f"[green]Removed file '{file_id}' from knowledge base '{name}'[/green]")
 
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
     except Exception as e:
         console.print(f"[red]Error removing file: {e}[/red]")
 
 
-async def _delete_file_from_kb(vs_id: str, file_id: str, settings: Settings) -> bool:
-    """Delete a file from a knowledge base."""
-    provider = await get_kb_provider(settings)
-    result = await provider.delete_file(vs_id, file_id)
-    await provider.close()
-    return result
-
-
 @kb_app.command("default", help="Set the default knowledge base")
 def kb_set_default(name: str, verbose: bool = verbose_option) -> None:
     """Set the default knowledge base."""
@@ -499,5 +599,283 @@ def kb_clear_default(verbose: bool = verbose_option) -> None:
     console.print(f"[green]Cleared default knowledge base (was '{old_default}')[/green]")
 
 
+# Number of arguments each batch operation takes, as (least, most), most None for no limit
+BATCH_OPERATIONS: dict[str, tuple[int, int | None]] = {
+    "create": (1, 1),
+    "add": (2, None),
+    "rm": (1, 1),
+    "delete": (2, 2),
+    "ls": (0, 1),
+}
+
+
+@dataclass
+class BatchOperation:
+    """One line of a batch file."""
+
+    line: int
+    command: str
+    args: list[str]
+
+    @property
+    def kb(self) -> str | None:
+        """The knowledge base the operation works on, None for one that reads them all."""
+        return self.args[0] if self.args else None
+
+
+def parse_batch(text: str) -> list[BatchOperation]:
+    """Parse a batch file.
+
+    Each line holds one kb operation with shell-style quoting, optionally starting
+    with `kb`, e.g. `add docs "My Notes.md"`. Blank lines and `#` comments are skipped.
+
+    Args:
+        text: The batch file content
+
+    Returns:
+        The operations, in file order
+
+    Raises:
+        ValueError: If a line is not a valid operation
+
+    """
+    operations: list[BatchOperation] = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from e
+        if words[:1] == ["kb"]:
+            words = words[1:]
+        if not words:
+            continue
+        command, args = words[0], words[1:]
+        if command not in BATCH_OPERATIONS:
+            raise ValueError(f"Line {number}: unknown operation '{command}'")
+        least, most = BATCH_OPERATIONS[command]
+        if len(args) < least or (most is not None and len(args) > most):
+            raise ValueError(f"Line {number}: wrong number of arguments for '{command}'")
+        operations.append(BatchOperation(line=number, command=command, args=args))
+    return operations
+
+
+async def run_batch_operation(session: KBSession, operation: BatchOperation) -> str | Table:
+    """Run one batch operation.
+
+    Returns:
+        A message or table describing the result
+
+    """
+    args = operation.args
+    match operation.command:
+        case "create":
+            vs_id = await session.create(args[0])
+            return f"Created knowledge base '{args[0]}' ({vs_id})"
+        case "add":
+            paths = [Path(arg) for arg in args[1:]]
+            missing = [str(path) for path in paths if not path.exists()]
+            if missing:
+                raise ValueError(f"Files do not exist: {', '.join(missing)}")
+            count = await session.add(args[0], paths)
+            return f"Added {count} files to knowledge base '{args[0]}'"
+        case "rm":
+            await session.remove(args[0])
+            return f"Removed knowledge base '{args[0]}'"
+        case "delete":
+            await session.delete(args[0], args[1])
+            return f"Removed file '{args[1]}' from knowledge base '{args[0]}'"
+        case _:
+            if args:
+                return files_table(args[0], await session.files(args[0]))
+            return kbs_table(session.settings, session.index)
+
+
+async def run_batch(
+    session: KBSession, operations: list[BatchOperation], concurrency: int = 4
+) -> dict[int, str | Table | Exception]:
+    """Run batch operations, those on different knowledge bases concurrently.
+
+    Operations on the same knowledge base run one after another in file order. An
+    `ls` of every knowledge base waits for the operations before it and holds back
+    those after it. A failed operation does not stop the others.
+
+    Args:
+        session: The session the operations share
+        operations: The operations, in file order
+        concurrency: Most operations running at once
+
+    Returns:
+        The result or error of each operation, by line number
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[int, str | Table | Exception] = {}
+
+    async def run_chain(chain: list[BatchOperation]) -> None:
+        for operation in chain:
+            async with semaphore:
+                try:
+                    results[operation.line] = await run_batch_operation(session, operation)
+                except Exception as e:
+                    logging.debug("Batch line %d failed", operation.line, exc_info=True)
+                    results[operation.line] = e
+
+    chains: dict[str, list[BatchOperation]] = {}
+    for operation in [*operations, None]:
+        if operation is not None and operation.kb is not None:
+            chains.setdefault(operation.kb, []).append(operation)
+            continue
+        await asyncio.gather(*(run_chain(chain) for chain in chains.values()))
+        chains = {}
+        if operation is not None:
+            await run_chain([operation])
+    return results
+
+
+batch_file_arg = typer.Argument("-", help="File of kb operations, one per line, or - for stdin")
+batch_concurrency_option = typer.Option(
+    4, "--concurrency", "-c", min=1, help="Most operations to run at once on different knowledge bases"
+)
+
+
+@app.command("batch", help="Run kb operations from a file or stdin in one process")
+def batch(
+    file: str = batch_file_arg,
+    concurrency: int = batch_concurrency_option,
+    verbose: bool = verbose_option,
+) -> None:
+    """Run kb operations from a file or stdin, sharing one event loop and KB provider.
+
+    Nothing is confirmed, and settings are saved once after the last operation, or
+    when the batch is interrupted, so knowledge bases already created keep their names.
+    Exits with status 1 if any operation failed.
+    """
+    if verbose:
+        alleycat_logging.set_verbose(True)
+
+    try:
+        text = sys.stdin.read() if file == "-" else Path(file).read_text(encoding="utf-8")
+        operations = parse_batch(text)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Error reading batch: {e}[/red]")
+        raise typer.Exit(1) from e
+
+    settings = Settings()
+    try:
+        results = run_kb(settings, lambda session: run_batch(session, operations, concurrency))
+    finally:
+        settings.save_to_file()
+
+    failed = 0
+    for operation in operations:
+        result = results[operation.line]
+        if isinstance(result, Exception):
+            failed += 1
+            console.print(f"[red]Line {operation.line}: {result}[/red]")
+        elif isinstance(result, Table):
+            console.print(result)
+        else:
+            console.print(f"[green]Line {operation.line}: {result}[/green]")
+
+    console.print(f"{len(operations) - failed} of {len(operations)} operations succeeded")
+    if failed:
+        raise typer.Exit(1)
+
+
+gc_dry_run_option = typer.Option(False, "--dry-run", "-n", help="Report orphaned files without deleting them")
+gc_force_option = typer.Option(False, "--force", "-f", help="Delete orphaned files without confirmation")
+gc_min_age_option = typer.Option(
+    24.0, "--min-age", min=0, help="Only treat files older than this many hours as orphans"
+)
+gc_purpose_option = typer.Option(
+    None, "--purpose", "-p", help="File purpose to collect, repeatable (default: assistants and user_data)"
+)
+gc_concurrency_option = typer.Option(8, "--concurrency", "-c", min=1, help="Most API requests to make at once")
+
+
+def format_bytes(size: int) -> str:
+    """Format a size in bytes for people to read."""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            break
+        value /= 1024
+    return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+
+
+def orphans_table(report: OrphanReport) -> Table:
+    """Build a table of orphaned files."""
+    table = Table(title="Orphaned files:")
+    table.add_column("File ID", style="cyan")
+    table.add_column("Filename", style="green")
+    table.add_column("Purpose")
+    table.add_column("Size", justify="right", style="magenta")
+    table.add_column("Created", style="yellow")
+    for file in sorted(report.orphans, key=lambda file: file.get("created_at") or 0):
+        created = (
+            datetime.fromtimestamp(file["created_at"]).strftime("%Y-%m-%d %H:%M") if file.get("created_at") else ""
+        )
+        table.add_row(
+            file["id"],
+            file.get("filename") or "",
+            file.get("purpose") or "",
+            format_bytes(file.get("bytes") or 0),
+            created,
+        )
+    return table
+
+
+@files_app.command("gc", help="Delete files alleycat uploaded that no knowledge base uses")
+def files_gc(
+    dry_run: bool = gc_dry_run_option,
+    force: bool = gc_force_option,
+    min_age: float = gc_min_age_option,
+    purposes: list[str] | None = gc_purpose_option,
+    concurrency: int = gc_concurrency_option,
+    verbose: bool = verbose_option,
+) -> None:
+    """Find files alleycat uploaded that are in no vector store and not in the KB index, and delete them."""
+    if verbose:
+        alleycat_logging.set_verbose(True)
+
+    settings = Settings()
+
+    async def collect(session: KBSession) -> OrphanReport:
+        provider = await session.provider()
+        report = await find_orphans(
+            provider,
+            session.index,
+            purposes=frozenset(purposes) if purposes else GC_PURPOSES,
+            min_age=min_age * 60 * 60,
+            concurrency=concurrency,
+        )
+        if report.orphans:
+            console.print(orphans_table(report))
+        console.print(
+            f"Found {len(report.orphans)} orphaned files ({format_bytes(report.orphan_bytes)}) among "
+            f"{report.scanned} account files: {report.in_use} in use, {report.skipped} recent or of another purpose, "
+            f"{report.foreign} not uploaded by alleycat"
+        )
+        if dry_run or not report.orphans:
+            return report
+        if not force and not Confirm.ask(f"Delete {len(report.orphans)} orphaned files?"):
+            console.print("Aborted")
+            return report
+        await delete_orphans(provider, report, concurrency=concurrency)
+        return report
+
+    try:
+        report = run_kb(settings, collect)
+    except Exception as e:
+        console.print(f"[red]Error collecting orphaned files: {e}[/red]")
+        raise typer.Exit(1) from e
+
+    if report.deleted:
+        console.print(f"[green]Deleted {len(report.deleted)} orphaned files[/green]")
+    if report.failed:
+        console.print(f"[red]Failed to delete {len(report.failed)} files: {', '.join(report.failed)}[/red]")
+        raise typer.Exit(1)
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,216 @@
+"""Alleycat batch commands.
+
+This module provides `alleycat batch submit|status|fetch` for running large offline
+jobs through the OpenAI Batch API.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import typer
+from openai import AsyncOpenAI
+from openai.types import Batch
+from rich.console import Console
+from rich.table import Table
+
+from alleycat_core import logging
+from alleycat_core.config.settings import Settings
+from alleycat_core.llm.batch import TERMINAL_STATUSES, BatchRunner, batch_requests
+from alleycat_core.schema import SchemaManager
+
+app = typer.Typer(
+    help="Run large offline jobs with the OpenAI Batch API",
+    no_args_is_help=True,
+    add_completion=False,
+)
+
+console = Console()
+
+# Define command options at module level
+verbose_option = typer.Option(False, "--verbose", "-v", help="Enable verbose debug output")
+log_level_option = typer.Option(
+    None, "--log-level", help="Lowest level logged: debug, info, success, warning or error", envvar="ALLEYCAT_LOG_LEVEL"
+)
+log_json_option = typer.Option(
+    None,
+    "--log-json",
+    help="Write logs as JSON lines to this file, or file descriptor number such as 2",
+    envvar="ALLEYCAT_LOG_JSON",
+)
+input_arg = typer.Argument(..., help="JSONL file of records to submit ('-' for stdin)")
+batch_id_arg = typer.Argument(..., help="ID of the batch")
+model_option = typer.Option(None, "--model", help="Model to use", envvar="ALLEYCAT_MODEL")
+instructions_option = typer.Option(None, "--instructions", "-i", help="System instructions (text or file path)")
+schema_option = typer.Option(None, "--schema", help="Path to JSON schema file for structured output")
+field_option = typer.Option(None, "--field", help="Dotted path of the record field to send")
+template_option = typer.Option(None, "--template", help="Prompt template; {text} is the selected field")
+id_field_option = typer.Option("id", "--id-field", help="Dotted path of the record ID")
+wait_option = typer.Option(False, "--wait", help="Wait for the batch to finish and write its results")
+no_wait_option = typer.Option(False, "--no-wait", help="Fail instead of waiting if the batch has not finished")
+output_option = typer.Option(None, "--output", "-o", help="Write JSONL results to this file instead of stdout")
+timeout_option = typer.Option(None, "--timeout", help="Stop waiting after this many seconds")
+
+
+@app.callback()
+def configure_logging(
+    log_level: str | None = log_level_option,
+    log_json: str | None = log_json_option,
+) -> None:
+    """Run large offline jobs with the OpenAI Batch API."""
+    try:
+        if log_level:
+            logging.set_level(log_level)
+        if log_json:
+            logging.set_json_sink(log_json)
+    except (ValueError, OSError) as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+
+def _load_settings(verbose: bool) -> Settings:
+    """Load settings and check that an API key is configured."""
+    if verbose:
+        logging.set_verbose(True)
+    settings = Settings()
+    settings.load_from_file()
+    if not settings.openai_api_key:
+        logging.error("OpenAI API key is required. Set it via ALLEYCAT_OPENAI_API_KEY or run alleycat-admin setup.")
+        sys.exit(1)
+    return settings
+
+
+def _create_runner(settings: Settings) -> BatchRunner:
+    """Create a batch runner for the configured API."""
+    return BatchRunner(AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url))
+
+
+async def _write_results(runner: BatchRunner, batch_id: str, output: Path | None, timeout: float | None) -> None:
+    """Wait for a batch and write its results in input order."""
+    batch = await runner.wait(batch_id, timeout=timeout)
+    if batch.status != "completed":
+        logging.warning(f"Batch {batch_id} finished with status {batch.status}; writing the results available")
+
+    output_file = open(output, "w", encoding="utf-8") if output else sys.stdout
+    count = 0
+    try:
+        async for entry in runner.results(batch):
+            output_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output_file.flush()
+            count += 1
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    logging.info(f"Wrote {count} results")
+
+
+@app.command("submit", help="Submit a JSONL file of records as a batch job")
+def submit(
+    jsonl_in: str = input_arg,
+    model: str | None = model_option,
+    instructions: str | None = instructions_option,
+    schema: str | None = schema_option,
+    field: str | None = field_option,
+    template: str | None = template_option,
+    id_field: str = id_field_option,
+    wait: bool = wait_option,
+    output: Path | None = output_option,
+    verbose: bool = verbose_option,
+) -> None:
+    """Submit a batch job."""
+    settings = _load_settings(verbose)
+    if model:
+        settings.model = model
+
+    instruction_text = instructions
+    if instructions and Path(instructions).exists():
+        instruction_text = Path(instructions).read_text(encoding="utf-8")
+
+    text_format = None
+    if schema:
+        text_format = SchemaManager(cache_dir=settings.schema_cache_dir).get_schema(schema).to_request_format()
+
+    async def run() -> None:
+        async with _create_runner(settings) as runner:
+            input_file = sys.stdin if jsonl_in == "-" else open(jsonl_in, encoding="utf-8")
+            try:
+                requests = batch_requests(
+                    input_file,
+                    model=settings.model,
+                    instructions=instruction_text,
+                    temperature=settings.temperature,
+                    text_format=text_format,
+                    field=field,
+                    template=template,
+                    id_field=id_field,
+                )
+                batch = await runner.submit(requests, parse_json=text_format is not None)
+            finally:
+                if input_file is not sys.stdin:
+                    input_file.close()
+
+            console.print(f"[green]Submitted batch[/green] {batch.id}", highlight=False)
+            if wait:
+                await _write_results(runner, batch.id, output, None)
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        logging.error(f"Error submitting batch: {e}")
+        sys.exit(1)
+
+
+@app.command("status", help="Show the status of a batch job")
+def status(batch_id: str = batch_id_arg, verbose: bool = verbose_option) -> None:
+    """Show batch status."""
+    settings = _load_settings(verbose)
+
+    async def run() -> Batch:
+        async with _create_runner(settings) as runner:
+            return await runner.status(batch_id)
+
+    try:
+        batch = asyncio.run(run())
+    except Exception as e:
+        logging.error(f"Error getting batch status: {e}")
+        sys.exit(1)
+
+    table = Table(title=f"Batch {batch.id}:")
+    table.add_column("Field", style="cyan", no_wrap=True)
+    table.add_column("Value")
+    table.add_row("Status", batch.status)
+    if batch.request_counts:
+        counts = batch.request_counts
+        table.add_row("Requests", f"{counts.completed} completed, {counts.failed} failed, {counts.total} total")
+    table.add_row("Output file", batch.output_file_id or "")
+    table.add_row("Error file", batch.error_file_id or "")
+    console.print(table)
+
+
+@app.command("fetch", help="Wait for a batch job and write its results as JSONL in input order")
+def fetch(
+    batch_id: str = batch_id_arg,
+    output: Path | None = output_option,
+    no_wait: bool = no_wait_option,
+    timeout: float | None = timeout_option,
+    verbose: bool = verbose_option,
+) -> None:
+    """Fetch batch results."""
+    settings = _load_settings(verbose)
+
+    async def run() -> None:
+        async with _create_runner(settings) as runner:
+            if no_wait:
+                batch = await runner.status(batch_id)
+                if batch.status not in TERMINAL_STATUSES:
+                    raise RuntimeError(f"Batch {batch_id} is still {batch.status}")
+            await _write_results(runner, batch_id, output, timeout)
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        logging.error(f"Error fetching batch: {e}")
+        sys.exit(1)
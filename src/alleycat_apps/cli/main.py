@@ -11,24 +11,54 @@ Author: Andrew Watkins <andrew@groat.nz>
 
 import asyncio
 import enum
+import glob
+import json
+import signal
 import sys
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterator, Coroutine
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any, NoReturn, TypeGuard
 
 import typer
 from openai.types.responses.response_stream_event import ResponseStreamEvent
+from rich.columns import Columns
 from rich.console import Console
 from rich.live import Live
 from rich.markdown import Markdown
+from rich.panel import Panel
 from rich.prompt import Prompt
+from rich.table import Table
 
 from alleycat_apps.cli.admin_cmd import app as admin_app
+from alleycat_apps.cli.batch_cmd import app as batch_app
 from alleycat_core import logging
+from alleycat_core.config.routes import RouteRequest
 from alleycat_core.config.settings import Settings
-from alleycat_core.llm import OpenAIFactory
-from alleycat_core.llm.types import ResponseFormat, ResponseFormatText
+from alleycat_core.history import SessionLog
+from alleycat_core.llm import JsonlExtractor, OpenAIFactory, SchemaChain, StageCache, get_profile
+from alleycat_core.llm.base import LLMProvider
+from alleycat_core.llm.comparison import ModelRun, compare_models
+from alleycat_core.llm.evaluation import LLMTestCase, ResponseEvaluator
+from alleycat_core.llm.extract import completed_ids
+from alleycat_core.llm.hedging import close_stream
+from alleycat_core.llm.packing import FilePack, pack_directory
+from alleycat_core.llm.reducers import parse_reduce_options
+from alleycat_core.llm.routing import ModelRouter, estimate_request_tokens, schema_check
+from alleycat_core.llm.sinks import (
+    ERROR_EVENTS,
+    TEXT_DELTA,
+    EventLogSink,
+    JsonSink,
+    MetricsSink,
+    StdoutSink,
+    StreamPipeline,
+    StreamSink,
+    TeeSink,
+    TerminalSink,
+    text_delta,
+)
+from alleycat_core.llm.types import LLMResponse, ResponseFormat, ResponseFormatText
 from alleycat_core.schema import SchemaManager, SchemaValidationError
 
 console = Console()
@@ -70,7 +100,28 @@ mode_option = typer.Option(
     help="Output mode (text, markdown, json)",
 )
 api_key_option = typer.Option(None, "--api-key", help="OpenAI API key", envvar="ALLEYCAT_OPENAI_API_KEY")
+provider_option = typer.Option(
+    None,
+    "--provider",
+    help="Backend profile (openai, vllm, llama.cpp, ollama, compatible)",
+    envvar="ALLEYCAT_PROVIDER",
+)
+base_url_option = typer.Option(
+    None,
+    "--base-url",
+    help="Base URL of an OpenAI-compatible API, e.g. http://localhost:8080/v1",
+    envvar="ALLEYCAT_OPENAI_BASE_URL",
+)
 verbose_option = typer.Option(False, "--verbose", "-v", help="Enable verbose debug output")
+log_level_option = typer.Option(
+    None, "--log-level", help="Lowest level logged: debug, info, success, warning or error", envvar="ALLEYCAT_LOG_LEVEL"
+)
+log_json_option = typer.Option(
+    None,
+    "--log-json",
+    help="Write logs as JSON lines to this file, or file descriptor number such as 2",
+    envvar="ALLEYCAT_LOG_JSON",
+)
 stream_option = typer.Option(False, "--stream", "-s", help="Stream the response as it's generated")
 no_stream_option = typer.Option(False, "--no-stream", help="Disable response streaming")
 chat_option = typer.Option(False, "--chat", "-c", help="Interactive chat mode with continuous conversation")
@@ -84,7 +135,22 @@ file_option = typer.Option(
     None,
     "--file",
     "-f",
-    help="Path to a file to upload and reference in the conversation",
+    help="File to upload and reference in the conversation; repeat or use a glob for several files",
+)
+dir_option = typer.Option(
+    None,
+    "--dir",
+    help="Directory whose text files are packed into the context, in as few requests as fit the context budget",
+)
+include_option = typer.Option(None, "--include", help="Only pack --dir files matching this glob (repeatable)")
+exclude_option = typer.Option(
+    None, "--exclude", help="Skip --dir files and directories matching this glob (repeatable)"
+)
+reduce_option = typer.Option(
+    None,
+    "--reduce",
+    help="Reduce text files of a type before sending them, as EXT=STAGE (repeatable), e.g. log=dedupe. "
+    "Stages: whitespace, template, dedupe, dedupe:adjacent, columns:A,B",
 )
 tool_option = typer.Option(
     None,
@@ -125,6 +191,103 @@ schema_chain_option = typer.Option(
     "--schema-chain",
     help="Comma-separated paths to JSON schema files for chained processing",
 )
+validate_option = typer.Option(
+    False,
+    "--validate",
+    help="Validate --schema or --schema-chain output locally and fail if it does not match",
+)
+validate_retries_option = typer.Option(
+    0,
+    "--validate-retries",
+    help="Re-ask the model up to N times when --validate finds invalid output",
+    min=0,
+)
+tag_option = typer.Option(
+    None,
+    "--tag",
+    help="Tag recorded with this request in the usage ledger",
+    envvar="ALLEYCAT_USAGE_TAG",
+)
+
+jsonl_in_option = typer.Option(
+    None,
+    "--jsonl-in",
+    help="Run every record of a JSONL file ('-' for stdin) through --schema or --schema-chain",
+)
+jsonl_out_option = typer.Option(
+    None,
+    "--jsonl-out",
+    help="Write JSONL results to this file instead of stdout",
+)
+field_option = typer.Option(
+    None,
+    "--field",
+    help="Dotted path of the record field to send with --jsonl-in (default: the whole record)",
+)
+template_option = typer.Option(
+    None,
+    "--template",
+    help="Prompt template for --jsonl-in; {text} is the selected field and record keys are available by name",
+)
+id_field_option = typer.Option(
+    "id",
+    "--id-field",
+    help="Dotted path of the record ID for --jsonl-in; the line number is used when missing",
+)
+concurrency_option = typer.Option(
+    None,
+    "--concurrency",
+    help="Concurrent requests per schema stage",
+    min=1,
+)
+jsonl_resume_option = typer.Option(
+    False,
+    "--jsonl-resume",
+    help="Skip records already completed in the --jsonl-out file and append to it",
+)
+latency_budget_option = typer.Option(
+    None,
+    "--latency-budget",
+    help="Route to models whose recorded p95 latency fits this many milliseconds",
+    min=0,
+)
+hedge_option = typer.Option(
+    None,
+    "--hedge",
+    help="Send a duplicate request if the first token is slower than this percentile of recent requests, e.g. 95",
+    min=1,
+    max=100,
+)
+tee_option = typer.Option(
+    None,
+    "--tee",
+    help="Also write the streamed response text to this file",
+)
+event_log_option = typer.Option(
+    None,
+    "--event-log",
+    help="Append every response stream event to this NDJSON file",
+)
+models_option = typer.Option(
+    None,
+    "--models",
+    help="Comma-separated models to send the prompt to at once and compare, e.g. gpt-4o-mini,gpt-4o",
+)
+compare_dir_option = typer.Option(
+    None,
+    "--compare-dir",
+    help="Write each --models answer to <model>.txt in this directory",
+)
+evaluate_option = typer.Option(
+    None,
+    "--evaluate",
+    help="JSON test case the --models answers are scored against; its prompt is used when none is given",
+)
+session_option = typer.Option(
+    None,
+    "--resume",
+    help="Resume the named chat session, or start it if it does not exist",
+)
 
 
 def get_prompt_from_stdin() -> str:
@@ -134,11 +297,6 @@ def get_prompt_from_stdin() -> str:
     return ""
 
 
-def is_text_delta_event(event: ResponseStreamEvent) -> TypeGuard[Any]:
-    """Check if event is a text delta event."""
-    return event.type == "response.output_text.delta" and hasattr(event, "delta")
-
-
 def is_error_event(event: ResponseStreamEvent) -> TypeGuard[Any]:
     """Check if event is an error event."""
     return event.type in ("error", "response.failed") and hasattr(event, "error") and hasattr(event.error, "message")
@@ -177,7 +335,11 @@ def handle_non_stream_response(
         total = response.usage.total_tokens
         prompt_tokens = response.usage.prompt_tokens
         completion_tokens = response.usage.completion_tokens
-        logging.info(f"Tokens used: [cyan]{total}[/cyan] (prompt: {prompt_tokens}, completion: {completion_tokens})")
+        cached_tokens = response.usage.cached_tokens
+        logging.info(
+            f"Tokens used: [cyan]{total}[/cyan] (prompt: {prompt_tokens}, completion: {completion_tokens}, "
+            f"cached: {cached_tokens}, cache hit: {response.usage.cache_hit_rate:.0%})"
+        )
 
 
 def handle_error_event(event: ResponseStreamEvent) -> NoReturn:
@@ -205,82 +367,215 @@ def handle_error_event(event: ResponseStreamEvent) -> NoReturn:
     raise Exception(error_msg)
 
 
-def handle_stream_event(
-    event: ResponseStreamEvent,
-    accumulated_text: str,
-    live: Live,
-    output_format: str = "text",
-) -> tuple[str, bool]:
-    """Handle a single stream event and update the live display.
+class ErrorSink(StreamSink):
+    """Report error events, which stops the stream."""
+
+    event_types = ERROR_EVENTS
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Report an error event."""
+        handle_error_event(event)
+
+
+def stream_sinks(output_format: str, console: Console, settings: Settings | None = None) -> list[StreamSink]:
+    """Build the sinks a streamed response is dispatched to.
+
+    Text and markdown are rendered live on a terminal. When the console is not a
+    terminal, e.g. output piped to another command, the raw text is written as it
+    arrives instead.
 
     Args:
-        event: The stream event to handle
-        accumulated_text: The current accumulated text
-        live: The live display instance
-        output_format: The output format (text or markdown)
+        output_format: The output format (text, markdown, json)
+        console: The console the response is shown on
+        settings: Settings naming a tee file and event log, if any
 
     Returns:
-        tuple[str, bool]: Updated accumulated text and whether to continue processing
+        The display sink and error sink, followed by any file and metrics sinks
 
     """
-    if is_text_delta_event(event):
-        accumulated_text += event.delta
-        # Update the display based on format
-        if output_format == "markdown":
-            live.update(
-                Markdown(
-                    accumulated_text,
-                    code_theme="github-dark",
-                    hyperlinks=True,
-                    justify="left",
-                )
+    display: StreamSink
+    if output_format == "json":
+        display = JsonSink(console)
+    elif console.is_terminal:
+        display = TerminalSink(console, output_format)
+    else:
+        display = StdoutSink(console.file)
+    sinks: list[StreamSink] = [display, ErrorSink()]
+    if settings is not None and settings.stream_tee is not None:
+        sinks.append(TeeSink(settings.stream_tee))
+    if settings is not None and settings.event_log is not None:
+        sinks.append(EventLogSink(settings.event_log))
+    if logging.is_verbose():
+        sinks.append(MetricsSink())
+    return sinks
+
+
+def log_stream_metrics(sinks: list[StreamSink]) -> None:
+    """Log the timings measured by any metrics sink."""
+    for sink in sinks:
+        if isinstance(sink, MetricsSink):
+            metrics = sink.metrics
+            ttft = f"{metrics.ttft_ms:.0f}ms" if metrics.ttft_ms is not None else "none"
+            logging.info(
+                f"Stream: first token {ttft}, {metrics.duration_ms:.0f}ms total, "
+                f"{metrics.chars} chars ({metrics.chars_per_second:.0f}/s), {sum(metrics.events.values())} events"
             )
-        else:
-            live.update(accumulated_text)
-        return accumulated_text, True
-    if event.type == "response.completed" and hasattr(event, "response"):
-        # Response ID is now tracked by the provider
-        return accumulated_text, True
-    if is_error_event(event):
-        handle_error_event(event)
-    return accumulated_text, True
 
 
-async def handle_stream(stream: AsyncIterator[ResponseStreamEvent], settings: Settings) -> None:
-    """Handle streaming response from the LLM."""
-    accumulated_text = ""
+async def handle_stream(stream: AsyncIterator[ResponseStreamEvent], settings: Settings) -> str:
+    """Handle streaming response from the LLM, returning the text received."""
+    sinks = stream_sinks(settings.output_format, logging.output_console, settings)
+    try:
+        text = await StreamPipeline(sinks).run(stream)
+    except Exception as e:
+        logging.error(f"Error during streaming: {str(e)}")
+        raise
+    log_stream_metrics(sinks)
+    return text
+
 
-    if settings.output_format == "json":
-        # For JSON, we need to accumulate the entire response
-        try:
-            async for event in stream:
-                if is_text_delta_event(event):
-                    accumulated_text += event.delta
-                elif event.type == "response.completed":
-                    # Final text received, format and output
-                    logging.output_console.print_json(accumulated_text)
-                elif is_error_event(event):
-                    handle_error_event(event)
-                # Ignore other event types for now
-        except Exception as e:
-            logging.error(f"Error during streaming: {str(e)}")
+async def run_interruptible[T](coro: Coroutine[Any, Any, T]) -> T | None:
+    """Run a coroutine that Ctrl-C cancels instead of ending the program.
+
+    While the coroutine runs, SIGINT cancels it; the previous handler is restored
+    afterwards so Ctrl-C at the prompt still exits the chat.
+
+    Args:
+        coro: The coroutine to run
+
+    Returns:
+        The coroutine's result, or None if Ctrl-C cancelled it
+
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coro)
+    previous_handler = signal.getsignal(signal.SIGINT)
+    try:
+        loop.add_signal_handler(signal.SIGINT, task.cancel)
+        installed = True
+    except (NotImplementedError, RuntimeError, ValueError):
+        # Not available on Windows event loops or outside the main thread
+        installed = False
+
+    try:
+        return await task
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if current is not None and current.cancelling():
+            # We were cancelled ourselves, not by Ctrl-C
             raise
+        return None
+    finally:
+        if installed:
+            loop.remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, previous_handler)
+
+
+async def stream_response(
+    stream: AsyncIterator[ResponseStreamEvent], output_format: str, settings: Settings | None = None
+) -> tuple[str, bool]:
+    """Display a streamed response until it completes or is cancelled.
+
+    Args:
+        stream: The response stream
+        output_format: The output format (text or markdown)
+        settings: Settings naming a tee file and event log, if any
+
+    Returns:
+        The text received and whether the response completed
+
+    """
+    sinks = stream_sinks(output_format, console, settings)
+    pipeline = StreamPipeline(sinks)
+    try:
+        text = await pipeline.run(stream)
+        log_stream_metrics(sinks)
+        return text, True
+    except asyncio.CancelledError:
+        # Cancelled by Ctrl-C: keep the partial answer and carry on with the chat
+        current = asyncio.current_task()
+        if current is not None:
+            current.uncancel()
+        return pipeline.text, False
+    finally:
+        await close_stream(stream)
+
+
+def open_session(llm: Any, settings: Settings, session: str | None) -> SessionLog | None:
+    """Open the session log and continue the named session's conversation.
+
+    The conversation is held by the API, so resuming only restores the last response ID.
+
+    Args:
+        llm: The provider to continue the conversation on
+        settings: Settings with history_file and max_history
+        session: Session name, or None when the chat is not being recorded
+
+    Returns:
+        The session log, or None when no session was requested
+
+    """
+    if not session or settings.history_file is None:
+        return None
+    log = SessionLog(Path(settings.history_file), settings.max_history)
+    info = log.get_session(session)
+    if info and info.last_response_id:
+        llm.previous_response_id = info.last_response_id
+        logging.info(f"Resumed session '{session}' from response {info.last_response_id} ({info.turns} turns)")
     else:
-        # For text/markdown, we can stream in real-time
-        try:
-            with Live(console=logging.output_console, refresh_per_second=4) as live:
-                async for event in stream:
-                    accumulated_text, should_continue = handle_stream_event(
-                        event,
-                        accumulated_text,
-                        live,
-                        settings.output_format,
-                    )
-                    if not should_continue:
-                        break
-        except Exception as e:
-            logging.error(f"Error during streaming: {str(e)}")
-            raise
+        logging.info(f"Starting new session '{session}'")
+    return log
+
+
+def record_turn(
+    log: SessionLog | None,
+    llm: Any,
+    session: str | None,
+    prompt: str,
+    response_text: str,
+    completed: bool = True,
+    model: str | None = None,
+) -> None:
+    """Append a turn to the session log, if the chat is being recorded.
+
+    Cancelled turns are stored without a response ID, so the session still resumes
+    from the last completed response. The model defaults to the provider's model.
+    """
+    if log is None or session is None:
+        return
+    log.record(
+        session,
+        prompt,
+        response_text,
+        model=model or llm.config.model,
+        response_id=llm.previous_response_id if completed else None,
+        usage=getattr(llm, "last_usage", None) if completed else None,
+    )
+
+
+def expand_file_patterns(patterns: list[str]) -> list[str]:
+    """Expand glob patterns in --file arguments.
+
+    Args:
+        patterns: File paths or glob patterns, e.g. "reports/*.pdf"
+
+    Returns:
+        Matching file paths in argument order, each pattern's matches sorted
+
+    Raises:
+        FileNotFoundError: If a pattern matches no files
+
+    """
+    paths: list[str] = []
+    for pattern in patterns:
+        if not any(char in pattern for char in "*?["):
+            paths.append(pattern)
+            continue
+        matches = sorted(match for match in glob.glob(pattern, recursive=True) if Path(match).is_file())
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern}")
+        paths.extend(matches)
+    return paths
 
 
 def read_instructions_file(filepath: str) -> str:
@@ -302,29 +597,261 @@ async def create_llm(settings: Settings) -> AsyncIterator[Any]:
     llm = factory.create(
         stream=settings.stream,
         api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        profile=settings.provider,
         model=settings.model,
         temperature=settings.temperature,
+        usage_db=settings.usage_db if settings.record_usage else None,
+        usage_tag=settings.usage_tag,
+        prompt_cache_key=settings.prompt_cache_key,
+        hedge_percentile=settings.hedge_percentile,
+        idle_timeout=settings.idle_timeout,
+        response_deadline=settings.response_deadline,
+        stall_retries=settings.stall_retries,
+        file_reducers=settings.file_reducers,
+        kb_index=settings.kb_index,
     )
 
     try:
-        # Setup file if specified
-        if settings.file_path:
-            success = await llm.add_file(settings.file_path)
+        # Setup files if specified
+        if settings.file_paths:
+            success = await llm.add_files(settings.file_paths)
             if not success:
-                raise ValueError(f"Failed to setup file: {settings.file_path}")
+                raise ValueError(f"Failed to setup files: {', '.join(settings.file_paths)}")
 
             if logging.is_verbose():
-                logging.info(f"Successfully setup file: {settings.file_path}")
+                logging.info(f"Successfully setup {len(settings.file_paths)} file(s)")
 
         yield llm
     finally:
         await llm.close()
 
 
+async def respond_validated(
+    llm: LLMProvider,
+    prompt: str,
+    settings: Settings,
+    instructions: str | None = None,
+    router: ModelRouter | None = None,
+) -> LLMResponse:
+    """Get a schema response, validating it locally and re-asking on invalid output.
+
+    With a router, invalid output is first escalated to stronger models, and only the
+    strongest model's answer is corrected with retries.
+
+    Args:
+        llm: The LLM provider
+        prompt: The user prompt
+        settings: Settings with schema_file, response_format and validate_retries
+        instructions: System instructions for the model
+        router: Picks the model and escalates invalid output
+
+    Returns:
+        The first response that matches the schema
+
+    Raises:
+        SchemaValidationError: If no valid response was produced within the allowed retries
+
+    """
+    if settings.schema_file is None:
+        raise ValueError("Output validation requires --schema")
+    schema_obj = schema_manager.get_schema(settings.schema_file)
+    check = schema_check(schema_obj)
+    respond_options: dict[str, Any] = {
+        "text": settings.response_format,
+        "instructions": instructions,
+        "web_search": settings.enable_web_search,
+        "vector_store_id": settings.vector_store_id,
+        "tools_requested": getattr(settings, "tools_requested", ""),
+    }
+
+    current_prompt = prompt
+    attempts = settings.validate_retries + 1
+    attempt = 1
+    while True:
+        response: LLMResponse | AsyncIterator[ResponseStreamEvent]
+        if router is not None and attempt == 1:
+            request = route_request(llm, prompt, settings, instructions)
+            response, model = await router.respond(llm, current_prompt, request, check=check, **respond_options)
+            respond_options["model"] = model
+        else:
+            response = await llm.respond(input=current_prompt, **respond_options)
+        if isinstance(response, AsyncIterator):
+            raise ValueError("Unexpected streaming response for schema output")
+
+        problem = check(response)
+        if problem is None:
+            return response
+
+        if attempt == attempts:
+            raise SchemaValidationError(problem)
+
+        logging.warning(f"Invalid structured output (attempt {attempt}/{attempts}): {problem}")
+        # The provider continues the conversation, so the model can see its previous answer
+        current_prompt = (
+            f"Your previous response did not match the required JSON schema. {problem}\n"
+            "Respond again with corrected JSON only."
+        )
+        attempt += 1
+
+
+def create_router(llm: Any, settings: Settings) -> ModelRouter | None:
+    """Create a model router from the routing settings.
+
+    Args:
+        llm: The provider, whose usage ledger holds the latency of each model
+        settings: Settings with routes, escalation_models and model
+
+    Returns:
+        The router, or None when no routes or escalation models are configured
+
+    """
+    if not settings.routes and not settings.escalation_models:
+        return None
+    return ModelRouter(
+        settings.model,
+        rules=settings.routes,
+        escalation=settings.escalation_models,
+        ledger=getattr(llm, "usage_ledger", None),
+    )
+
+
+def route_request(llm: Any, prompt: str, settings: Settings, instructions: str | None) -> RouteRequest:
+    """Describe a request to the model router."""
+    return RouteRequest(
+        prompt_tokens=estimate_request_tokens(prompt, instructions, getattr(llm, "remote_files", [])),
+        output_format=settings.output_format,
+        tools=settings.enable_web_search or bool(settings.vector_store_id),
+        latency_budget_ms=settings.latency_budget_ms,
+    )
+
+
+def create_chain(llm: LLMProvider, settings: Settings, instructions: str | None = None) -> SchemaChain:
+    """Create a schema chain for the schemas in settings.schema_chain, or settings.schema_file.
+
+    Stage outputs of multi-stage chains are cached under the schema cache directory so
+    that re-running a chain over the same inputs only pays for stages that have not
+    completed.
+
+    Args:
+        llm: The provider used for every stage
+        settings: Settings with schema_chain and the tools to use
+        instructions: System instructions for the model
+
+    Returns:
+        The configured schema chain
+
+    """
+    schema_paths = settings.schema_chain or ([settings.schema_file] if settings.schema_file else [])
+    cache_dir = settings.schema_cache_dir / "chain" if settings.schema_cache_dir else None
+    return SchemaChain(
+        llm,
+        [schema_manager.get_schema(path) for path in schema_paths],
+        instructions=instructions,
+        cache=StageCache(cache_dir) if len(schema_paths) > 1 else None,
+        concurrency=settings.chain_concurrency,
+        validate=settings.validate_output,
+        model=settings.model,
+        respond_options={
+            "web_search": settings.enable_web_search,
+            "vector_store_id": settings.vector_store_id,
+            "tools_requested": getattr(settings, "tools_requested", ""),
+        },
+    )
+
+
+async def load_context_packs(settings: Settings) -> list[FilePack]:
+    """Pack the text files of settings.dir_path, if a directory was given.
+
+    Args:
+        settings: Settings with dir_path, dir_include, dir_exclude and context_budget
+
+    Returns:
+        The packs, empty when no directory was given
+
+    Raises:
+        ValueError: If the directory has no text files to pack
+
+    """
+    if settings.dir_path is None:
+        return []
+    packs = await asyncio.to_thread(
+        pack_directory,
+        settings.dir_path,
+        budget=settings.context_budget,
+        include=settings.dir_include,
+        exclude=settings.dir_exclude,
+    )
+    if not packs:
+        raise ValueError(f"No text files to pack in {settings.dir_path}")
+    return packs
+
+
+async def respond_once(
+    llm: Any,
+    prompt: str,
+    settings: Settings,
+    instructions: str | None,
+    response_format: ResponseFormat,
+) -> str:
+    """Answer a prompt with the schema chain or a single response, and print the answer.
+
+    Args:
+        llm: The LLM provider
+        prompt: The user's prompt
+        settings: Settings for the request
+        instructions: System instructions for the model
+        response_format: Response format of a single response
+
+    Returns:
+        The response text
+
+    Raises:
+        SchemaValidationError: If the schema chain fails
+
+    """
+    response: LLMResponse | AsyncIterator[ResponseStreamEvent]
+    if settings.schema_chain:
+        result = await create_chain(llm, settings, instructions).run(prompt)
+        if result.error:
+            raise SchemaValidationError(result.error)
+        output = json.dumps(result.result)
+        console.print_json(output)
+        if logging.is_verbose() and result.usage:
+            logging.info(
+                f"Tokens used: [cyan]{result.usage.total_tokens}[/cyan] over {len(settings.schema_chain)} "
+                f"stages ({result.cached_stages} cached, prompt cache hit: {result.usage.cache_hit_rate:.0%})"
+            )
+        return output
+
+    router = create_router(llm, settings)
+    if settings.output_format == "schema" and settings.validate_output:
+        response = await respond_validated(llm, prompt, settings, instructions, router)
+    else:
+        routed = {"model": router.route(route_request(llm, prompt, settings, instructions))} if router else {}
+        response = await llm.respond(
+            input=prompt,
+            text=response_format,
+            instructions=instructions,
+            web_search=settings.enable_web_search,
+            vector_store_id=settings.vector_store_id,
+            tools_requested=getattr(settings, "tools_requested", ""),
+            **routed,
+        )
+
+    match response:
+        case AsyncIterator():
+            return await handle_stream(response, settings)
+        case _:
+            handle_non_stream_response(response, console, settings.output_format)
+            return response.output_text
+
+
 async def run_chat(
     prompt: str,
     settings: Settings,
     instructions: str | None = None,
+    session: str | None = None,
 ) -> None:
     """Run the chat interaction with the LLM."""
     # Prepare response format based on settings
@@ -337,21 +864,23 @@ async def run_chat(
         response_format = settings.response_format
 
     async with create_llm(settings) as llm:
+        session_log = open_session(llm, settings, session)
         try:
-            response = await llm.respond(
-                input=prompt,
-                text=response_format,
-                instructions=instructions,
-                web_search=settings.enable_web_search,
-                vector_store_id=settings.vector_store_id,
-                tools_requested=getattr(settings, "tools_requested", ""),
-            )
-
-            match response:
-                case AsyncIterator():
-                    await handle_stream(response, settings)
-                case _:
-                    handle_non_stream_response(response, console, settings.output_format)
+            packs = await load_context_packs(settings)
+            if len(packs) <= 1:
+                llm.remote_files.extend(packs)
+                response_text = await respond_once(llm, prompt, settings, instructions, response_format)
+                if not settings.schema_chain:
+                    record_turn(session_log, llm, session, prompt, response_text)
+                return
+
+            # Each part of the directory is answered on its own; the attached files go with every part
+            attached = list(llm.remote_files)
+            for index, pack in enumerate(packs, start=1):
+                llm.remote_files = [*attached, pack]
+                llm.previous_response_id = None
+                console.rule(f"Part {index} of {len(packs)}: {pack.files[0].name} … {pack.files[-1].name}")
+                await respond_once(llm, prompt, settings, instructions, response_format)
 
         except Exception as e:
             logging.error(str(e))
@@ -361,54 +890,276 @@ async def run_chat(
 
                 logging.error(traceback.format_exc())
             raise
+        finally:
+            if session_log:
+                session_log.close()
+
+
+class PanelSink(StreamSink):
+    """Stream a model's answer into its panel of a comparison view."""
+
+    event_types = frozenset({TEXT_DELTA})
+
+    def __init__(self, view: "ComparisonView", model: str):
+        """Initialize the sink.
+
+        Args:
+            view: The comparison view
+            model: The model whose panel is updated
+
+        """
+        self.view = view
+        self.model = model
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Add a text delta to the panel."""
+        self.view.texts[self.model] += text_delta(event)
+
+
+class ComparisonView:
+    """Side by side panels of the answers of several models, for a rich Live display."""
+
+    def __init__(self, models: list[str], output_format: str = "text"):
+        """Initialize the view with an empty panel per model.
+
+        Args:
+            models: The models being compared
+            output_format: text or markdown
+
+        """
+        self.texts = dict.fromkeys(models, "")
+        self.output_format = output_format
+
+    def __rich__(self) -> Columns:
+        """Render a panel per model."""
+        panels = []
+        for model, text in self.texts.items():
+            body: str | Markdown = text
+            if self.output_format == "markdown":
+                body = Markdown(text, code_theme="github-dark", hyperlinks=True, justify="left")
+            panels.append(Panel(body, title=model, title_align="left"))
+        return Columns(panels, equal=True, expand=True)
+
+
+def comparison_table(runs: list[ModelRun]) -> Table:
+    """Tabulate the timings, usage and scores of a comparison."""
+    table = Table(title="Model comparison:")
+    table.add_column("Model", style="cyan")
+    table.add_column("First token", justify="right")
+    table.add_column("Total", justify="right")
+    table.add_column("Tokens/s", justify="right")
+    table.add_column("Prompt", justify="right")
+    table.add_column("Completion", justify="right")
+    table.add_column("Score", justify="right")
+    for run in runs:
+        if run.error:
+            table.add_row(run.model, f"[red]{run.error}[/red]", "", "", "", "", "")
+            continue
+        table.add_row(
+            run.model,
+            f"{run.ttft_ms:.0f}ms" if run.ttft_ms is not None else "-",
+            f"{run.duration_ms:.0f}ms",
+            f"{run.tokens_per_second:.1f}" if run.tokens_per_second is not None else "-",
+            str(run.usage.prompt_tokens) if run.usage else "-",
+            str(run.usage.completion_tokens) if run.usage else "-",
+            f"{run.evaluation.score:.2f}" if run.evaluation else "-",
+        )
+    return table
+
+
+async def run_comparison(
+    prompt: str,
+    settings: Settings,
+    models: list[str],
+    instructions: str | None = None,
+    output_dir: Path | None = None,
+    test_case: LLMTestCase | None = None,
+) -> list[ModelRun]:
+    """Send a prompt to several models at once and compare their answers.
+
+    Args:
+        prompt: The user's prompt
+        settings: Settings for the requests, with streaming on
+        models: The models to compare
+        instructions: System instructions for the models
+        output_dir: Directory each model's answer is written to, as <model>.txt
+        test_case: Test case the answers are scored against
+
+    Returns:
+        A run per model
+
+    Raises:
+        ValueError: If the --dir files do not fit one request
+
+    """
+    response_format: ResponseFormat = None
+    if settings.output_format == "json":
+        response_format = ResponseFormatText(format="json")
+    elif settings.output_format == "schema":
+        response_format = settings.response_format
+
+    view = ComparisonView(models, settings.output_format)
+
+    def sinks(model: str) -> list[StreamSink]:
+        model_sinks: list[StreamSink] = [PanelSink(view, model), ErrorSink()]
+        if output_dir is not None:
+            model_sinks.append(TeeSink(output_dir / f"{model.replace('/', '_')}.txt"))
+        return model_sinks
+
+    async with create_llm(settings) as llm:
+        packs = await load_context_packs(settings)
+        if len(packs) > 1:
+            raise ValueError("The --dir files need more than one request; compare models on a smaller directory")
+        llm.remote_files.extend(packs)
+
+        with Live(view, console=console, refresh_per_second=4):
+            runs = await compare_models(
+                llm,
+                models,
+                prompt,
+                sinks=sinks,
+                evaluator=ResponseEvaluator() if test_case else None,
+                test_case=test_case,
+                text=response_format,
+                instructions=instructions,
+                web_search=settings.enable_web_search,
+                vector_store_id=settings.vector_store_id,
+                tools_requested=getattr(settings, "tools_requested", ""),
+            )
+    console.print(comparison_table(runs))
+    return runs
+
+
+async def run_jsonl(
+    settings: Settings,
+    instructions: str | None,
+    jsonl_in: str,
+    jsonl_out: Path | None = None,
+    field: str | None = None,
+    template: str | None = None,
+    id_field: str = "id",
+    resume: bool = False,
+) -> None:
+    """Run every record of a JSONL input through the configured schema or schema chain.
+
+    Args:
+        settings: Settings with the schema or schema chain to use
+        instructions: System instructions for the model
+        jsonl_in: Input path, or '-' for stdin
+        jsonl_out: Output path, or None for stdout
+        field: Dotted path of the record field to send
+        template: Prompt template
+        id_field: Dotted path of the record ID
+        resume: Skip records already completed in jsonl_out and append to it
+
+    """
+    skip_ids = completed_ids(jsonl_out) if resume and jsonl_out else set()
+    if skip_ids:
+        logging.info(f"Resuming: skipping {len(skip_ids)} completed records")
+
+    async with create_llm(settings) as llm:
+        extractor = JsonlExtractor(
+            create_chain(llm, settings, instructions), field=field, template=template, id_field=id_field
+        )
+        input_file = sys.stdin if jsonl_in == "-" else open(jsonl_in, encoding="utf-8")
+        output_file = open(jsonl_out, "a" if resume else "w", encoding="utf-8") if jsonl_out else sys.stdout
+        try:
+            stats = await extractor.run(input_file, output_file, skip_ids)
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+            if output_file is not sys.stdout:
+                output_file.close()
+        coalesced = getattr(getattr(llm, "flights", None), "coalesced", 0)
+        if coalesced:
+            logging.info(f"{coalesced} duplicate requests were answered by an identical request in flight")
+
+    logging.info(
+        f"Processed {stats.succeeded + stats.failed} records: {stats.succeeded} succeeded, {stats.failed} failed, "
+        f"{stats.skipped} skipped, [cyan]{stats.total_tokens}[/cyan] tokens"
+    )
 
 
 async def run_interactive_chat(
     initial_prompt: str,
     settings: Settings,
     instructions: str | None = None,
+    session: str | None = None,
 ) -> None:
-    """Run interactive chat mode with continuous conversation."""
+    """Run interactive chat mode with continuous conversation.
+
+    When a session name is given every turn is recorded in the session log, and an
+    existing session continues from its last response.
+    """
     # Display opening banner
     console.print("[bold]Alleycat Interactive Chat[/bold]")
 
     async with create_llm(settings) as llm:
+        packs = await load_context_packs(settings)
+        if len(packs) > 1:
+            raise ValueError(
+                f"{settings.dir_path} needs {len(packs)} requests at a context budget of {settings.context_budget} "
+                "tokens; chat needs it to fit in one. Narrow it with --include/--exclude or raise context_budget."
+            )
+        llm.remote_files.extend(packs)
+
+        session_log = open_session(llm, settings, session)
+        if session_log and session and (info := session_log.get_session(session)):
+            console.print(f"[dim]Resumed session '{session}' ({info.turns} turns)[/dim]")
+
         # Prepare response format based on settings
         response_format: ResponseFormat = None
         if settings.output_format == "json":
             response_format = ResponseFormatText(format="json")
 
-        # Initial prompt from the user
+        # Initial prompt from the user, empty when resuming without one
         current_prompt = initial_prompt
+        router = create_router(llm, settings)
 
         try:
             while True:
-                response = await llm.respond(
-                    input=current_prompt,
-                    text=response_format,
-                    instructions=instructions,
-                    web_search=settings.enable_web_search,
-                    vector_store_id=settings.vector_store_id,
-                    tools_requested=getattr(settings, "tools_requested", ""),
-                )
+                if current_prompt:
+                    # Each turn is routed on its own; the conversation carries over between models
+                    routed = {}
+                    if router:
+                        routed["model"] = router.route(route_request(llm, current_prompt, settings, instructions))
+                    # Ctrl-C while waiting or streaming cancels the request, not the chat
+                    response = await run_interruptible(
+                        llm.respond(
+                            input=current_prompt,
+                            text=response_format,
+                            instructions=instructions,
+                            web_search=settings.enable_web_search,
+                            vector_store_id=settings.vector_store_id,
+                            tools_requested=getattr(settings, "tools_requested", ""),
+                            **routed,
+                        )
+                    )
 
-                # Handle the response based on its type
-                match response:
-                    case AsyncIterator():
-                        # For streaming, we need to accumulate the response as we display it
-                        accumulated_text = ""
-                        with Live(console=console, refresh_per_second=4) as live:
-                            async for event in response:
-                                accumulated_text, should_continue = handle_stream_event(
-                                    event,
-                                    accumulated_text,
-                                    live,
-                                    settings.output_format,
-                                )
-                                if not should_continue:
-                                    break
-                    case _:
-                        handle_non_stream_response(response, console, settings.output_format)
+                    # Handle the response based on its type
+                    completed = True
+                    match response:
+                        case None:
+                            accumulated_text, completed = "", False
+                        case AsyncIterator():
+                            # For streaming, we need to accumulate the response as we display it
+                            streamed = await run_interruptible(
+                                stream_response(response, settings.output_format, settings)
+                            )
+                            if streamed is None:
+                                # Cancelled before the stream was read
+                                await close_stream(response)
+                                streamed = ("", False)
+                            accumulated_text, completed = streamed
+                        case _:
+                            handle_non_stream_response(response, console, settings.output_format)
+                            accumulated_text = response.output_text
+
+                    if not completed:
+                        console.print("[dim]Response cancelled[/dim]")
+                    record_turn(
+                        session_log, llm, session, current_prompt, accumulated_text, completed, routed.get("model")
+                    )
 
                 # Get the next prompt from the user
                 console.print("")
@@ -429,6 +1180,9 @@ async def run_interactive_chat(
 
                 logging.error(traceback.format_exc())
             raise
+        finally:
+            if session_log:
+                session_log.close()
 
 
 @app.command(context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
@@ -438,12 +1192,18 @@ def chat(
     temperature: float | None = temperature_option,
     output_mode: OutputMode | None = mode_option,
     api_key: str | None = api_key_option,
+    provider: str | None = provider_option,
+    base_url: str | None = base_url_option,
     verbose: bool = verbose_option,
     stream: bool = stream_option,
     no_stream: bool = no_stream_option,
     chat_mode: bool = chat_option,
     instructions: str = instructions_option,
-    file: str = file_option,
+    file: list[str] | None = file_option,
+    directory: Path | None = dir_option,
+    include: list[str] | None = include_option,
+    exclude: list[str] | None = exclude_option,
+    reduce: list[str] | None = reduce_option,
     tools: str = tool_option,
     web: bool = web_option,
     setup: bool = setup_option,
@@ -451,6 +1211,26 @@ def chat(
     kb: list[str] = kb_option,
     schema: str = schema_option,
     schema_chain: str = schema_chain_option,
+    validate: bool = validate_option,
+    validate_retries: int = validate_retries_option,
+    tag: str | None = tag_option,
+    jsonl_in: str | None = jsonl_in_option,
+    jsonl_out: Path | None = jsonl_out_option,
+    field: str | None = field_option,
+    template: str | None = template_option,
+    id_field: str = id_field_option,
+    concurrency: int | None = concurrency_option,
+    jsonl_resume: bool = jsonl_resume_option,
+    session: str | None = session_option,
+    latency_budget: float | None = latency_budget_option,
+    hedge: float | None = hedge_option,
+    tee: Path | None = tee_option,
+    event_log: Path | None = event_log_option,
+    models: str | None = models_option,
+    compare_dir: Path | None = compare_dir_option,
+    evaluate: Path | None = evaluate_option,
+    log_level: str | None = log_level_option,
+    log_json: str | None = log_json_option,
 ) -> None:
     """Send a prompt to the LLM and get a response.
 
@@ -460,12 +1240,18 @@ def chat(
         temperature: Sampling temperature (overrides config)
         output_mode: Output mode (text, markdown, json)
         api_key: OpenAI API key (overrides config)
+        provider: Backend profile (overrides config)
+        base_url: Base URL of an OpenAI-compatible API (overrides config)
         verbose: Enable verbose debug output
         stream: Stream the response as it's generated
         no_stream: Disable response streaming
         chat_mode: Interactive chat mode with continuous conversation
         instructions: System instructions for the model
-        file: Path to a file to use in the conversation
+        file: Files or glob patterns to use in the conversation
+        directory: Directory whose text files are packed into the context
+        include: Glob patterns of directory files to pack
+        exclude: Glob patterns of directory files and directories to skip
+        reduce: Reducers for text files, as EXT=STAGE
         tools: Enabled tools (web, file-search)
         web: Enable web search (alias for --tool web)
         setup: Run the setup wizard to configure AlleyCat
@@ -473,12 +1259,36 @@ def chat(
         kb: Knowledge base name to use for search (can be repeated)
         schema: Path to JSON schema file for structured output
         schema_chain: Comma-separated paths to JSON schema files for chained processing
+        validate: Validate --schema output locally and fail if it does not match
+        validate_retries: Re-ask the model up to N times when validation fails
+        tag: Tag recorded with this request in the usage ledger
+        jsonl_in: JSONL input file ('-' for stdin) to run through the schema
+        jsonl_out: JSONL output file (default stdout)
+        field: Dotted path of the record field to send
+        template: Prompt template for JSONL records
+        id_field: Dotted path of the record ID
+        concurrency: Concurrent requests per schema stage
+        jsonl_resume: Skip records already completed in the output file
+        session: Name of the chat session to resume or start
+        latency_budget: Latency budget in milliseconds for model routing
+        hedge: Time to first token percentile after which a request is hedged
+        tee: File the streamed response text is also written to
+        event_log: NDJSON file the response stream events are appended to
+        models: Comma-separated models to compare
+        compare_dir: Directory the compared answers are written to
+        evaluate: JSON test case the compared answers are scored against
+        log_level: Lowest level of the messages logged
+        log_json: File or file descriptor number logs are written to as JSON lines
 
     """
     try:
         # Configure logging
         if verbose:
             logging.set_verbose(True)
+        if log_level:
+            logging.set_level(log_level)
+        if log_json:
+            logging.set_json_sink(log_json)
 
         # Check if setup was requested
         if setup:
@@ -492,12 +1302,29 @@ def chat(
             admin_app(["setup", "--remove"])
             return
 
-        # Get prompt from command line args or stdin
-        prompt = " ".join(ctx.args) if ctx.args else get_prompt_from_stdin()
+        # Get prompt from command line args or stdin; JSONL mode takes its prompts from the records
+        if jsonl_in:
+            prompt = ""
+            if not (schema or schema_chain):
+                logging.error("--jsonl-in requires --schema or --schema-chain")
+                sys.exit(1)
+            if jsonl_resume and not jsonl_out:
+                logging.error("--jsonl-resume requires --jsonl-out")
+                sys.exit(1)
+        else:
+            prompt = " ".join(ctx.args) if ctx.args else get_prompt_from_stdin()
+
+        # A comparison test case brings its own prompt
+        test_case = LLMTestCase.model_validate_json(evaluate.read_text()) if evaluate else None
+        if not prompt and test_case:
+            prompt = test_case.prompt
 
         # Check if prompt is required
-        if not prompt:
-            if chat_mode:
+        if not prompt and not jsonl_in:
+            if chat_mode and session:
+                # Resumed sessions wait for the user rather than sending a greeting
+                pass
+            elif chat_mode:
                 # In chat mode, use a default greeting if no prompt is provided
                 prompt = "Hello! I'm ready to chat."
                 logging.info("Starting chat with default greeting.")
@@ -517,6 +1344,7 @@ def chat(
 
         # 2. Load from config file
         settings.load_from_file()
+        schema_manager.cache_dir = settings.schema_cache_dir
 
         # Handle schema options first to ensure proper streaming behavior
         if schema:
@@ -524,6 +1352,9 @@ def chat(
                 # Validate and load the schema
                 schema_obj = schema_manager.get_schema(schema)
                 settings.output_format = "schema"
+                settings.schema_file = Path(schema)
+                settings.validate_output = validate
+                settings.validate_retries = validate_retries
                 # Store the response format directly in settings
                 settings.response_format = schema_obj.to_request_format()
                 # Disable streaming for schema output
@@ -544,11 +1375,11 @@ def chat(
                     schema_manager.validate_schema_file(schema_path)
                 settings.schema_chain = schema_paths
                 settings.output_format = "schema"
+                settings.validate_output = validate
                 # Disable streaming for schema chain
                 settings.stream = False
                 if stream:
                     logging.info("Streaming disabled for schema chain output format")
-                # TODO: Implement schema chain response format
             except SchemaValidationError as e:
                 logging.error(f"Schema validation error: {e}")
                 sys.exit(1)
@@ -559,10 +1390,32 @@ def chat(
         # Override settings with any provided arguments
         if api_key:
             settings.openai_api_key = api_key
+        if provider:
+            try:
+                settings.provider = get_profile(provider).name  # type: ignore[assignment]
+            except ValueError as e:
+                logging.error(str(e))
+                sys.exit(1)
+        if base_url:
+            settings.openai_base_url = base_url
         if model:
+            # An explicit model wins over the routing rules
             settings.model = model
+            settings.routes = []
+        if latency_budget is not None:
+            settings.latency_budget_ms = latency_budget
+        if hedge is not None:
+            settings.hedge_percentile = hedge
+        if tee:
+            settings.stream_tee = tee
+        if event_log:
+            settings.event_log = event_log
         if temperature is not None:
             settings.temperature = temperature
+        if tag:
+            settings.usage_tag = tag
+        if concurrency:
+            settings.chain_concurrency = concurrency
         if output_mode:
             settings.output_format = output_mode.value  # Use the value from the enum
             # Disable streaming for JSON output
@@ -581,9 +1434,15 @@ def chat(
         elif stream and settings.output_format not in ("json", "schema"):
             settings.stream = stream
 
-        # Set file path
-        if file is not None:
-            settings.file_path = file
+        # Set file paths
+        if file:
+            settings.file_paths = expand_file_patterns(file)
+        if directory is not None:
+            settings.dir_path = directory
+            settings.dir_include = include or []
+            settings.dir_exclude = exclude or []
+        if reduce:
+            settings.file_reducers = parse_reduce_options(reduce)
 
         # Process tools
         if tools:
@@ -666,8 +1525,8 @@ def chat(
             else:
                 instruction_text = instructions
 
-        # Validate required settings
-        if not settings.openai_api_key:
+        # Validate required settings, local backends need no API key
+        if not settings.openai_api_key and get_profile(settings.provider).requires_api_key:
             # No API key found, check if config file exists
             if settings.config_file is None or not settings.config_file.exists():
                 # No config file and no API key, run initialization wizard automatically
@@ -699,16 +1558,25 @@ def chat(
                 f"tools_requested={settings.tools_requested}"
             )
 
+        if models:
+            model_list = [name.strip() for name in models.split(",") if name.strip()]
+            # Answers are streamed to measure the time to first token
+            settings.stream = True
+            asyncio.run(run_comparison(prompt, settings, model_list, instruction_text, compare_dir, test_case))
+        elif jsonl_in:
+            asyncio.run(
+                run_jsonl(settings, instruction_text, jsonl_in, jsonl_out, field, template, id_field, jsonl_resume)
+            )
         # Run in interactive chat mode if --chat is specified
-        if chat_mode:
+        elif chat_mode:
             try:
-                asyncio.run(run_interactive_chat(prompt, settings, instruction_text))
+                asyncio.run(run_interactive_chat(prompt, settings, instruction_text, session))
             except KeyboardInterrupt:
                 logging.info("Chat session ended by user.")
                 sys.exit(0)
         else:
             # Run the normal chat interaction
-            asyncio.run(run_chat(prompt, settings, instruction_text))
+            asyncio.run(run_chat(prompt, settings, instruction_text, session))
 
     except ValueError as e:
         # This could be due to file setup issues
@@ -729,6 +1597,17 @@ def chat(
         sys.exit(1)
 
 
+def main() -> None:
+    """Run the alleycat command.
+
+    Everything except the `batch` subcommands is handled by chat, so the prompt can
+    be given as plain arguments.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_app(sys.argv[2:], prog_name="alleycat batch")
+    else:
+        app()
+
+
 if __name__ == "__main__":
-    # Run the Typer app directly - all command line args are handled by chat
-    app()
+    main()
@@ -0,0 +1,35 @@
+"""Model routing rules.
+
+The rules live with the settings rather than the router, so loading the settings
+does not import the LLM clients.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from pydantic import BaseModel, Field
+
+
+class RouteRequest(BaseModel):
+    """What the router knows about a request."""
+
+    prompt_tokens: int = 0  # Estimated tokens of the instructions, files and input
+    output_format: str = "text"
+    tools: bool = False
+    latency_budget_ms: float | None = None  # Skip models whose p95 latency is above this
+
+
+class RouteRule(BaseModel):
+    """Send matching requests to a model. Unset conditions match every request."""
+
+    model: str
+    max_prompt_tokens: int | None = Field(default=None, description="Largest estimated prompt the rule accepts")
+    output_formats: list[str] = Field(default_factory=list, description="Output formats the rule accepts, any if empty")
+    tools: bool | None = Field(default=None, description="Whether requests must (True) or must not (False) use tools")
+
+    def matches(self, request: RouteRequest) -> bool:
+        """Check whether a request meets the rule's conditions."""
+        if self.max_prompt_tokens is not None and request.prompt_tokens > self.max_prompt_tokens:
+            return False
+        if self.output_formats and request.output_format not in self.output_formats:
+            return False
+        return self.tools is None or self.tools == request.tools
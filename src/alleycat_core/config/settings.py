@@ -1,52 +1,156 @@
 """Configuration settings for AlleyCat."""
 
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Literal
 
 from platformdirs import user_config_dir, user_data_dir
-from pydantic import Field, model_validator
+from pydantic import Field, PrivateAttr, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from alleycat_core import logging
+from alleycat_core.config.routes import RouteRule
+
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory file locks, saves are atomic but not merged under a lock
+    fcntl = None  # type: ignore[assignment]
+
+_MISSING = object()
+
+
+def merge_changes(current: Any, before: Any, after: Any) -> Any:
+    """Apply the changes made from one version of a value to another onto a third.
+
+    Dictionaries are merged key by key, recursively, so entries changed by someone
+    else since `before` was read are kept. Any other value is replaced by `after`.
+
+    Args:
+        current: The value now stored
+        before: The value when it was read
+        after: The value to store
+
+    Returns:
+        The merged value
+
+    """
+    if not (isinstance(current, dict) and isinstance(before, dict) and isinstance(after, dict)):
+        return after
+    merged = dict(current)
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, _MISSING), after.get(key, _MISSING)
+        if old == new:
+            continue
+        if new is _MISSING:
+            merged.pop(key, None)
+        else:
+            merged[key] = merge_changes(merged.get(key, _MISSING), old, new)
+    return merged
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on a file's sidecar lock file."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 
 class Settings(BaseSettings):
     """AlleyCat configuration settings."""
 
     # LLM Provider settings
-    provider: Literal["openai"] = "openai"
+    provider: Literal["openai", "vllm", "llama.cpp", "ollama", "compatible"] = Field(
+        default="openai", description="Provider profile, local profiles use Chat Completions"
+    )
     openai_api_key: str = Field(default="", description="OpenAI API key")
+    openai_base_url: str | None = Field(default=None, description="Base URL of an OpenAI-compatible API")
+    prompt_cache_key: str | None = Field(
+        default=None, description="Prompt cache routing key, derived from the instructions and files when unset"
+    )
     model: str = Field(default="gpt-4o-mini", description="Model to use")
     temperature: float = Field(default=0.7, description="Sampling temperature", ge=0.0, le=2.0)
     max_tokens: int | None = Field(default=None, description="Maximum number of tokens to generate")
 
+    # Stall handling settings
+    idle_timeout: float | None = Field(
+        default=60.0, gt=0.0, description="Seconds a response stream may go without an event before it is resumed"
+    )
+    response_deadline: float | None = Field(
+        default=None, gt=0.0, description="Seconds a whole response may take, including resumed streams"
+    )
+    stall_retries: int = Field(default=2, ge=0, description="Times a stalled response stream is requested again")
+
+    # Model routing settings
+    routes: list[RouteRule] = Field(
+        default_factory=list, description="Rules picking a model per request, fastest first; model is the fallback"
+    )
+    escalation_models: list[str] = Field(
+        default_factory=list, description="Stronger models, weakest first, tried when output fails validation"
+    )
+    latency_budget_ms: float | None = Field(
+        default=None, description="Skip routed models whose recorded p95 latency is above this"
+    )
+    hedge_percentile: float | None = Field(
+        default=None, gt=0.0, le=100.0, description="Send a duplicate request when the first token is slower than this"
+    )
+
     # File settings
-    file_path: str | None = Field(default=None, description="Path to a file to upload")
+    file_paths: list[str] = Field(default_factory=list, description="Paths to files to attach to the conversation")
+    dir_path: Path | None = Field(default=None, description="Directory whose text files are packed into the context")
+    dir_include: list[str] = Field(default_factory=list, description="Glob patterns of directory files to include")
+    dir_exclude: list[str] = Field(default_factory=list, description="Glob patterns of directory files to exclude")
+    context_budget: int = Field(
+        default=100_000, ge=1, description="Estimated tokens of directory files packed into one request"
+    )
+    file_reducers: dict[str, list[str]] = Field(
+        default_factory=dict, description="Reducers run over text files before they are sent, by file extension"
+    )
     file_id: str | None = Field(default=None, description="ID of the uploaded file")
 
     # Chat settings
-    history_file: Path | None = Field(default=None, description="Path to chat history file")
+    history_file: Path | None = Field(default=None, description="Path to the SQLite chat session log")
     max_history: int = Field(default=100, description="Maximum number of messages to keep in history")
 
+    # Usage ledger settings
+    record_usage: bool = Field(default=True, description="Record every request in the local usage ledger")
+    usage_db: Path | None = Field(default=None, description="Path to the SQLite usage ledger")
+    usage_tag: str | None = Field(default=None, description="Tag stored with usage records, e.g. a job name")
+
     # Output settings
     output_format: Literal["text", "markdown", "json", "schema"] = Field(
         default="text", description="Output format for responses"
     )
     stream: bool = Field(default=False, description="Whether to stream responses from the LLM")
     response_format: Any | None = Field(default=None, description="Response format configuration for the LLM")
+    stream_tee: Path | None = Field(default=None, description="File streamed response text is also written to")
+    event_log: Path | None = Field(default=None, description="NDJSON file every response stream event is appended to")
 
     # Schema settings
     schema_file: Path | None = Field(default=None, description="Path to JSON schema file")
     schema_chain: list[Path] = Field(default_factory=list, description="List of schema files for chained processing")
+    chain_concurrency: int = Field(default=4, description="Concurrent requests per schema chain stage", ge=1)
     schema_cache_dir: Path | None = Field(default=None, description="Directory for caching schema files")
+    validate_output: bool = Field(default=False, description="Validate schema output locally before returning it")
+    validate_retries: int = Field(default=0, description="Times to re-ask the model when output fails validation", ge=0)
 
     # Knowledge Base settings
     knowledge_bases: dict[str, str] = Field(
         default_factory=dict, description="Mapping of friendly names to vector store IDs"
     )
     kb_files: dict[str, dict[str, str]] = Field(
-        default_factory=dict, description="Mapping of vector store IDs to files (file_id -> file_path)"
+        default_factory=dict, description="Legacy vector store file mappings, moved to kb_index by the admin commands"
     )
+    kb_index: Path | None = Field(default=None, description="Path to the SQLite index of knowledge base files")
     default_kb: str | None = Field(default=None, description="Default knowledge base to use")
 
     # Tool settings
@@ -60,6 +164,9 @@ class Settings(BaseSettings):
     # Config settings
     config_file: Path | None = Field(default=None, description="Path to config file")
 
+    # Config file values as last loaded or saved, to find what this process changed
+    _saved: dict[str, Any] = PrivateAttr(default_factory=dict)
+
     model_config = SettingsConfigDict(
         env_prefix="ALLEYCAT_", env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
@@ -75,8 +182,7 @@ class Settings(BaseSettings):
 
         # Then load settings from file
         self.load_from_file()
-        logging.debug(f"After initialization, knowledge_bases: {self.knowledge_bases}")
-        logging.debug(f"After initialization, kb_files: {self.kb_files}")
+        logging.debug("After initialization, knowledge_bases: %s", self.knowledge_bases)
 
     @model_validator(mode="after")
     def set_default_paths(self) -> "Settings":
@@ -90,7 +196,17 @@ class Settings(BaseSettings):
         if self.history_file is None:
             data_dir = Path(user_data_dir("alleycat"))
             data_dir.mkdir(parents=True, exist_ok=True)
-            self.history_file = data_dir / "history.json"
+            self.history_file = data_dir / "history.db"
+
+        if self.usage_db is None:
+            data_dir = Path(user_data_dir("alleycat"))
+            data_dir.mkdir(parents=True, exist_ok=True)
+            self.usage_db = data_dir / "usage.db"
+
+        if self.kb_index is None:
+            data_dir = Path(user_data_dir("alleycat"))
+            data_dir.mkdir(parents=True, exist_ok=True)
+            self.kb_index = data_dir / "kb.db"
 
         if self.personas_dir is None:
             config_dir = Path(user_config_dir("alleycat"))
@@ -107,9 +223,18 @@ class Settings(BaseSettings):
         return self
 
     def load_from_file(self) -> None:
-        """Load settings from config file if it exists."""
+        """Load settings from config file if it exists.
+
+        The loaded settings are remembered, so that save_to_file only writes the
+        settings changed since.
+        """
+        self._read_config_file()
+        self._saved = self._config_data()
+
+    def _read_config_file(self) -> None:
+        """Update the settings from the config file."""
         if self.config_file is None or not self.config_file.exists():
-            logging.debug(f"No config file found at {self.config_file}")
+            logging.debug("No config file found at %s", self.config_file)
             return
 
         # Parse YAML file
@@ -120,10 +245,10 @@ class Settings(BaseSettings):
                 config_data = yaml.safe_load(f)
 
             if not config_data:
-                logging.debug(f"Config file at {self.config_file} is empty or invalid")
+                logging.debug("Config file at %s is empty or invalid", self.config_file)
                 return
 
-            logging.debug(f"Loaded raw data from {self.config_file}: {config_data}")
+            logging.debug("Loaded raw data from %s: %s", self.config_file, config_data)
 
             # Only update fields that are explicitly set in the config file
             for key, value in config_data.items():
@@ -136,39 +261,65 @@ class Settings(BaseSettings):
                     else:
                         setattr(self, key, value)
 
-            logging.debug(f"After loading, knowledge_bases: {self.knowledge_bases}")
-            logging.debug(f"After loading, kb_files: {self.kb_files}")
+            logging.debug("After loading, knowledge_bases: %s", self.knowledge_bases)
         except Exception as e:
             logging.error(f"Error loading settings: {e}")
             import traceback
 
             logging.debug(traceback.format_exc())
 
+    def _config_data(self) -> dict[str, Any]:
+        """Get the settings as they are stored in the config file."""
+        config_data = {}
+        for key, value in self.model_dump().items():
+            # Skip None values and Path objects
+            if value is None or isinstance(value, Path | bytes):
+                continue
+            config_data[key] = value
+        return config_data
+
     def save_to_file(self) -> None:
-        """Save current settings to config file."""
+        """Save the settings changed since they were loaded to the config file.
+
+        Several processes may save at once, e.g. parallel `alleycat-admin kb` commands.
+        Under a lock on the file, the current file is read again, this process's changes
+        are merged into it, and the result is written to a temporary file that replaces
+        the config file, so no process loses another's changes or sees a partial file.
+        """
         if self.config_file is None:
             logging.debug("No config file path set")
             return
 
         # Ensure parent directory exists
         self.config_file.parent.mkdir(parents=True, exist_ok=True)
-
-        # Convert to dict, excluding None values and objects that can't be serialized
-        config_data = {}
-        for key, value in self.model_dump().items():
-            # Skip None values and Path objects
-            if value is None or isinstance(value, Path | bytes):
-                continue
-            config_data[key] = value
+        config_data = self._config_data()
 
         try:
-            # Write to YAML file
             import yaml
 
-            with open(str(self.config_file), "w", encoding="utf-8") as f:
-                yaml.dump(config_data, f, default_flow_style=False)
-
-            logging.debug(f"Saved settings to {self.config_file}")
-            logging.debug(f"Saved knowledge_bases: {self.knowledge_bases}")
+            with locked(self.config_file):
+                current: dict[str, Any] = {}
+                if self.config_file.exists():
+                    with open(self.config_file, encoding="utf-8") as f:
+                        current = yaml.safe_load(f) or {}
+                merged = merge_changes(current, self._saved, config_data)
+                # File mappings live in the KB index once migrated
+                if not merged.get("kb_files", True):
+                    del merged["kb_files"]
+
+                fd, temp_path = tempfile.mkstemp(dir=self.config_file.parent, prefix=".config.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        yaml.dump(merged, f, default_flow_style=False)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_path, self.config_file)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+
+            self._saved = config_data
+            logging.debug("Saved settings to %s", self.config_file)
+            logging.debug("Saved knowledge_bases: %s", self.knowledge_bases)
         except Exception as e:
             logging.error(f"Error saving settings: {e}")
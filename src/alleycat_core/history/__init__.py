@@ -0,0 +1,11 @@
+"""Chat history for AlleyCat.
+
+This package contains the session log that stores the turns of named chat
+sessions so they can be resumed with `alleycat --chat --resume NAME`.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from .sessions import SessionInfo, SessionLog, Turn
+
+__all__ = ["SessionInfo", "SessionLog", "Turn"]
@@ -0,0 +1,245 @@
+"""SQLite backed chat session log.
+
+Each turn of a named chat session is appended with its response ID and token usage.
+The Responses API keeps the conversation on the server, so resuming a session only
+needs the last response ID - the stored turns are never replayed to the model.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from .. import logging
+from ..llm.types import ResponseUsage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    name TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    last_response_id TEXT
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL REFERENCES sessions (name) ON DELETE CASCADE,
+    created_at REAL NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    response_id TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id);
+"""
+
+_TURN_COLUMNS = (
+    "created_at",
+    "model",
+    "prompt",
+    "response",
+    "response_id",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+)
+
+
+class Turn(BaseModel):
+    """A prompt and its response in a chat session."""
+
+    created_at: float = Field(default_factory=time.time, description="Unix time the turn was stored")
+    model: str = ""
+    prompt: str
+    response: str
+    response_id: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+
+class SessionInfo(BaseModel):
+    """Summary of a stored chat session."""
+
+    name: str
+    created_at: float
+    updated_at: float
+    model: str
+    last_response_id: str | None
+    turns: int
+
+
+class SessionLog:
+    """Append-only log of named chat sessions."""
+
+    def __init__(self, path: Path, max_history: int = 100):
+        """Initialize the session log.
+
+        The database is opened lazily on first use.
+
+        Args:
+            path: Path to the SQLite database file
+            max_history: Maximum number of messages (prompts and responses) kept per session
+
+        """
+        self.path = path
+        self.max_history = max_history
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema if needed."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=10.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get_session(self, name: str) -> SessionInfo | None:
+        """Get a stored session.
+
+        Args:
+            name: Session name
+
+        Returns:
+            The session, or None if no session has that name
+
+        """
+        row = (
+            self._connect()
+            .execute(
+                "SELECT s.name, s.created_at, s.updated_at, s.model, s.last_response_id, COUNT(t.id) "
+                "FROM sessions s LEFT JOIN turns t ON t.session = s.name WHERE s.name = ? GROUP BY s.name",
+                (name,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return SessionInfo(
+            name=row[0], created_at=row[1], updated_at=row[2], model=row[3], last_response_id=row[4], turns=row[5]
+        )
+
+    def sessions(self) -> list[SessionInfo]:
+        """List stored sessions, most recently used first."""
+        names = [row[0] for row in self._connect().execute("SELECT name FROM sessions ORDER BY updated_at DESC")]
+        return [session for name in names if (session := self.get_session(name)) is not None]
+
+    def append(self, session: str, turn: Turn) -> None:
+        """Append a turn to a session, creating the session if needed.
+
+        The session's last response ID is updated so it can be resumed from this turn,
+        and the oldest turns are pruned beyond max_history. Failures are logged rather
+        than raised - losing history must never fail the chat it describes.
+
+        Args:
+            session: Session name
+            turn: The turn to store
+
+        """
+        try:
+            conn = self._connect()
+            values = turn.model_dump()
+            with conn:
+                conn.execute(
+                    "INSERT INTO sessions (name, created_at, updated_at, model, last_response_id) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                    "updated_at = excluded.updated_at, model = excluded.model, "
+                    "last_response_id = COALESCE(excluded.last_response_id, last_response_id)",
+                    (session, turn.created_at, turn.created_at, turn.model, turn.response_id),
+                )
+                conn.execute(
+                    f"INSERT INTO turns (session, {', '.join(_TURN_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(_TURN_COLUMNS))})",
+                    [session, *(values[column] for column in _TURN_COLUMNS)],
+                )
+                # Each turn holds two messages, a prompt and its response
+                keep = max(1, self.max_history // 2)
+                conn.execute(
+                    "DELETE FROM turns WHERE session = ? AND id NOT IN "
+                    "(SELECT id FROM turns WHERE session = ? ORDER BY id DESC LIMIT ?)",
+                    (session, session, keep),
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not record chat history in {self.path}: {e}")
+
+    def record(
+        self,
+        session: str,
+        prompt: str,
+        response: str,
+        *,
+        model: str = "",
+        response_id: str | None = None,
+        usage: ResponseUsage | None = None,
+    ) -> None:
+        """Append a turn built from a prompt and its response.
+
+        Args:
+            session: Session name
+            prompt: The user's prompt
+            response: The response text
+            model: Model that produced the response
+            response_id: ID of the response, used to resume the session
+            usage: Token usage of the response
+
+        """
+        usage = usage or ResponseUsage(total_tokens=0, prompt_tokens=0, completion_tokens=0)
+        self.append(
+            session,
+            Turn(
+                model=model,
+                prompt=prompt,
+                response=response,
+                response_id=response_id,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens,
+            ),
+        )
+
+    def turns(self, session: str, limit: int | None = None) -> list[Turn]:
+        """Get the stored turns of a session, oldest first.
+
+        Args:
+            session: Session name
+            limit: Only return the most recent turns
+
+        Returns:
+            The stored turns
+
+        """
+        query = f"SELECT {', '.join(_TURN_COLUMNS)} FROM turns WHERE session = ? ORDER BY id DESC"
+        params: list[object] = [session]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._connect().execute(query, params).fetchall()
+        return [Turn.model_validate(dict(zip(_TURN_COLUMNS, row, strict=True))) for row in reversed(rows)]
+
+    def delete(self, session: str) -> bool:
+        """Delete a session and its turns.
+
+        Args:
+            session: Session name
+
+        Returns:
+            True if the session existed
+
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE name = ?", (session,))
+        return cursor.rowcount > 0
@@ -7,6 +7,17 @@ Author: Andrew Watkins <andrew@groat.nz>
 """
 
 from .base import KBProvider
+from .gc import OrphanReport, delete_orphans, find_orphans
+from .index import KBFile, KBIndex
 from .openai import OpenAIKBFactory, OpenAIKBProvider
 
-__all__ = ["KBProvider", "OpenAIKBProvider", "OpenAIKBFactory"]
+__all__ = [
+    "KBFile",
+    "KBIndex",
+    "KBProvider",
+    "OpenAIKBProvider",
+    "OpenAIKBFactory",
+    "OrphanReport",
+    "delete_orphans",
+    "find_orphans",
+]
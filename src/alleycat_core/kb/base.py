@@ -106,6 +106,29 @@ class KBProvider(ABC):
         """
         pass
 
+    @abstractmethod
+    async def list_account_files(self) -> list[dict[str, Any]]:
+        """List every file uploaded to the account, whether or not it is in a vector store.
+
+        Returns:
+            List of dictionaries containing file information
+
+        """
+        pass
+
+    @abstractmethod
+    async def delete_account_file(self, file_id: str) -> bool:
+        """Delete a file from the account, detaching it from any vector store.
+
+        Args:
+            file_id: ID of the file to delete
+
+        Returns:
+            True if deletion was successful, False otherwise
+
+        """
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         """Clean up resources and close any open connections.
@@ -0,0 +1,118 @@
+"""Garbage collection of orphaned account files.
+
+Files uploaded for a knowledge base that never reached a vector store, and files
+uploaded for a chat by a run that crashed before deleting them, stay in the account,
+costing storage and slowing down file listings. An orphan is an account file that
+alleycat uploaded, as recorded in the KB index, that no vector store holds and that
+no knowledge base in the index lists. Files uploaded by other applications sharing
+the account are never orphans, nor are recent files, since another alleycat process
+may be about to use them.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from .. import logging
+from .base import KBProvider
+from .index import KBIndex
+
+# Purposes of the files alleycat uploads, for knowledge bases and for chats
+GC_PURPOSES = frozenset({"assistants", "user_data"})
+
+
+@dataclass
+class OrphanReport:
+    """The orphaned files of an account, and what became of them."""
+
+    orphans: list[dict[str, Any]] = field(default_factory=list)
+    scanned: int = 0  # Account files listed
+    in_use: int = 0  # Files held by a vector store or known to the KB index
+    skipped: int = 0  # Files too recent, or uploaded for another purpose
+    foreign: int = 0  # Files alleycat has no record of uploading
+    deleted: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def orphan_bytes(self) -> int:
+        """Total size of the orphaned files."""
+        return sum(file.get("bytes") or 0 for file in self.orphans)
+
+
+async def find_orphans(
+    provider: KBProvider,
+    index: KBIndex | None = None,
+    *,
+    purposes: frozenset[str] = GC_PURPOSES,
+    min_age: float = 24 * 60 * 60,
+    concurrency: int = 8,
+    now: float | None = None,
+) -> OrphanReport:
+    """Find the account files that nothing uses.
+
+    The account files and the files of every vector store are listed concurrently.
+    If any listing fails the error is raised, rather than treating files that could
+    not be checked as orphans.
+
+    Args:
+        provider: The KB provider of the account
+        index: The KB index, recording the files alleycat uploaded; without it nothing is an orphan
+        purposes: Purposes of the files that may be collected
+        min_age: Seconds a file must have existed to be an orphan
+        concurrency: Most vector stores to list at once
+        now: Unix time to measure file ages from, the current time by default
+
+    Returns:
+        A report of the orphans found
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def store_file_ids(vector_store_id: str) -> set[str]:
+        async with semaphore:
+            return {file["id"] for file in await provider.list_files(vector_store_id)}
+
+    async def attached_file_ids() -> set[str]:
+        stores = await provider.list_vector_stores()
+        logging.debug("Listing the files of %d vector stores", len(stores))
+        return set().union(*await asyncio.gather(*(store_file_ids(store["id"]) for store in stores)))
+
+    account_files, attached = await asyncio.gather(provider.list_account_files(), attached_file_ids())
+    in_use = attached | (index.file_ids() if index is not None else set())
+    uploaded = index.upload_ids() if index is not None else set()
+    cutoff = (time.time() if now is None else now) - min_age
+
+    report = OrphanReport(scanned=len(account_files))
+    for file in account_files:
+        if file.get("purpose") not in purposes or (file.get("created_at") or 0) > cutoff:
+            report.skipped += 1
+        elif file["id"] in in_use:
+            report.in_use += 1
+        elif file["id"] not in uploaded:
+            report.foreign += 1
+        else:
+            report.orphans.append(file)
+    return report
+
+
+async def delete_orphans(provider: KBProvider, report: OrphanReport, *, concurrency: int = 8) -> None:
+    """Delete the orphans of a report concurrently, recording which were deleted and which failed.
+
+    Args:
+        provider: The KB provider of the account
+        report: The report from find_orphans, updated in place
+        concurrency: Most files to delete at once
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def delete(file_id: str) -> None:
+        async with semaphore:
+            deleted = await provider.delete_account_file(file_id)
+        (report.deleted if deleted else report.failed).append(file_id)
+
+    await asyncio.gather(*(delete(file["id"]) for file in report.orphans))
+    logging.info("Deleted %d orphaned files, %d failed", len(report.deleted), len(report.failed))
@@ -0,0 +1,224 @@
+"""SQLite index of knowledge base files.
+
+Every file added to a knowledge base is recorded with its vector store, local path
+and content hash, indexed for lookups by file ID, path and hash. The index lives in
+its own database rather than config.yml, so it is only read by the admin commands
+that need it and stays fast with tens of thousands of files.
+
+Every file alleycat uploads, for a knowledge base or a chat, is also recorded until
+it is deleted, so garbage collection only ever deletes alleycat's own uploads.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kb_files (
+    vector_store_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (vector_store_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS kb_files_file_id ON kb_files (file_id);
+CREATE INDEX IF NOT EXISTS kb_files_path ON kb_files (path);
+CREATE INDEX IF NOT EXISTS kb_files_hash ON kb_files (hash);
+CREATE TABLE IF NOT EXISTS uploads (
+    file_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    uploaded_at REAL NOT NULL
+);
+"""
+
+_COLUMNS = ("vector_store_id", "file_id", "path", "hash", "added_at")
+
+# Path recorded for files found in a vector store but not added through alleycat
+UNKNOWN_PATH = "Unknown (added to KB)"
+
+
+def file_hash(path: Path) -> str:
+    """Get the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class KBFile(BaseModel):
+    """A file in a knowledge base."""
+
+    vector_store_id: str
+    file_id: str
+    path: str
+    hash: str | None = None  # SHA-256 of the content when it was added
+    added_at: float = Field(default_factory=time.time, description="Unix time the file was added")
+
+
+class KBIndex:
+    """Index of the files in each knowledge base."""
+
+    def __init__(self, path: Path):
+        """Initialize the index.
+
+        The database is opened lazily on first use.
+
+        Args:
+            path: Path to the SQLite database file
+
+        """
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema if needed."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=10.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _select(self, where: str, params: tuple[str, ...]) -> list[KBFile]:
+        """Get the files matching a WHERE clause, oldest first."""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM kb_files WHERE {where} ORDER BY added_at, file_id", params
+        )
+        return [KBFile.model_validate(dict(zip(_COLUMNS, row, strict=True))) for row in rows]
+
+    def add(self, *files: KBFile) -> None:
+        """Add files, replacing any already recorded with the same vector store and file ID."""
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO kb_files ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [tuple(getattr(file, column) for column in _COLUMNS) for file in files],
+            )
+
+    def add_missing(self, vector_store_id: str, file_ids: list[str]) -> int:
+        """Record files found in a vector store that the index does not know, with an unknown path.
+
+        Args:
+            vector_store_id: The vector store
+            file_ids: IDs of the files in the vector store
+
+        Returns:
+            The number of files recorded
+
+        """
+        known = set(self.files(vector_store_id))
+        missing = [KBFile(vector_store_id=vector_store_id, file_id=file_id, path=UNKNOWN_PATH) for file_id in file_ids]
+        missing = [file for file in missing if file.file_id not in known]
+        if missing:
+            self.add(*missing)
+        return len(missing)
+
+    def files(self, vector_store_id: str) -> dict[str, str]:
+        """Get the paths of a knowledge base's files by file ID."""
+        rows = self._connect().execute(
+            "SELECT file_id, path FROM kb_files WHERE vector_store_id = ? ORDER BY added_at, file_id",
+            (vector_store_id,),
+        )
+        return dict(rows.fetchall())
+
+    def file_ids(self) -> set[str]:
+        """Get the IDs of the files in every knowledge base."""
+        return {row[0] for row in self._connect().execute("SELECT DISTINCT file_id FROM kb_files")}
+
+    def count(self, vector_store_id: str) -> int:
+        """Count the files of a knowledge base."""
+        row = self._connect().execute("SELECT COUNT(*) FROM kb_files WHERE vector_store_id = ?", (vector_store_id,))
+        return int(row.fetchone()[0])
+
+    def get(self, file_id: str) -> list[KBFile]:
+        """Get the records of a file ID, one per knowledge base holding it."""
+        return self._select("file_id = ?", (file_id,))
+
+    def find_by_path(self, path: str | Path, vector_store_id: str | None = None) -> list[KBFile]:
+        """Get the files added from a path, optionally in one knowledge base only."""
+        if vector_store_id is None:
+            return self._select("path = ?", (str(path),))
+        return self._select("path = ? AND vector_store_id = ?", (str(path), vector_store_id))
+
+    def find_by_hash(self, hash: str, vector_store_id: str | None = None) -> list[KBFile]:
+        """Get the files with some content, optionally in one knowledge base only."""
+        if vector_store_id is None:
+            return self._select("hash = ?", (hash,))
+        return self._select("hash = ? AND vector_store_id = ?", (hash, vector_store_id))
+
+    def remove(self, vector_store_id: str, file_id: str) -> bool:
+        """Remove a file from a knowledge base.
+
+        Returns:
+            True if the file was recorded
+
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM kb_files WHERE vector_store_id = ? AND file_id = ?", (vector_store_id, file_id)
+            )
+        return cursor.rowcount > 0
+
+    def remove_store(self, vector_store_id: str) -> int:
+        """Remove every file of a knowledge base.
+
+        Returns:
+            The number of files removed
+
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM kb_files WHERE vector_store_id = ?", (vector_store_id,))
+        return cursor.rowcount
+
+    def add_upload(self, file_id: str, path: str | Path) -> None:
+        """Record a file alleycat uploaded to the account."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (file_id, path, uploaded_at) VALUES (?, ?, ?)",
+                (file_id, str(path), time.time()),
+            )
+
+    def remove_upload(self, file_id: str) -> None:
+        """Forget an uploaded file once it is deleted from the account."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+
+    def upload_ids(self) -> set[str]:
+        """Get the IDs of the files alleycat uploaded and has not deleted."""
+        return {row[0] for row in self._connect().execute("SELECT file_id FROM uploads")}
+
+    def import_mapping(self, kb_files: dict[str, dict[str, str]]) -> int:
+        """Import the `vector store ID -> file ID -> path` mapping once kept in config.yml.
+
+        Files already in the index keep their records.
+
+        Args:
+            kb_files: The mapping to import
+
+        Returns:
+            The number of files imported
+
+        """
+        files = [
+            KBFile(vector_store_id=vs_id, file_id=file_id, path=path)
+            for vs_id, vs_files in kb_files.items()
+            for file_id, path in vs_files.items()
+        ]
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                f"INSERT OR IGNORE INTO kb_files ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [tuple(getattr(file, column) for column in _COLUMNS) for file in files],
+            )
+        return max(cursor.rowcount, 0)
@@ -16,6 +16,11 @@ from pydantic import BaseModel, Field
 
 from .. import logging
 from .base import KBProvider
+from .index import KBIndex
+
+# Largest pages the API returns, so long listings take as few requests as possible
+PAGE_SIZE = 100
+ACCOUNT_FILES_PAGE_SIZE = 10000
 
 
 class OpenAIKBConfig(BaseModel):
@@ -29,10 +34,17 @@ class OpenAIKBConfig(BaseModel):
 class OpenAIKBProvider(KBProvider):
     """OpenAI implementation of KB provider."""
 
-    def __init__(self, config: OpenAIKBConfig):
-        """Initialize the OpenAI KB provider."""
+    def __init__(self, config: OpenAIKBConfig, index: KBIndex | None = None):
+        """Initialize the OpenAI KB provider.
+
+        Args:
+            config: Provider configuration
+            index: KB index recording the files this provider uploads and deletes
+
+        """
         self.config = config
         self.client = AsyncOpenAI(api_key=config.api_key)
+        self.index = index
 
         logging.info("Initialized OpenAI KB provider")
 
@@ -72,11 +84,9 @@ class OpenAIKBProvider(KBProvider):
     async def list_vector_stores(self) -> list[dict[str, Any]]:
         """List all available vector stores."""
         try:
-            response = await self.client.vector_stores.list()
-
             return [
                 {"id": vs.id, "name": vs.name, "created_at": vs.created_at, "metadata": vs.metadata}
-                for vs in response.data
+                async for vs in self.client.vector_stores.list(limit=PAGE_SIZE)
             ]
         except Exception as e:
             logging.error(f"Error listing vector stores: {e}")
@@ -111,11 +121,17 @@ class OpenAIKBProvider(KBProvider):
         try:
             with open(file_path, "rb") as file:
                 response = await self.client.files.create(file=file, purpose=self.config.file_purpose)
+            if self.index is not None:
+                self.index.add_upload(response.id, file_path)
             return response.id
         except Exception as e:
             logging.error(f"Error uploading file {file_path}: {e}")
             raise
 
+    async def _discard_uploads(self, file_ids: list[str]) -> None:
+        """Delete uploaded files that will not be added to a vector store."""
+        await asyncio.gather(*(self.delete_account_file(file_id) for file_id in file_ids))
+
     async def add_files(self, vector_store_id: str, file_paths: Sequence[Path]) -> list[dict[str, Any]]:
         """Add files to a vector store."""
         try:
@@ -124,15 +140,25 @@ class OpenAIKBProvider(KBProvider):
             result = []
 
             # First upload all files to get file IDs
-            file_ids = await asyncio.gather(*[self._upload_file(path) for path in file_paths])
+            uploads = await asyncio.gather(*[self._upload_file(path) for path in file_paths], return_exceptions=True)
+            file_ids = [upload for upload in uploads if isinstance(upload, str)]
             logging.debug(f"Uploaded files, got file IDs: {file_ids}")
+            failures = [upload for upload in uploads if isinstance(upload, BaseException)]
+            if failures:
+                # Don't leave the files that did upload behind in the account
+                await self._discard_uploads(file_ids)
+                raise failures[0]
 
             # Process all files in a single batch instead of one by one
             logging.debug(f"Creating batch with {len(file_ids)} files")
-            response = await self.client.vector_stores.file_batches.create(
-                vector_store_id=vector_store_id,
-                file_ids=file_ids,
-            )
+            try:
+                response = await self.client.vector_stores.file_batches.create(
+                    vector_store_id=vector_store_id,
+                    file_ids=file_ids,
+                )
+            except Exception:
+                await self._discard_uploads(file_ids)
+                raise
 
             # Wait for the batch to complete processing
             batch_id = response.id
@@ -159,8 +185,7 @@ class OpenAIKBProvider(KBProvider):
             else:
                 logging.debug(f"Batch processing incomplete after {checks} checks, status: {status}")
                 # Check each file individually to see if it was processed
-                files_response = await self.client.vector_stores.files.list(vector_store_id=vector_store_id)
-                processed_file_ids = [file.id for file in files_response.data]
+                processed_file_ids = {file["id"] for file in await self.list_files(vector_store_id)}
 
                 for file_id, file_path in zip(file_ids, file_paths, strict=False):
                     if file_id in processed_file_ids:
@@ -179,9 +204,10 @@ class OpenAIKBProvider(KBProvider):
     async def list_files(self, vector_store_id: str) -> list[dict[str, Any]]:
         """List files in a vector store."""
         try:
-            response = await self.client.vector_stores.files.list(vector_store_id=vector_store_id)
-
-            return [{"id": file.id, "created_at": file.created_at, "object": file.object} for file in response.data]
+            return [
+                {"id": file.id, "created_at": file.created_at, "object": file.object}
+                async for file in self.client.vector_stores.files.list(vector_store_id=vector_store_id, limit=PAGE_SIZE)
+            ]
         except Exception as e:
             logging.error(f"Error listing files in vector store: {e}")
             raise
@@ -195,14 +221,43 @@ class OpenAIKBProvider(KBProvider):
             logging.error(f"Error deleting file from vector store: {e}")
             return False
 
+    async def list_account_files(self) -> list[dict[str, Any]]:
+        """List every file uploaded to the account, following all pages."""
+        try:
+            return [
+                {
+                    "id": file.id,
+                    "filename": file.filename,
+                    "purpose": file.purpose,
+                    "bytes": file.bytes,
+                    "created_at": file.created_at,
+                }
+                async for file in self.client.files.list(limit=ACCOUNT_FILES_PAGE_SIZE)
+            ]
+        except Exception as e:
+            logging.error("Error listing account files: %s", e)
+            raise
+
+    async def delete_account_file(self, file_id: str) -> bool:
+        """Delete a file from the account, and forget its upload."""
+        try:
+            await self.client.files.delete(file_id)
+        except Exception as e:
+            logging.error("Error deleting file %s: %s", file_id, e)
+            return False
+        if self.index is not None:
+            self.index.remove_upload(file_id)
+        return True
+
 
 class OpenAIKBFactory:
     """Factory for creating OpenAI KB provider instances."""
 
-    def create(self, **kwargs: Any) -> KBProvider:
+    def create(self, index: KBIndex | None = None, **kwargs: Any) -> KBProvider:
         """Create an OpenAI KB provider instance.
 
         Args:
+            index: KB index recording the files the provider uploads
             **kwargs: Provider-specific configuration including api_key
 
         Returns:
@@ -210,4 +265,4 @@ class OpenAIKBFactory:
 
         """
         config = OpenAIKBConfig(**kwargs)
-        return OpenAIKBProvider(config)
+        return OpenAIKBProvider(config, index)
@@ -7,16 +7,18 @@ Author: Andrew Watkins <andrew@groat.nz>
 
 from alleycat_core.config.settings import Settings
 from alleycat_core.kb.base import KBProvider
+from alleycat_core.kb.index import KBIndex
 from alleycat_core.kb.openai import OpenAIKBFactory
 
 
-async def get_kb_provider(settings: Settings) -> KBProvider:
+async def get_kb_provider(settings: Settings, index: KBIndex | None = None) -> KBProvider:
     """Get a knowledge base provider based on settings.
 
     Currently only supports OpenAI.
 
     Args:
         settings: Application settings.
+        index: KB index recording the files the provider uploads.
 
     Returns:
         A knowledge base provider.
@@ -27,6 +29,6 @@ async def get_kb_provider(settings: Settings) -> KBProvider:
     """
     if settings.openai_api_key:
         factory = OpenAIKBFactory()
-        return factory.create(api_key=settings.openai_api_key)
+        return factory.create(index, api_key=settings.openai_api_key)
 
     raise ValueError("No KB provider available. Please set OPENAI_API_KEY in your environment.")
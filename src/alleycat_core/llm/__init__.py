@@ -1,17 +1,42 @@
 """LLM provider implementations."""
 
+from ..config.routes import RouteRequest, RouteRule
 from .base import LLMFactory, LLMProvider, Message
+from .chain import ChainResult, SchemaChain, StageCache
+from .comparison import ModelRun, compare_models
 from .evaluation import LLMTestCase, ResponseEvaluation, ResponseEvaluator
+from .extract import ExtractStats, JsonlExtractor
 from .openai import OpenAIConfig, OpenAIFactory, OpenAIProvider
+from .profiles import Capability, ProviderProfile, get_profile
+from .reducers import FileReducers, ReducerPipeline
+from .routing import ModelRouter
+from .sinks import StreamPipeline, StreamSink
 
 __all__ = [
+    "Capability",
+    "ChainResult",
+    "ExtractStats",
+    "FileReducers",
+    "JsonlExtractor",
     "LLMFactory",
     "LLMProvider",
     "Message",
+    "ModelRun",
+    "ModelRouter",
     "OpenAIConfig",
     "OpenAIFactory",
     "OpenAIProvider",
+    "ProviderProfile",
+    "ReducerPipeline",
     "ResponseEvaluation",
+    "RouteRequest",
+    "RouteRule",
+    "SchemaChain",
+    "StageCache",
+    "StreamPipeline",
+    "StreamSink",
     "LLMTestCase",
     "ResponseEvaluator",
+    "compare_models",
+    "get_profile",
 ]
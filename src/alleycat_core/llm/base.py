@@ -115,6 +115,22 @@ class LLMProvider(ABC):
         """
         pass
 
+    async def add_files(self, file_paths: list[str]) -> bool:
+        """Add several files for use with the LLM.
+
+        Providers that can set files up concurrently override this; the default adds
+        them one at a time.
+
+        Args:
+            file_paths: Paths to the files to add
+
+        Returns:
+            True if every file was added successfully, False otherwise
+
+        """
+        results = [await self.add_file(file_path) for file_path in file_paths]
+        return all(results)
+
 
 class LLMFactory(Protocol):
     """Protocol for LLM provider factories."""
@@ -0,0 +1,385 @@
+"""Offline execution with the OpenAI Batch API.
+
+A JSONL file of records is turned into a Batch API input file of `/v1/responses`
+requests, uploaded with the "batch" file purpose and submitted as a batch job.
+Once the job has finished its output and error files are streamed back and
+written in input order, in the same format as `--jsonl-out`:
+
+    {"id": ..., "result": ..., "usage": {...}, "error": null}
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+import sqlite3
+import tempfile
+from collections.abc import AsyncIterator, Iterable, Iterator
+from pathlib import Path
+from typing import Any, Final, Literal, Self
+
+from openai import AsyncOpenAI
+from openai.types import Batch
+
+from .. import logging
+from .extract import RecordError, build_prompt, select_field
+from .openai import prompt_cache_key
+from .types import ResponseUsage
+
+BATCH_ENDPOINT: Final[Literal["/v1/responses"]] = "/v1/responses"
+TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+# Batch metadata key recording whether results should be parsed as JSON
+OUTPUT_METADATA_KEY = "alleycat_output"
+
+
+def batch_requests(
+    lines: Iterable[str],
+    *,
+    model: str,
+    instructions: str | None = None,
+    temperature: float | None = None,
+    text_format: dict[str, Any] | None = None,
+    field: str | None = None,
+    template: str | None = None,
+    id_field: str = "id",
+) -> Iterator[dict[str, Any]]:
+    """Convert JSONL records to Batch API request lines.
+
+    The custom ID of each request holds its position in the input and the record ID,
+    so results can be returned in input order with their original IDs. Records that
+    cannot be converted are skipped with a warning.
+
+    Args:
+        lines: Input JSONL lines
+        model: Model for every request
+        instructions: System instructions for every request
+        temperature: Sampling temperature for every request
+        text_format: Response format, e.g. Schema.to_request_format()
+        field: Dotted path of the record field to send, or None to send the whole record
+        template: Prompt template, see build_prompt()
+        id_field: Dotted path of the record ID; the line number is used when it is missing
+
+    Yields:
+        Batch API request objects
+
+    """
+    shared: dict[str, Any] = {"model": model}
+    if instructions:
+        shared["instructions"] = instructions
+    if temperature is not None:
+        shared["temperature"] = temperature
+    if text_format:
+        shared["text"] = {"format": text_format}
+    # Every request shares its instructions and format, so one key routes the whole
+    # batch to the same prompt cache
+    shared["prompt_cache_key"] = prompt_cache_key(shared)
+
+    index = 0
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            prompt = build_prompt(record, field, template)
+        except (json.JSONDecodeError, RecordError) as e:
+            logging.warning("Skipping line %s: %s", line_number, e)
+            continue
+
+        try:
+            record_id = select_field(record, id_field)
+        except RecordError:
+            record_id = line_number
+
+        yield {
+            "custom_id": f"{index}:{json.dumps(record_id)}",
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {**shared, "input": prompt},
+        }
+        index += 1
+
+
+def parse_custom_id(custom_id: str) -> tuple[int, Any]:
+    """Split a custom ID created by batch_requests() into input position and record ID."""
+    index, _, record_id = custom_id.partition(":")
+    return int(index), json.loads(record_id)
+
+
+def _output_text(body: dict[str, Any]) -> str:
+    """Join the output text of a Responses API response body."""
+    return "".join(
+        content.get("text", "")
+        for item in body.get("output") or []
+        if item.get("type") == "message"
+        for content in item.get("content") or []
+        if content.get("type") == "output_text"
+    )
+
+
+def _usage(body: dict[str, Any]) -> dict[str, Any] | None:
+    """Convert the usage of a Responses API response body."""
+    usage = body.get("usage")
+    if not usage:
+        return None
+    return ResponseUsage(
+        total_tokens=usage.get("total_tokens", 0),
+        prompt_tokens=usage.get("input_tokens", 0),
+        completion_tokens=usage.get("output_tokens", 0),
+        cached_tokens=(usage.get("input_tokens_details") or {}).get("cached_tokens", 0),
+    ).model_dump()
+
+
+def result_entry(line: dict[str, Any], parse_json: bool) -> tuple[int, dict[str, Any]]:
+    """Convert a line of a batch output or error file to an output entry.
+
+    Args:
+        line: Decoded output or error file line
+        parse_json: Whether the response text should be parsed as JSON
+
+    Returns:
+        The input position of the request and its output entry
+
+    """
+    index, record_id = parse_custom_id(line["custom_id"])
+    entry: dict[str, Any] = {"id": record_id, "result": None, "usage": None, "error": None}
+
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if line.get("error"):
+        entry["error"] = line["error"].get("message") or str(line["error"])
+    elif response.get("status_code") != 200:
+        error = body.get("error") or {}
+        entry["error"] = error.get("message") or f"Request failed with status {response.get('status_code')}"
+    else:
+        entry["usage"] = _usage(body)
+        text = _output_text(body)
+        try:
+            entry["result"] = json.loads(text) if parse_json else text
+        except json.JSONDecodeError as e:
+            entry["error"] = f"Response is not valid JSON: {e}"
+    return index, entry
+
+
+class ResultBuffer:
+    """Results waiting for the results of earlier inputs.
+
+    Up to `limit` results are held in memory; past that they are moved to a temporary
+    on-disk SQLite database, so a batch whose first result arrives last never needs
+    memory for all of its results.
+    """
+
+    def __init__(self, limit: int = 10_000):
+        """Initialize an empty buffer.
+
+        Args:
+            limit: Most results held in memory
+
+        """
+        self.limit = limit
+        self._memory: dict[int, dict[str, Any]] = {}
+        self._disk: sqlite3.Connection | None = None
+
+    def put(self, index: int, entry: dict[str, Any]) -> None:
+        """Hold the result of an input."""
+        self._memory[index] = entry
+        if len(self._memory) > self.limit:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Move the results held in memory to disk."""
+        if self._disk is None:
+            # An empty path is a private temporary database, deleted when it is closed
+            self._disk = sqlite3.connect("")
+            self._disk.execute("CREATE TABLE results (idx INTEGER PRIMARY KEY, entry TEXT NOT NULL)")
+        self._disk.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?)",
+            ((index, json.dumps(entry)) for index, entry in self._memory.items()),
+        )
+        self._memory.clear()
+
+    def pop(self, index: int) -> dict[str, Any] | None:
+        """Take the result of an input, None if it has not arrived."""
+        if index in self._memory:
+            return self._memory.pop(index)
+        if self._disk is None:
+            return None
+        row = self._disk.execute("SELECT entry FROM results WHERE idx = ?", (index,)).fetchone()
+        if row is None:
+            return None
+        self._disk.execute("DELETE FROM results WHERE idx = ?", (index,))
+        entry: dict[str, Any] = json.loads(row[0])
+        return entry
+
+    def drain(self) -> Iterator[dict[str, Any]]:
+        """Take every result left, in input order, and close the buffer."""
+        disk = self._disk
+        if disk is not None:
+            # With everything on disk, one ordered query returns the results
+            self._spill()
+            for (entry,) in disk.execute("SELECT entry FROM results ORDER BY idx"):
+                yield json.loads(entry)
+        else:
+            for index in sorted(self._memory):
+                yield self._memory[index]
+        self.close()
+
+    def close(self) -> None:
+        """Discard the held results."""
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+class BatchRunner:
+    """Submit, poll and fetch Batch API jobs."""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        *,
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 300.0,
+        max_buffered: int = 10_000,
+    ) -> None:
+        """Initialize the runner.
+
+        Args:
+            client: OpenAI client, e.g. pointed at a stand-in server with base_url
+            poll_interval: Initial delay between status checks in seconds
+            max_poll_interval: Longest delay between status checks in seconds
+            max_buffered: Most out-of-order results held in memory while fetching
+
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_buffered = max_buffered
+
+    async def close(self) -> None:
+        """Close the OpenAI client."""
+        await self.client.close()
+
+    async def __aenter__(self) -> Self:
+        """Use the runner until the block ends, then close its client."""
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Close the client."""
+        await self.close()
+
+    async def submit(self, requests: Iterable[dict[str, Any]], *, parse_json: bool = False) -> Batch:
+        """Upload batch requests and create a batch job.
+
+        Args:
+            requests: Batch API request objects, e.g. from batch_requests()
+            parse_json: Whether results should be parsed as JSON when fetched
+
+        Returns:
+            The created batch
+
+        Raises:
+            ValueError: If there are no requests
+
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Stream the requests to disk rather than building the whole file in memory
+            input_path = Path(tmp_dir) / "batch_input.jsonl"
+            count = 0
+            with open(input_path, "w", encoding="utf-8") as f:
+                for request in requests:
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+                    count += 1
+            if count == 0:
+                raise ValueError("No requests to submit")
+
+            input_file = await self.client.files.create(file=input_path, purpose="batch")
+
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+            metadata={OUTPUT_METADATA_KEY: "json" if parse_json else "text"},
+        )
+        logging.info("Submitted batch [cyan]%s[/cyan] with %s requests", batch.id, count)
+        return batch
+
+    async def status(self, batch_id: str) -> Batch:
+        """Get the current state of a batch."""
+        return await self.client.batches.retrieve(batch_id)
+
+    async def wait(self, batch_id: str, timeout: float | None = None) -> Batch:
+        """Poll a batch with exponential backoff until it reaches a terminal status.
+
+        Args:
+            batch_id: The batch to wait for
+            timeout: Give up after this many seconds, or None to wait indefinitely
+
+        Returns:
+            The finished batch
+
+        Raises:
+            TimeoutError: If the batch did not finish within the timeout
+
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        delay = self.poll_interval
+        last_status = None
+        while True:
+            batch = await self.status(batch_id)
+            if batch.status != last_status:
+                logging.info("Batch %s is %s", batch_id, batch.status)
+                last_status = batch.status
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+            if deadline is not None and loop.time() + delay > deadline:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    async def _file_lines(self, file_id: str) -> AsyncIterator[dict[str, Any]]:
+        """Stream the decoded lines of a batch output or error file."""
+        async with self.client.files.with_streaming_response.content(file_id) as response:
+            async for line in response.iter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    async def results(self, batch: Batch) -> AsyncIterator[dict[str, Any]]:
+        """Stream the results of a finished batch in input order.
+
+        Results are yielded as soon as every earlier input has been seen. The output
+        file is read before the error file, so the results after a failed input wait
+        until the error file is read; past max_buffered they wait on disk, not in memory.
+
+        Args:
+            batch: A batch in a terminal status
+
+        Yields:
+            Output entries with the record ID, result, usage and error
+
+        """
+        parse_json = (batch.metadata or {}).get(OUTPUT_METADATA_KEY) == "json"
+        waiting = ResultBuffer(self.max_buffered)
+        next_index = 0
+        try:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                async for line in self._file_lines(file_id):
+                    index, entry = result_entry(line, parse_json)
+                    if index != next_index:
+                        waiting.put(index, entry)
+                        continue
+                    yield entry
+                    next_index += 1
+                    while (held := waiting.pop(next_index)) is not None:
+                        yield held
+                        next_index += 1
+
+            # Inputs missing from both files leave gaps; return what is left in order
+            for entry in waiting.drain():
+                yield entry
+        finally:
+            waiting.close()
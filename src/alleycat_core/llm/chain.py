@@ -0,0 +1,262 @@
+"""Pipelined execution of schema chains.
+
+A schema chain runs a record through a sequence of structured-output stages, such as
+entities -> relations -> summary. Each stage's JSON output is fed to the next stage
+together with the original input.
+
+When many records are processed, every stage has its own pool of workers connected
+by bounded queues, so stage 2 of one record overlaps stage 1 of the next and the
+slowest stage applies backpressure to the ones before it. Stage outputs are cached
+by stage and input, so re-running a partially completed job only pays for the
+stages that have not been done.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import hashlib
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .. import logging
+from ..schema import Schema
+from .base import LLMProvider
+from .types import LLMResponse, ResponseUsage
+
+
+@dataclass
+class ChainResult:
+    """The outcome of running one record through a schema chain."""
+
+    index: int
+    input: str
+    outputs: list[Any] = field(default_factory=list)  # parsed output of each completed stage
+    usage: ResponseUsage | None = None
+    cached_stages: int = 0
+    error: str | None = None
+
+    @property
+    def result(self) -> Any:
+        """The output of the final stage, or None if the chain did not complete."""
+        return self.outputs[-1] if self.outputs and self.error is None else None
+
+
+class StageCache:
+    """Cache of stage outputs keyed by stage definition and stage input.
+
+    Without a directory, entries are held in memory. With a directory, entries are
+    persisted as one small JSON file each so that separate runs over the same corpus
+    can share them, and are not held in memory so that very large runs stay bounded.
+    """
+
+    def __init__(self, cache_dir: Path | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory to persist entries in, or None for an in-memory cache
+
+        """
+        self.cache_dir = cache_dir
+        self._entries: dict[str, str] = {}
+
+    @staticmethod
+    def key(*parts: str | None) -> str:
+        """Build a cache key from the parts that determine a stage's output."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update((part or "").encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Get a cached stage output."""
+        if self.cache_dir is None:
+            return self._entries.get(key)
+        try:
+            return (self.cache_dir / f"{key}.json").read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def put(self, key: str, output_text: str) -> None:
+        """Store a stage output."""
+        if self.cache_dir is None:
+            self._entries[key] = output_text
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.tmp"
+            tmp_path.write_text(output_text, encoding="utf-8")
+            tmp_path.replace(self.cache_dir / f"{key}.json")
+        except OSError as e:
+            logging.debug("Could not persist chain stage output %s: %s", key, e)
+
+
+def _add_usage(total: ResponseUsage | None, usage: ResponseUsage | None) -> ResponseUsage | None:
+    """Sum two usage blocks, either of which may be missing."""
+    if usage is None:
+        return total
+    if total is None:
+        return usage.model_copy()
+    return ResponseUsage(
+        total_tokens=total.total_tokens + usage.total_tokens,
+        prompt_tokens=total.prompt_tokens + usage.prompt_tokens,
+        completion_tokens=total.completion_tokens + usage.completion_tokens,
+        cached_tokens=total.cached_tokens + usage.cached_tokens,
+    )
+
+
+class SchemaChain:
+    """Run records through a sequence of schema stages."""
+
+    def __init__(
+        self,
+        llm: LLMProvider,
+        schemas: list[Schema],
+        *,
+        instructions: str | None = None,
+        cache: StageCache | None = None,
+        concurrency: int = 4,
+        validate: bool = False,
+        model: str = "",
+        respond_options: dict[str, Any] | None = None,
+    ) -> None:
+        """Initialize the chain.
+
+        Args:
+            llm: Provider used for every stage; requests are made statelessly so it can be shared
+            schemas: Stage schemas, in order
+            instructions: System instructions sent with every stage
+            cache: Stage output cache, or None to disable caching
+            concurrency: Number of concurrent requests per stage
+            validate: Validate each stage's output locally against its schema
+            model: Model name, included in cache keys so different models do not share outputs
+            respond_options: Extra arguments for every respond() call, e.g. tools
+
+        """
+        if not schemas:
+            raise ValueError("A schema chain needs at least one schema")
+        self.llm = llm
+        self.schemas = schemas
+        self.instructions = instructions
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.validate = validate
+        self.model = model
+        self.respond_options = respond_options or {}
+
+    def stage_input(self, stage: int, result: ChainResult) -> str:
+        """Build the input for a stage from the original input and the previous stage's output."""
+        if stage == 0:
+            return result.input
+        previous = self.schemas[stage - 1].name
+        return f"{result.input}\n\nOutput of the previous step ({previous}):\n{json.dumps(result.outputs[-1])}"
+
+    async def run_stage(self, stage: int, result: ChainResult) -> None:
+        """Run one stage for a record, updating the result in place."""
+        schema = self.schemas[stage]
+        stage_input = self.stage_input(stage, result)
+        key = StageCache.key(self.model, schema.content_hash, self.instructions, stage_input)
+
+        output_text = self.cache.get(key) if self.cache else None
+        if output_text is not None:
+            result.cached_stages += 1
+        else:
+            response = await self.llm.respond(
+                input=stage_input,
+                text=schema.to_request_format(),  # type: ignore[arg-type]
+                instructions=self.instructions,
+                stateless=True,
+                **self.respond_options,
+            )
+            if not isinstance(response, LLMResponse):
+                raise ValueError("Unexpected streaming response in schema chain")
+            output_text = response.output_text
+            result.usage = _add_usage(result.usage, response.usage)
+
+        output = json.loads(output_text)
+        if self.validate:
+            schema.validate_response(output)
+        # Only cache outputs that parsed (and validated), so bad answers are retried next run
+        if self.cache:
+            self.cache.put(key, output_text)
+        result.outputs.append(output)
+
+    async def run(self, prompt: str) -> ChainResult:
+        """Run a single record through every stage in turn."""
+        result = ChainResult(index=0, input=prompt)
+        for stage in range(len(self.schemas)):
+            try:
+                await self.run_stage(stage, result)
+            except Exception as e:
+                result.error = f"Stage {stage + 1} ({self.schemas[stage].name}) failed: {e}"
+                break
+        return result
+
+    async def run_many(self, prompts: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[ChainResult]:
+        """Run many records through the chain as a pipeline.
+
+        Args:
+            prompts: Record inputs; consumed lazily as the first stage has capacity. Pass an
+                async iterable when producing them may block, e.g. reading a pipe
+
+        Yields:
+            Results in completion order; use ChainResult.index to restore input order
+
+        Raises:
+            Exception: The error of the prompts iterable, after the records read before it
+
+        """
+        stages = len(self.schemas)
+        # One queue in front of each stage plus one for finished results
+        queues: list[asyncio.Queue[ChainResult | None]] = [
+            asyncio.Queue(maxsize=self.concurrency * 2) for _ in range(stages + 1)
+        ]
+
+        feed_errors: list[Exception] = []
+
+        async def feed() -> None:
+            index = 0
+            try:
+                if isinstance(prompts, AsyncIterable):
+                    async for prompt in prompts:
+                        await queues[0].put(ChainResult(index=index, input=prompt))
+                        index += 1
+                else:
+                    for prompt in prompts:
+                        await queues[0].put(ChainResult(index=index, input=prompt))
+                        index += 1
+            except Exception as e:
+                # Shut the stages down as usual, and raise once the records already fed are out
+                feed_errors.append(e)
+            for _ in range(self.concurrency):
+                await queues[0].put(None)
+
+        async def worker(stage: int) -> None:
+            while (result := await queues[stage].get()) is not None:
+                if result.error is None:
+                    try:
+                        await self.run_stage(stage, result)
+                    except Exception as e:
+                        result.error = f"Stage {stage + 1} ({self.schemas[stage].name}) failed: {e}"
+                await queues[stage + 1].put(result)
+
+        async def stage_pool(stage: int) -> None:
+            await asyncio.gather(*(worker(stage) for _ in range(self.concurrency)))
+            # Every worker of this stage is done, so shut down the next stage (or the output)
+            for _ in range(self.concurrency if stage + 1 < stages else 1):
+                await queues[stage + 1].put(None)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks.extend(asyncio.create_task(stage_pool(stage)) for stage in range(stages))
+        try:
+            while (result := await queues[stages].get()) is not None:
+                yield result
+            await asyncio.gather(*tasks)
+            if feed_errors:
+                raise feed_errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
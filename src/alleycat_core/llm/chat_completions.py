@@ -0,0 +1,226 @@
+"""Chat Completions fallback for backends without the Responses API.
+
+Requests are built for the Responses API throughout alleycat. This module converts
+them to Chat Completions requests and converts the results back, so that providers
+can talk to local OpenAI-compatible servers (llama.cpp, vLLM, Ollama) unchanged.
+
+Chat Completions has no server-side conversation state, so the conversation is
+kept locally and replayed with each request that continues it.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Any
+
+from openai import AsyncOpenAI
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from .. import logging
+
+
+@dataclass
+class ChatResponse:
+    """A Chat Completions result with the attributes of a Responses API response."""
+
+    id: str
+    output_text: str
+    usage: Any = None  # CompletionUsage, read like a Responses usage block
+
+
+def _chat_content(content: Any) -> Any:
+    """Convert Responses message content to Chat Completions message content."""
+    if isinstance(content, str):
+        return content
+
+    parts: list[dict[str, Any]] = []
+    for part in content:
+        if part.get("type") == "input_text":
+            parts.append({"type": "text", "text": part["text"]})
+        elif part.get("type") == "input_image" and part.get("image_url"):
+            parts.append({"type": "image_url", "image_url": {"url": part["image_url"]}})
+        else:
+            logging.warning("The backend cannot read %s content; leaving it out", part.get("type"))
+
+    # Local servers handle plain text content most reliably
+    if all(part["type"] == "text" for part in parts):
+        return "\n\n".join(part["text"] for part in parts)
+    return parts
+
+
+def chat_messages(params: dict[str, Any]) -> list[dict[str, Any]]:
+    """Convert the instructions and input of a Responses request to chat messages.
+
+    Args:
+        params: Responses API request parameters
+
+    Returns:
+        The system message, if there are instructions, followed by the input messages
+
+    """
+    messages: list[dict[str, Any]] = []
+    if params.get("instructions"):
+        messages.append({"role": "system", "content": params["instructions"]})
+
+    items = params.get("input", [])
+    if isinstance(items, str):
+        items = [{"role": "user", "content": items}]
+    for item in items:
+        role = item.get("role", "user")
+        messages.append({"role": "system" if role == "developer" else role, "content": _chat_content(item["content"])})
+    return messages
+
+
+def chat_response_format(text: dict[str, Any] | None) -> dict[str, Any] | None:
+    """Convert a Responses text format to a Chat Completions response_format."""
+    response_format = (text or {}).get("format") or {}
+    if response_format.get("type") == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": response_format["name"],
+                "schema": response_format["schema"],
+                "strict": response_format.get("strict", True),
+            },
+        }
+    if response_format.get("type") == "json_object" or response_format.get("format") == "json":
+        return {"type": "json_object"}
+    return None
+
+
+class ChatCompletionsFallback:
+    """Send Responses API requests with Chat Completions, keeping the conversation locally."""
+
+    def __init__(self, client: AsyncOpenAI) -> None:
+        """Initialize the fallback.
+
+        Args:
+            client: OpenAI client pointed at the backend
+
+        """
+        self.client = client
+        self.history: list[dict[str, Any]] = []  # Messages of the conversation up to history_id
+        self.history_id: str | None = None
+
+    def _messages(self, params: dict[str, Any]) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """Build the messages of a request, replaying the conversation it continues.
+
+        Returns:
+            The messages to send and the new turn's messages, without the system message
+
+        """
+        turn = chat_messages(params)
+        system = [message for message in turn if message["role"] == "system"]
+        turn = [message for message in turn if message["role"] != "system"]
+
+        previous = params.get("previous_response_id")
+        history: list[dict[str, Any]] = []
+        if previous and previous == self.history_id:
+            history = self.history
+        elif previous:
+            logging.warning("The backend does not keep conversations; continuing without the earlier messages")
+        return [*system, *history, *turn], [*history, *turn]
+
+    def _chat_params(self, params: dict[str, Any], messages: list[dict[str, Any]]) -> dict[str, Any]:
+        """Convert Responses request parameters to Chat Completions parameters."""
+        chat_params: dict[str, Any] = {"model": params["model"], "messages": messages}
+        if params.get("temperature") is not None:
+            chat_params["temperature"] = params["temperature"]
+        if params.get("max_output_tokens") is not None:
+            chat_params["max_tokens"] = params["max_output_tokens"]
+        if response_format := chat_response_format(params.get("text")):
+            chat_params["response_format"] = response_format
+        return chat_params
+
+    def _remember(self, conversation: list[dict[str, Any]], response: ChatResponse) -> None:
+        """Continue the local conversation from a response."""
+        self.history = [*conversation, {"role": "assistant", "content": response.output_text}]
+        self.history_id = response.id
+
+    def remember(self, params: dict[str, Any], response: ChatResponse) -> None:
+        """Continue the local conversation from a response to a request sent with remember=False.
+
+        Used when duplicates of a request are sent and only one response is kept.
+
+        Args:
+            params: Responses API parameters of the request
+            response: The response to continue from
+
+        """
+        self._remember(self._messages(params)[1], response)
+
+    async def create(self, params: dict[str, Any], *, remember: bool = True) -> ChatResponse:
+        """Send a request and wait for the whole response.
+
+        Args:
+            params: Responses API request parameters
+            remember: Whether later requests may continue from this response
+
+        Returns:
+            The response
+
+        """
+        messages, conversation = self._messages(params)
+        completion = await self.client.chat.completions.create(**self._chat_params(params, messages))
+        message = completion.choices[0].message if completion.choices else None
+        response = ChatResponse(
+            id=completion.id, output_text=(message.content or "") if message else "", usage=completion.usage
+        )
+        if remember:
+            self._remember(conversation, response)
+        return response
+
+    async def stream(self, params: dict[str, Any], *, remember: bool = True) -> AsyncIterator[ResponseStreamEvent]:
+        """Send a request and stream the response as Responses API events.
+
+        Text deltas become `response.output_text.delta` events and the end of the
+        stream a `response.completed` event carrying the response ID and usage.
+
+        Args:
+            params: Responses API request parameters
+            remember: Whether later requests may continue from this response
+
+        Returns:
+            An iterator over the converted events
+
+        """
+        messages, conversation = self._messages(params)
+        stream = await self.client.chat.completions.create(
+            **self._chat_params(params, messages), stream=True, stream_options={"include_usage": True}
+        )
+        return self._events(stream, conversation, remember)
+
+    async def _events(
+        self, stream: Any, conversation: list[dict[str, Any]], remember: bool
+    ) -> AsyncIterator[ResponseStreamEvent]:
+        """Convert Chat Completions chunks to Responses API stream events."""
+        response = ChatResponse(id="", output_text="")
+        sequence = 0
+        try:
+            async for chunk in stream:
+                response.id = response.id or chunk.id
+                if getattr(chunk, "usage", None) is not None:
+                    response.usage = chunk.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    response.output_text += delta
+                    yield ResponseTextDeltaEvent.model_construct(
+                        type="response.output_text.delta",
+                        delta=delta,
+                        item_id=chunk.id,
+                        output_index=0,
+                        content_index=0,
+                        logprobs=[],
+                        sequence_number=sequence,
+                    )
+                    sequence += 1
+
+            if remember:
+                self._remember(conversation, response)
+            yield ResponseCompletedEvent.model_construct(
+                type="response.completed", response=response, sequence_number=sequence
+            )
+        finally:
+            await stream.close()
@@ -0,0 +1,127 @@
+"""Multi-model comparison.
+
+Picking the fastest model that answers a workload well means asking several models
+the same thing. A comparison sends one prompt, with the same instructions and files,
+to several models at once through a shared provider and measures each answer: time
+to first token, tokens per second, token usage and, optionally, an evaluation score.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from typing import Any, cast
+
+from openai.types.responses import ResponseCompletedEvent
+from openai.types.responses.response_input_param import ResponseInputParam
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from .. import logging
+from .base import LLMProvider
+from .evaluation import LLMTestCase, ResponseEvaluation, ResponseEvaluator
+from .sinks import COMPLETED, TEXT_DELTA, StreamPipeline, StreamSink, text_delta
+from .types import ResponseUsage
+
+
+@dataclass
+class ModelRun:
+    """One model's answer in a comparison."""
+
+    model: str
+    text: str = ""
+    ttft_ms: float | None = None  # None when the response was not streamed
+    duration_ms: float = 0.0
+    usage: ResponseUsage | None = None
+    error: str | None = None
+    evaluation: ResponseEvaluation | None = None
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        """Output tokens per second of generation, after the first token."""
+        generating_ms = self.duration_ms - (self.ttft_ms or 0.0)
+        if self.usage is None or generating_ms <= 0:
+            return None
+        return self.usage.completion_tokens / (generating_ms / 1000)
+
+
+class ModelRunSink(StreamSink):
+    """Fill in a ModelRun from its response stream."""
+
+    event_types = frozenset({TEXT_DELTA, COMPLETED})
+
+    def __init__(self, run: ModelRun, started: float):
+        """Initialize the sink.
+
+        Args:
+            run: The run to fill in
+            started: `time.perf_counter()` value taken when the request was sent
+
+        """
+        self.run = run
+        self.started = started
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Collect text, the first token time and usage."""
+        if event.type == TEXT_DELTA:
+            if self.run.ttft_ms is None:
+                self.run.ttft_ms = (time.perf_counter() - self.started) * 1000
+            self.run.text += text_delta(event)
+        else:
+            usage = getattr(cast(ResponseCompletedEvent, event).response, "usage", None)
+            if usage is not None:
+                self.run.usage = ResponseUsage.from_api(usage)
+
+
+async def compare_models(
+    llm: LLMProvider,
+    models: list[str],
+    input: str | ResponseInputParam,
+    *,
+    sinks: Callable[[str], list[StreamSink]] | None = None,
+    evaluator: ResponseEvaluator | None = None,
+    test_case: LLMTestCase | None = None,
+    **kwargs: Any,
+) -> list[ModelRun]:
+    """Send the same request to several models concurrently.
+
+    The requests are stateless, so they neither continue nor change the provider's
+    conversation. A model that fails does not stop the others; its error is kept
+    in its run.
+
+    Args:
+        llm: The provider the requests share
+        models: The models to compare
+        input: The request input
+        sinks: Builds extra sinks for a model's response stream, e.g. a display or file
+        evaluator: Scores each answer against test_case
+        test_case: The test case answers are scored against
+        **kwargs: Parameters for `llm.respond`
+
+    Returns:
+        A run per model, in the order of models
+
+    """
+
+    async def run_model(model: str) -> ModelRun:
+        run = ModelRun(model=model)
+        started = time.perf_counter()
+        try:
+            response = await llm.respond(input=input, model=model, stateless=True, **kwargs)
+            if isinstance(response, AsyncIterator):
+                extra = sinks(model) if sinks else []
+                await StreamPipeline([ModelRunSink(run, started), *extra]).run(response)
+            else:
+                run.text = response.output_text
+                run.usage = response.usage
+        except Exception as e:
+            logging.warning("%s failed: %s", model, e)
+            run.error = str(e)
+        run.duration_ms = (time.perf_counter() - started) * 1000
+
+        if evaluator is not None and test_case is not None and run.error is None:
+            run.evaluation = evaluator.evaluate(run.text, test_case)
+        return run
+
+    return list(await asyncio.gather(*(run_model(model) for model in models)))
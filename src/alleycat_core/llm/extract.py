@@ -0,0 +1,226 @@
+"""Structured extraction over JSONL files.
+
+Each input line is a JSON record. A prompt is built from the record, optionally from
+a single field and a prompt template, and run through a schema chain (a single
+`--schema` is a chain of one stage). One output line is written per record as soon as
+it completes:
+
+    {"id": ..., "result": ..., "usage": {...}, "error": null}
+
+Output lines are written in completion order and flushed as they are written, so an
+interrupted run can be resumed by skipping the IDs already present in the output.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TextIO
+
+from .. import logging
+from .chain import SchemaChain
+
+
+class RecordError(Exception):
+    """Exception raised when a prompt cannot be built from an input record."""
+
+    pass
+
+
+@dataclass
+class ExtractStats:
+    """Counts for a JSONL extraction run."""
+
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    total_tokens: int = 0
+
+
+def select_field(record: Any, field: str) -> Any:
+    """Select a value from a record with a dotted path, e.g. `meta.title`.
+
+    Args:
+        record: The decoded JSON record
+        field: Dotted path of the value to select
+
+    Returns:
+        The selected value
+
+    Raises:
+        RecordError: If the path does not exist in the record
+
+    """
+    value = record
+    for part in field.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            raise RecordError(f"Field '{field}' not found in record")
+    return value
+
+
+def build_prompt(record: Any, field: str | None = None, template: str | None = None) -> str:
+    """Build the prompt for a record.
+
+    Args:
+        record: The decoded JSON record
+        field: Dotted path of the field to send, or None to send the whole record
+        template: A `str.format` template; `{text}` is the selected text and the
+            record's top-level keys are available by name
+
+    Returns:
+        The prompt text
+
+    Raises:
+        RecordError: If the field or a template placeholder is missing
+
+    """
+    value = select_field(record, field) if field else record
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    if template is None:
+        return text
+
+    names = record if isinstance(record, dict) else {}
+    try:
+        return template.format_map({**names, "text": text})
+    except (KeyError, IndexError) as e:
+        raise RecordError(f"Template placeholder {e} not found in record") from e
+
+
+def completed_ids(output_path: Path) -> set[str]:
+    """Read the IDs of records that completed successfully in an existing output file.
+
+    Records that failed are not included, so they are retried on resume. A partially
+    written last line, e.g. from a run that was killed, is ignored.
+
+    Args:
+        output_path: Path of a previous run's output
+
+    Returns:
+        The IDs of completed records
+
+    """
+    ids: set[str] = set()
+    if not output_path.exists():
+        return ids
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and entry.get("error") is None and "id" in entry:
+                ids.add(str(entry["id"]))
+    return ids
+
+
+class JsonlExtractor:
+    """Run every record of a JSONL stream through a schema chain."""
+
+    def __init__(
+        self,
+        chain: SchemaChain,
+        *,
+        field: str | None = None,
+        template: str | None = None,
+        id_field: str = "id",
+    ) -> None:
+        """Initialize the extractor.
+
+        Args:
+            chain: The chain each record is run through; its concurrency bounds the requests in flight
+            field: Dotted path of the field to send, or None to send the whole record
+            template: Prompt template, see build_prompt()
+            id_field: Dotted path of the record ID; the line number is used when it is missing
+
+        """
+        self.chain = chain
+        self.field = field
+        self.template = template
+        self.id_field = id_field
+
+    def record_id(self, record: Any, line_number: int) -> Any:
+        """Get the ID of a record, falling back to its line number."""
+        try:
+            return select_field(record, self.id_field)
+        except RecordError:
+            return line_number
+
+    async def run(self, lines: Iterable[str], output: TextIO, skip_ids: set[str] | None = None) -> ExtractStats:
+        """Process input lines and write one output line per record.
+
+        Args:
+            lines: Input JSONL lines; consumed lazily, and read in a worker thread
+            output: Stream the results are written to
+            skip_ids: IDs of records to skip, e.g. from completed_ids()
+
+        Returns:
+            Counts of the records processed
+
+        """
+        stats = ExtractStats()
+        skip_ids = skip_ids or set()
+        # IDs of the records in flight, by the index the chain assigns them
+        pending: dict[int, Any] = {}
+
+        def write(
+            record_id: Any, result: Any = None, usage: dict[str, Any] | None = None, error: str | None = None
+        ) -> None:
+            if error is None:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+                logging.debug("Record %s failed: %s", record_id, error)
+            entry = {"id": record_id, "result": result, "usage": usage, "error": error}
+            output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output.flush()
+
+        async def read_lines() -> AsyncIterator[str]:
+            # Input may be a slow pipe, so lines are read in a thread to keep requests moving
+            iterator = iter(lines)
+            while (line := await asyncio.to_thread(next, iterator, None)) is not None:
+                yield line
+
+        async def prompts() -> AsyncIterator[str]:
+            index = 0
+            line_number = 0
+            async for line in read_lines():
+                line_number += 1
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    write(line_number, error=f"Invalid JSON on line {line_number}: {e}")
+                    continue
+
+                record_id = self.record_id(record, line_number)
+                if str(record_id) in skip_ids:
+                    stats.skipped += 1
+                    continue
+                try:
+                    prompt = build_prompt(record, self.field, self.template)
+                except RecordError as e:
+                    write(record_id, error=str(e))
+                    continue
+
+                pending[index] = record_id
+                index += 1
+                yield prompt
+
+        async for result in self.chain.run_many(prompts()):
+            if result.usage:
+                stats.total_tokens += result.usage.total_tokens
+            write(
+                pending.pop(result.index),
+                result=result.result,
+                usage=result.usage.model_dump() if result.usage else None,
+                error=result.error,
+            )
+        return stats
@@ -0,0 +1,119 @@
+"""Hedged requests.
+
+A small fraction of requests stall for many seconds before the first token while
+identical requests sent a moment later start at once. Hedging hides these stalls:
+when a request has not started within a delay taken from recent time-to-first-token
+statistics, a duplicate is sent, the first to start wins and the other is cancelled.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import inspect
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+# Stream events that show the response has started, or will never start
+_STARTED_EVENTS = ("response.output_text.delta", "response.completed", "response.failed", "error")
+
+
+async def close_stream(stream: Any) -> None:
+    """Close a response stream, or a generator over one, so it stops generating tokens."""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None and inspect.isawaitable(closing := close()):
+        await closing
+
+
+async def hedge[T](
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    *,
+    discard: Callable[[T], Awaitable[None]] | None = None,
+) -> tuple[T, bool]:
+    """Run a call, racing a duplicate against it if it has not finished within a delay.
+
+    The first call to succeed wins and the other is cancelled. If one fails, the other
+    is still awaited; the error is only raised when both fail.
+
+    Args:
+        call: Makes the call; called a second time for the hedge
+        delay: Seconds to wait before sending the hedge
+        discard: Releases the result of a losing call that finished anyway
+
+    Returns:
+        The winning result and whether a hedge was sent
+
+    Raises:
+        Exception: The first call's error, if both calls fail
+
+    """
+    first = asyncio.ensure_future(call())
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        first.cancel()
+        raise
+    if done:
+        return first.result(), False
+
+    calls = [first, asyncio.ensure_future(call())]
+    pending = set(calls)
+    winner: asyncio.Future[T] | None = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in calls if task in done and task.exception() is None), None)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        if discard is not None:
+            for task in calls:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+
+    if winner is None:
+        raise calls[0].exception() or RuntimeError("Hedged request failed")
+    return winner.result(), True
+
+
+async def start_stream(
+    open_stream: Callable[[], Awaitable[AsyncIterator[ResponseStreamEvent]]],
+) -> tuple[AsyncIterator[ResponseStreamEvent], list[ResponseStreamEvent]]:
+    """Open a response stream and read it up to its first token.
+
+    Args:
+        open_stream: Opens the stream
+
+    Returns:
+        The stream and the events read so far, ending with the first text delta, or
+        with the end of the stream if it produced no text
+
+    """
+    stream = await open_stream()
+    events: list[ResponseStreamEvent] = []
+    try:
+        async for event in stream:
+            events.append(event)
+            if event.type in _STARTED_EVENTS:
+                break
+    except BaseException:
+        await close_stream(stream)
+        raise
+    return stream, events
+
+
+async def resume_stream(
+    stream: AsyncIterator[ResponseStreamEvent], events: list[ResponseStreamEvent]
+) -> AsyncIterator[ResponseStreamEvent]:
+    """Yield events already read from a stream, then the rest of the stream."""
+    try:
+        for event in events:
+            yield event
+        async for event in stream:
+            yield event
+    finally:
+        await close_stream(stream)
@@ -8,7 +8,12 @@ to define the types for the OpenAI API.
 Author: Andrew Watkins <andrew@groat.nz>
 """
 
+import asyncio
+import hashlib
+import json
+import time
 from collections.abc import AsyncIterator
+from pathlib import Path
 from typing import Any, TypedDict, cast
 
 from openai import AsyncOpenAI
@@ -20,10 +25,80 @@ from openai.types.responses.tool_param import ToolParam
 from pydantic import BaseModel, Field
 
 from .. import logging
+from ..kb.index import KBIndex
+from ..usage import UsageLedger, UsageRecord
 from .base import LLMProvider, Message
-from .remote_file import RemoteFile, create_remote_file
+from .chain import StageCache
+from .chat_completions import ChatCompletionsFallback, ChatResponse
+from .hedging import close_stream, hedge, resume_stream, start_stream
+from .profiles import Capability, get_profile
+from .reducers import FileReducers
+from .remote_file import RemoteFile, combine_context_messages, create_remote_file
+from .singleflight import SingleFlight, StreamFanout
 from .types import LLMResponse, ResponseFormat, ResponseRefusal, ResponseUsage
 
+# Appended to the instructions whenever a file is attached to a request
+FILE_INSTRUCTION = "see attached files for context."
+
+# Sent after the partial answer of a stalled stream, so the retried request continues it
+RESUME_INSTRUCTION = (
+    "Your previous response was cut off. Continue it exactly where it stopped, without repeating any of it."
+)
+
+# Ledger records needed before the hedge delay is taken from them, and how far back they are read
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW_SECONDS = 7 * 24 * 3600
+
+
+def prompt_cache_key(params: dict[str, Any]) -> str:
+    """Derive a prompt cache routing key from the stable prefix of a request.
+
+    Requests are laid out as instructions, then file context, then the variable input,
+    and the key covers everything but the last input message. Requests that share a
+    prefix get the same key, so the provider routes them to the same prompt cache.
+
+    Args:
+        params: Responses API request parameters
+
+    Returns:
+        A key of at most 64 characters
+
+    """
+    prefix = {key: params.get(key) for key in ("model", "instructions", "tools", "text")}
+    prefix["input"] = params.get("input", [])[:-1]
+    digest = hashlib.sha256(json.dumps(prefix, sort_keys=True, default=str).encode()).hexdigest()
+    return f"alleycat-{digest[:32]}"
+
+
+class StreamStalledError(TimeoutError):
+    """A response stream sent no event within the idle timeout or missed its deadline."""
+
+
+def resume_params(params: dict[str, Any], partial_text: str) -> dict[str, Any]:
+    """Build the request that resumes a stalled stream.
+
+    Without partial text the request is sent again as it was. Otherwise the partial
+    answer is added to the input with an instruction to continue it.
+
+    Args:
+        params: Parameters of the stalled request
+        partial_text: Text received before the stall
+
+    Returns:
+        The parameters of the new request
+
+    """
+    if not partial_text:
+        return params
+    return {
+        **params,
+        "input": [
+            *params.get("input", []),
+            {"role": "assistant", "content": partial_text, "type": "message"},
+            {"role": "user", "content": RESUME_INSTRUCTION, "type": "message"},
+        ],
+    }
+
 
 class MessageInput(TypedDict):
     """Type for message input."""
@@ -36,7 +111,9 @@ class MessageInput(TypedDict):
 class OpenAIConfig(BaseModel):
     """Configuration for OpenAI provider."""
 
-    api_key: str
+    api_key: str = ""
+    base_url: str | None = None  # OpenAI-compatible endpoint, defaults to the profile's endpoint
+    profile: str = "openai"  # Provider profile naming the backend and its capabilities
     model: str = "gpt-4o-mini"
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     max_tokens: int | None = None
@@ -45,6 +122,18 @@ class OpenAIConfig(BaseModel):
     tools: list[ToolParam] | None = None  # Tools for function calling
     include: list[ResponseIncludable] | None = None  # Additional data to include in response
     stream: bool = False
+    usage_db: Path | None = None  # SQLite usage ledger, disabled when None
+    usage_tag: str | None = None  # Tag stored with each ledger record
+    prompt_cache_key: str | None = None  # Prompt cache routing key, derived from the request prefix when None
+    coalesce_requests: bool = True  # Share one call between identical stateless requests in flight
+    # Send a duplicate request when the first token takes longer than this percentile of recent requests
+    hedge_percentile: float | None = Field(default=None, gt=0.0, le=100.0)
+    hedge_delay_ms: float = Field(default=3000.0, gt=0.0)  # Hedge delay until the ledger has enough samples
+    idle_timeout: float | None = Field(default=60.0, gt=0.0)  # Seconds a stream may go without an event
+    response_deadline: float | None = Field(default=None, gt=0.0)  # Seconds a whole response may take
+    stall_retries: int = Field(default=2, ge=0)  # Times a stalled stream is requested again
+    file_reducers: dict[str, list[str]] = Field(default_factory=dict)  # Reducer specs for text files by extension
+    kb_index: Path | None = None  # KB index recording uploaded files for `files gc`, not recorded when None
 
 
 class OpenAIProvider(LLMProvider):
@@ -53,15 +142,36 @@ class OpenAIProvider(LLMProvider):
     def __init__(self, config: OpenAIConfig):
         """Initialize the OpenAI provider."""
         self.config = config
-        self.client = AsyncOpenAI(api_key=config.api_key)
+        self.profile = get_profile(config.profile)
+        # Local servers ignore the key, but the client refuses to start without one
+        self.client = AsyncOpenAI(
+            api_key=config.api_key or "not-needed", base_url=config.base_url or self.profile.base_url
+        )
+        # Backends without the Responses API are sent Chat Completions requests instead
+        self.chat_fallback = None if self.supports(Capability.RESPONSES) else ChatCompletionsFallback(self.client)
         self.previous_response_id: str | None = None
-        self.remote_file: RemoteFile | None = None
+        self.last_usage: ResponseUsage | None = None  # Usage of the response the conversation continues from
+        self.remote_files: list[RemoteFile] = []
+        self.file_reducers = FileReducers(config.file_reducers)
+        self.file_in_conversation = False  # Whether the conversation already holds the remote files
+        self.usage_ledger: UsageLedger | None = UsageLedger(config.usage_db) if config.usage_db else None
+        self.upload_index: KBIndex | None = KBIndex(config.kb_index) if config.kb_index else None
+        self.flights = SingleFlight()
+        self.hedges = 0  # Requests that sent a duplicate
+        self._hedge_delays: dict[tuple[str, bool], float] = {}
 
         logging.info(
-            f"Initialized OpenAI provider with model=[cyan]{config.model}[/cyan] "
-            f"temperature=[cyan]{self.config.temperature}[/cyan]"
+            "Initialized OpenAI provider with model=[cyan]%s[/cyan] temperature=[cyan]%s[/cyan] "
+            "profile=[cyan]%s[/cyan]",
+            config.model,
+            self.config.temperature,
+            self.profile.name,
         )
 
+    def supports(self, capability: Capability) -> bool:
+        """Check whether the backend supports a feature."""
+        return self.profile.supports(capability)
+
     async def close(self) -> None:
         """Clean up resources and close any open connections.
 
@@ -69,31 +179,94 @@ class OpenAIProvider(LLMProvider):
         """
         try:
             # Clean up any file resources first
-            if self.remote_file:
+            if self.remote_files:
                 await self.cleanup_file()
 
             # Close the client if it has a close method
             if hasattr(self.client, "close"):
                 await self.client.close()
 
+            if self.usage_ledger:
+                self.usage_ledger.close()
+            if self.upload_index:
+                self.upload_index.close()
+
             self.previous_response_id = None
         except Exception as e:
             logging.error(f"Error during provider cleanup: {e}")
             raise
 
-    def _convert_response(self, response: OpenAIResponse) -> LLMResponse:
-        """Convert OpenAI response to our LLMResponse type."""
-        usage = None
-        if hasattr(response, "usage"):
-            usage = ResponseUsage(
-                total_tokens=getattr(response.usage, "total_tokens", 0),
-                prompt_tokens=getattr(response.usage, "prompt_tokens", 0),
-                completion_tokens=getattr(response.usage, "completion_tokens", 0),
+    @staticmethod
+    def _convert_usage(usage: Any) -> ResponseUsage:
+        """Convert an OpenAI usage block to our ResponseUsage type."""
+        return ResponseUsage.from_api(usage)
+
+    def _record_usage(
+        self,
+        params: dict[str, Any],
+        usage: ResponseUsage | None,
+        *,
+        started: float,
+        ttft_ms: float | None = None,
+        response_id: str | None = None,
+        status: str = "completed",
+        stalls: int = 0,
+    ) -> None:
+        """Append a request to the usage ledger, if one is configured.
+
+        Args:
+            params: The parameters the request was made with
+            usage: Token usage reported by the API, if any
+            started: `time.perf_counter()` value taken when the request was sent
+            ttft_ms: Time to first token for streamed responses
+            response_id: ID of the response
+            status: Final status of the request
+            stalls: Times the stream stalled and was requested again
+
+        """
+        if self.usage_ledger is None:
+            return
+
+        tools: list[dict[str, Any]] = params.get("tools") or []
+        vector_store_ids = [vid for tool in tools for vid in tool.get("vector_store_ids", [])]
+        usage = usage or ResponseUsage(total_tokens=0, prompt_tokens=0, completion_tokens=0)
+        elapsed = time.perf_counter() - started
+        self.usage_ledger.record(
+            UsageRecord(
+                created_at=time.time() - elapsed,  # When the request started, not when it ended
+                model=params.get("model", self.config.model),
+                tag=self.config.usage_tag,
+                response_id=response_id,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens,
+                cached_tokens=usage.cached_tokens,
+                latency_ms=elapsed * 1000,
+                ttft_ms=ttft_ms,
+                streamed=bool(params.get("stream")),
+                kb=",".join(vector_store_ids),
+                tools=",".join(str(tool.get("type", "")) for tool in tools),
+                status=status,
+                stalls=stalls,
             )
+        )
+
+    def _convert_response(self, response: OpenAIResponse | ChatResponse, *, remember: bool = True) -> LLMResponse:
+        """Convert OpenAI response to our LLMResponse type.
+
+        Args:
+            response: The OpenAI response
+            remember: Whether to continue the conversation from this response
+
+        """
+        usage = None
+        if getattr(response, "usage", None) is not None:
+            usage = self._convert_usage(response.usage)
 
         # Store the response ID for continuity in conversations
-        if hasattr(response, "id"):
+        if remember and hasattr(response, "id"):
             self.previous_response_id = response.id
+            self.last_usage = usage
 
         # Handle refusals
         refusal = None
@@ -109,11 +282,20 @@ class OpenAIProvider(LLMProvider):
             refusal=refusal,
         )
 
+    @property
+    def remote_file(self) -> RemoteFile | None:
+        """The first attached file, for callers that only attach one."""
+        return self.remote_files[0] if self.remote_files else None
+
+    @remote_file.setter
+    def remote_file(self, remote_file: RemoteFile | None) -> None:
+        self.remote_files = [remote_file] if remote_file is not None else []
+
     async def add_file(self, file_path: str) -> bool:
         """Add a file for use with the OpenAI API.
 
         This method creates the appropriate RemoteFile instance based on file type
-        and initializes it.
+        and initializes it. Files that are already attached are kept.
 
         Args:
             file_path: Path to the file
@@ -122,15 +304,48 @@ class OpenAIProvider(LLMProvider):
             True if file setup was successful, False otherwise
 
         """
-        # Clean up any existing file first
-        if self.remote_file:
-            await self.remote_file.cleanup()
+        return await self.add_files([file_path])
+
+    async def add_files(self, file_paths: list[str], *, concurrency: int = 4) -> bool:
+        """Add several files for use with the OpenAI API.
+
+        Files are read or uploaded concurrently, at most `concurrency` at a time, and
+        are sent together in one message. Files that fail to initialize are left out.
 
-        # Create the appropriate RemoteFile instance
-        self.remote_file = create_remote_file(file_path, self.client)
+        Args:
+            file_paths: Paths to the files
+            concurrency: Maximum number of files initialized at once
+
+        Returns:
+            True if every file was set up successfully, False otherwise
 
-        # Initialize the file (upload or read content)
-        return await self.remote_file.initialize()
+        """
+        attached = {Path(remote_file.file_path).resolve() for remote_file in self.remote_files}
+        new_files: list[RemoteFile] = []
+        for file_path in file_paths:
+            resolved = Path(file_path).resolve()
+            if resolved not in attached:
+                attached.add(resolved)
+                new_files.append(
+                    create_remote_file(
+                        file_path,
+                        self.client,
+                        upload=self.supports(Capability.FILE_UPLOAD),
+                        reducers=self.file_reducers,
+                        index=self.upload_index,
+                    )
+                )
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def initialize(remote_file: RemoteFile) -> bool:
+            async with semaphore:
+                return await remote_file.initialize()
+
+        results = await asyncio.gather(*(initialize(remote_file) for remote_file in new_files))
+        self.remote_files.extend(remote_file for remote_file, ok in zip(new_files, results, strict=True) if ok)
+        self.file_in_conversation = False
+        return all(results)
 
     async def cleanup_file(self) -> bool:
         """Clean up any file resources.
@@ -139,11 +354,12 @@ class OpenAIProvider(LLMProvider):
             True if cleanup was successful, False otherwise
 
         """
-        if self.remote_file:
-            result = await self.remote_file.cleanup()
-            self.remote_file = None
-            return result
-        return True
+        if not self.remote_files:
+            return True
+        results = await asyncio.gather(*(remote_file.cleanup() for remote_file in self.remote_files))
+        self.remote_files = []
+        self.file_in_conversation = False
+        return all(results)
 
     async def respond(
         self,
@@ -187,6 +403,14 @@ class OpenAIProvider(LLMProvider):
             # Handle tools configuration
             applied_tools: list[ToolParam] = []
 
+            # Leave out tools the backend does not have rather than failing the request
+            if web_search and not self.supports(Capability.WEB_SEARCH):
+                logging.warning("Web search is not supported by %s; answering without it", self.profile.name)
+                web_search = False
+            if vector_store_id and not self.supports(Capability.FILE_SEARCH):
+                logging.warning("File search is not supported by %s; answering without it", self.profile.name)
+                vector_store_id = None
+
             # Add web search tool if enabled
             if web_search:
                 applied_tools.append({"type": "web_search_preview"})
@@ -194,26 +418,26 @@ class OpenAIProvider(LLMProvider):
             # Add file search tool if vector store ID is provided
             if vector_store_id:
                 # Debug logging for vector store ID tracking
-                logging.info(f"Processing vector store ID input: {vector_store_id}")
+                logging.info("Processing vector store ID input: %s", vector_store_id)
 
                 # Always add file search tool when vector store ID is provided
-                logging.info(f"Adding file search tool with vector store ID: {vector_store_id}")
+                logging.info("Adding file search tool with vector store ID: %s", vector_store_id)
 
                 # Check if it has the required format (vs_*)
                 if not vector_store_id.startswith("vs_"):
-                    logging.warning(f"Vector store ID {vector_store_id} doesn't match required format vs_*")
+                    logging.warning("Vector store ID %s doesn't match required format vs_*", vector_store_id)
 
                 # Split multiple vector store IDs if provided
                 vector_store_ids = [vid.strip() for vid in vector_store_id.split(",")]
-                logging.info(f"Processed vector store IDs: {vector_store_ids}")
+                logging.info("Processed vector store IDs: %s", vector_store_ids)
 
                 # Verify each ID matches expected format
                 for vid in vector_store_ids:
                     if not vid.startswith("vs_"):
-                        logging.warning(f"Individual vector store ID {vid} doesn't match required format vs_*")
+                        logging.warning("Individual vector store ID %s doesn't match required format vs_*", vid)
 
                 applied_tools.append({"type": "file_search", "vector_store_ids": vector_store_ids})
-                logging.info(f"Final tool configuration: {applied_tools[-1]}")
+                logging.info("Final tool configuration: %s", applied_tools[-1])
 
             # Add any additional tools specified in parameters or config
             if tools is not None or self.config.tools is not None:
@@ -224,25 +448,31 @@ class OpenAIProvider(LLMProvider):
             # Set tools parameter if we have any tools
             if applied_tools:
                 params["tools"] = applied_tools
-                logging.info(f"Using tools: {applied_tools}")
+                logging.info("Using tools: %s", applied_tools)
 
-            # Add file references if we have a remote file
-            if self.remote_file and isinstance(input, str):
-                file_prompt = self.remote_file.get_file_prompt(input)
-                params["input"] = [file_prompt]
-
-                # Add additional note to instructions if they exist
-                file_instruction = "see attached files for context."
-                if "instructions" in params:
-                    params["instructions"] = f"{params['instructions']}\n\n{file_instruction}"
-                else:
-                    params["instructions"] = file_instruction
+            # Stateless requests neither continue nor update the conversation, so they
+            # can run concurrently on a shared provider (e.g. schema chain stages)
+            stateless = bool(kwargs.pop("stateless", False))
 
             # Add conversation continuity if we have a previous response ID
             # Only apply if not explicitly overridden by kwargs
-            if self.previous_response_id and "previous_response_id" not in kwargs:
+            if self.previous_response_id and not stateless and "previous_response_id" not in kwargs:
                 params["previous_response_id"] = self.previous_response_id
 
+            # Send the file ahead of the input so that the request starts with the same
+            # instructions and file context every time and can hit the prompt cache.
+            # The file is only attached on the first turn: later turns continue from a
+            # response that already holds it.
+            has_file = False
+            if self.remote_files and isinstance(input, str):
+                continues = kwargs.get("previous_response_id", params.get("previous_response_id"))
+                if self.file_in_conversation and continues and continues == self.previous_response_id:
+                    has_file = True
+                elif (context_message := combine_context_messages(self.remote_files)) is not None:
+                    params["input"] = [context_message, message_input]
+                    params["instructions"] = "\n\n".join(filter(None, [params.get("instructions"), FILE_INSTRUCTION]))
+                    has_file = True
+
             # Add any other parameters
             params.update(kwargs)
 
@@ -251,7 +481,7 @@ class OpenAIProvider(LLMProvider):
 
             # Handle response format
             if text is not None or self.config.response_format is not None:
-                logging.info(f"Using response format: {text or self.config.response_format}")
+                logging.info("Using response format: %s", text or self.config.response_format)
                 response_format = text or self.config.response_format
                 params["text"] = {"format": response_format}
 
@@ -260,34 +490,284 @@ class OpenAIProvider(LLMProvider):
                 params["tools"] = tools or applied_tools or self.config.tools
 
             # Add file context if available
-            if self.remote_file:
-                file_context = await self.remote_file.get_file_context()
+            for remote_file in self.remote_files:
+                file_context = await remote_file.get_file_context()
                 if file_context:
                     params.update(file_context)
 
+            # Route requests with the same prefix to the same prompt cache. Derived keys
+            # are only sent to the OpenAI API, other endpoints may reject the parameter.
+            if "prompt_cache_key" not in params:
+                if self.config.prompt_cache_key:
+                    params["prompt_cache_key"] = self.config.prompt_cache_key
+                elif self.config.base_url is None and self.supports(Capability.PROMPT_CACHE_KEY):
+                    params["prompt_cache_key"] = prompt_cache_key(params)
+
             # Make the API call
+            started = time.perf_counter()
+            if stateless and self.config.coalesce_requests:
+                return await self._respond_coalesced(params, started)
+
+            hedged = self.config.hedge_percentile is not None and not stateless
             if self.config.stream:
-                response_stream = await self.client.responses.create(stream=True, **params)
-                return self._wrap_stream_with_id_capture(response_stream)
+                if hedged:
+                    response_stream = await self._create_stream_hedged(params, started)
+                else:
+                    response_stream = await self._create_stream(params, remember=not stateless)
+                return self._wrap_stream_with_id_capture(
+                    response_stream, params, started, remember=not stateless, has_file=has_file
+                )
 
-            response = await self.client.responses.create(**params)
-            return self._convert_response(response)
+            if hedged:
+                response = await self._create_hedged(params, started)
+            else:
+                response = await self._create(params, remember=not stateless)
+            result = self._convert_response(response, remember=not stateless)
+            if not stateless:
+                self.file_in_conversation = has_file
+            self._record_usage(params, result.usage, started=started, response_id=getattr(response, "id", None))
+            return result
 
         except Exception as e:
             logging.error(f"Error in OpenAI response: {e}")
             raise
 
+    async def _create(self, params: dict[str, Any], *, remember: bool) -> OpenAIResponse | ChatResponse:
+        """Send a request to the Responses API, or through Chat Completions if the backend lacks it.
+
+        Raises:
+            TimeoutError: If the response takes longer than the response deadline
+
+        """
+        if self.chat_fallback is not None:
+            request = self.chat_fallback.create(params, remember=remember)
+        else:
+            request = self.client.responses.create(**params)
+        return cast(OpenAIResponse | ChatResponse, await asyncio.wait_for(request, self.config.response_deadline))
+
+    async def _create_stream(self, params: dict[str, Any], *, remember: bool) -> AsyncIterator[ResponseStreamEvent]:
+        """Open a response stream, through Chat Completions if the backend lacks the Responses API."""
+        if self.chat_fallback is not None:
+            return await self.chat_fallback.stream(params, remember=remember)
+        return cast(AsyncIterator[ResponseStreamEvent], await self.client.responses.create(stream=True, **params))
+
+    def hedge_delay(self, model: str, *, first_token: bool) -> float:
+        """Get the seconds to wait for a request to start before hedging it.
+
+        The delay is the configured percentile of the model's recent time to first
+        token (or total latency, for whole responses) in the usage ledger, falling back
+        to hedge_delay_ms until the ledger has HEDGE_MIN_SAMPLES requests.
+
+        Args:
+            model: The model the request is sent to
+            first_token: Whether the request is streamed
+
+        Returns:
+            The delay in seconds
+
+        """
+        key = (model, first_token)
+        if key not in self._hedge_delays:
+            delay_ms = None
+            if self.usage_ledger is not None and self.config.hedge_percentile is not None:
+                delay_ms = self.usage_ledger.latency_percentile(
+                    self.config.hedge_percentile,
+                    model=model,
+                    since=time.time() - HEDGE_WINDOW_SECONDS,
+                    first_token=first_token,
+                    min_samples=HEDGE_MIN_SAMPLES,
+                )
+            self._hedge_delays[key] = (delay_ms or self.config.hedge_delay_ms) / 1000
+        return self._hedge_delays[key]
+
+    async def _create_hedged(self, params: dict[str, Any], started: float) -> OpenAIResponse | ChatResponse:
+        """Send a request, and a duplicate if it is slower than the hedge delay.
+
+        Neither copy is remembered as it is created, so only the response that is used
+        continues the conversation.
+        """
+
+        async def discard(response: OpenAIResponse | ChatResponse) -> None:
+            self._record_usage(
+                params,
+                self._convert_usage(response.usage) if getattr(response, "usage", None) is not None else None,
+                started=started,
+                response_id=getattr(response, "id", None),
+                status="hedged",
+            )
+
+        delay = self.hedge_delay(params["model"], first_token=False)
+        response, hedged = await hedge(lambda: self._create(params, remember=False), delay, discard=discard)
+        if hedged:
+            self.hedges += 1
+            logging.debug("Hedged request after %.0fms", delay * 1000)
+        if self.chat_fallback is not None and isinstance(response, ChatResponse):
+            self.chat_fallback.remember(params, response)
+        return response
+
+    async def _create_stream_hedged(self, params: dict[str, Any], started: float) -> AsyncIterator[ResponseStreamEvent]:
+        """Open a response stream, and a duplicate if its first token is slower than the hedge delay.
+
+        The stream that produces a token first is used and the other is closed. Like
+        _create_hedged, only the stream that is used continues the conversation.
+        """
+
+        async def discard(opened: tuple[AsyncIterator[ResponseStreamEvent], list[ResponseStreamEvent]]) -> None:
+            await close_stream(opened[0])
+            self._record_usage({**params, "stream": True}, None, started=started, status="hedged")
+
+        delay = self.hedge_delay(params["model"], first_token=True)
+        (stream, events), hedged = await hedge(
+            lambda: start_stream(lambda: self._create_stream(params, remember=False)), delay, discard=discard
+        )
+        if hedged:
+            self.hedges += 1
+            logging.debug("Hedged stream after %.0fms without a first token", delay * 1000)
+        if self.chat_fallback is not None:
+            return self._remember_chat_stream(resume_stream(stream, events), params)
+        return resume_stream(stream, events)
+
+    async def _remember_chat_stream(
+        self, stream: AsyncIterator[ResponseStreamEvent], params: dict[str, Any]
+    ) -> AsyncIterator[ResponseStreamEvent]:
+        """Continue the fallback's local conversation from a stream once it completes."""
+        try:
+            async for event in stream:
+                if self.chat_fallback is not None and event.type == "response.completed":
+                    self.chat_fallback.remember(params, cast(ChatResponse, event.response))
+                yield event
+        finally:
+            await close_stream(stream)
+
+    async def _respond_coalesced(
+        self, params: dict[str, Any], started: float
+    ) -> LLMResponse | AsyncIterator[ResponseStreamEvent]:
+        """Send a stateless request, sharing the call with identical requests in flight.
+
+        Only the first of several identical requests is sent and recorded in the usage
+        ledger. The others get the same output without usage, since they cost nothing.
+
+        Args:
+            params: The request parameters
+            started: `time.perf_counter()` value taken when the request was prepared
+
+        Returns:
+            The response, or an iterator over the shared stream
+
+        """
+        key = StageCache.key(json.dumps({**params, "stream": self.config.stream}, sort_keys=True, default=str))
+
+        if self.config.stream:
+
+            async def open_stream() -> StreamFanout[ResponseStreamEvent]:
+                response_stream = await self._create_stream(params, remember=False)
+                return StreamFanout(self._wrap_stream_with_id_capture(response_stream, params, started, remember=False))
+
+            fanout, _ = await self.flights.do(key, open_stream, hold=lambda fanout: fanout.wait_finished())
+            return fanout.subscribe()
+
+        async def create() -> LLMResponse:
+            response = await self._create(params, remember=False)
+            result = self._convert_response(response, remember=False)
+            self._record_usage(params, result.usage, started=started, response_id=getattr(response, "id", None))
+            return result
+
+        result, shared = await self.flights.do(key, create)
+        return result.model_copy(update={"usage": None}) if shared else result
+
+    async def _next_event(
+        self, events: AsyncIterator[ResponseStreamEvent], deadline: float | None
+    ) -> ResponseStreamEvent:
+        """Wait for the next stream event, giving up after the idle timeout or at the deadline.
+
+        Raises:
+            StopAsyncIteration: At the end of the stream
+            StreamStalledError: If no event arrived in time
+
+        """
+        timeout = self.config.idle_timeout
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.perf_counter())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        try:
+            return await asyncio.wait_for(anext(events), timeout)
+        except TimeoutError:
+            raise StreamStalledError(f"No stream event for {timeout:.0f}s") from None
+
     async def _wrap_stream_with_id_capture(
-        self, stream: AsyncIterator[ResponseStreamEvent]
+        self,
+        stream: AsyncIterator[ResponseStreamEvent],
+        params: dict[str, Any] | None = None,
+        started: float | None = None,
+        *,
+        remember: bool = True,
+        has_file: bool = False,
     ) -> AsyncIterator[ResponseStreamEvent]:
-        """Wrap a stream to capture the response ID from completed events."""
-        async for event in stream:
-            # Capture response ID from completed events
-            if event.type == "response.completed" and hasattr(event, "response"):
-                self.previous_response_id = event.response.id
+        """Wrap a stream to capture the response ID and usage from completed events.
 
-            # Always yield the event to the caller
-            yield event
+        A stream that sends no event within the idle timeout is closed and requested
+        again, up to stall_retries times. When text has already been received, the
+        new request asks the model to continue from it, so the caller sees one answer.
+        """
+        request = dict(params or {})
+        params = {**request, "stream": True}
+        started = time.perf_counter() if started is None else started
+        deadline = started + self.config.response_deadline if self.config.response_deadline else None
+        ttft_ms: float | None = None
+        usage: ResponseUsage | None = None
+        response_id: str | None = None
+        status = "incomplete"
+        stalls = 0
+        partial_text = ""
+        events = aiter(stream)
+        try:
+            while True:
+                try:
+                    event = await self._next_event(events, deadline)
+                except StopAsyncIteration:
+                    break
+                except StreamStalledError as e:
+                    stalls += 1
+                    await close_stream(stream)
+                    out_of_time = deadline is not None and time.perf_counter() >= deadline
+                    if stalls > self.config.stall_retries or out_of_time or not request:
+                        status = "stalled"
+                        raise StreamStalledError(f"{e} after {stalls} attempt(s)") from None
+                    logging.warning("Response stream stalled (%s); resuming, attempt %s", e, stalls + 1)
+                    stream = await self._create_stream(resume_params(request, partial_text), remember=remember)
+                    events = aiter(stream)
+                    continue
+
+                if event.type == "response.output_text.delta":
+                    partial_text += event.delta
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+
+                # Capture response ID and usage from completed events
+                if event.type == "response.completed" and hasattr(event, "response"):
+                    if remember:
+                        self.previous_response_id = event.response.id
+                        self.file_in_conversation = has_file
+                    response_id = event.response.id
+                    if getattr(event.response, "usage", None) is not None:
+                        usage = self._convert_usage(event.response.usage)
+                    if remember:
+                        self.last_usage = usage
+                    status = "completed"
+                elif event.type in ("error", "response.failed"):
+                    status = "failed"
+
+                # Always yield the event to the caller
+                yield event
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        finally:
+            # Close the HTTP stream so an abandoned response stops generating tokens
+            await close_stream(stream)
+            self._record_usage(
+                params, usage, started=started, ttft_ms=ttft_ms, response_id=response_id, status=status, stalls=stalls
+            )
 
     async def complete(self, messages: list[Message], **kwargs: Any) -> LLMResponse:
         """Send a completion request using responses API."""
@@ -316,7 +796,7 @@ class OpenAIFactory:
         logging.info("Creating OpenAI provider with configuration:", style="bold")
         for key, value in kwargs.items():
             if key != "api_key":  # Don't log sensitive information
-                logging.info(f"  {key}: [cyan]{value}[/cyan]")
+                logging.info("  %s: [cyan]%s[/cyan]", key, value)
 
         # Handle output format configuration
         if kwargs.get("output_format") == "json":
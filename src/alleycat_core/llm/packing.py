@@ -0,0 +1,322 @@
+"""Context packing for directory inputs.
+
+The text files of a directory are discovered with `os.scandir`, binaries and
+duplicate content are skipped, and the files are packed into as few requests as
+fit the context budget. Each pack is a RemoteFile, so it is sent like an attached
+text file: one `File: <path>` section per file, ahead of the user's input.
+
+Token counts are estimated locally from the text length; the estimate is
+deliberately conservative so that a full pack still leaves room for the prompt.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import hashlib
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any
+
+from openai.types.responses.easy_input_message_param import EasyInputMessageParam
+from openai.types.responses.response_input_message_content_list_param import ResponseInputContentParam
+
+from .. import logging
+from .remote_file import RemoteFile
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Skipped unless explicitly included: hidden files and directories (.git, .venv, ...) and build caches
+DEFAULT_EXCLUDE = (".*", "__pycache__", "node_modules")
+
+# Bytes inspected when deciding whether a file is binary
+_BINARY_SNIFF_BYTES = 8192
+
+
+@dataclass
+class PackedFile:
+    """A text file, or one part of a file too large for a single request."""
+
+    name: str  # Path relative to the packed directory
+    text: str
+    part: int = 1
+    parts: int = 1
+
+    @property
+    def header(self) -> str:
+        """Header naming the file, matching TextFile's file prompt."""
+        suffix = f" (part {self.part} of {self.parts})" if self.parts > 1 else ""
+        return f"File: {self.name}{suffix}\n\n"
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the file section, including its header."""
+        return estimate_tokens(self.header + self.text)
+
+
+class FilePack(RemoteFile):
+    """A set of text files sent together in one request."""
+
+    def __init__(self, root: Path, files: list[PackedFile]):
+        """Initialize the pack.
+
+        Args:
+            root: The directory the files were read from
+            files: The files in the pack
+
+        """
+        self.file_path = str(root)
+        self.files = sorted(files, key=lambda file: (file.name, file.part))
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the whole pack."""
+        return sum(file.tokens for file in self.files)
+
+    def _sections(self) -> list[ResponseInputContentParam]:
+        """One input_text part per file, headed by the file name."""
+        return [{"type": "input_text", "text": file.header + file.text} for file in self.files]
+
+    async def initialize(self) -> bool:
+        """Nothing to do, the files were read when packing."""
+        return True
+
+    async def cleanup(self) -> bool:
+        """Nothing to clean up, packs are never uploaded."""
+        return True
+
+    def get_context_message(self) -> EasyInputMessageParam | None:
+        """Get a message with one input_text part per file.
+
+        Returns:
+            An EasyInputMessageParam holding the files, or None if the pack is empty
+
+        """
+        if not self.files:
+            return None
+        return {
+            "role": "user",
+            "content": self._sections(),
+            "type": "message",
+        }
+
+    def get_file_prompt(self, input_text: str) -> EasyInputMessageParam:
+        """Get a prompt with the files followed by the user's input.
+
+        Args:
+            input_text: The user's input text
+
+        Returns:
+            An EasyInputMessageParam with the files and the input
+
+        """
+        return {
+            "role": "user",
+            "content": [*self._sections(), {"type": "input_text", "text": input_text}],
+            "type": "message",
+        }
+
+    async def get_file_context(self) -> dict[str, Any]:
+        """Get the file context for API requests.
+
+        Returns:
+            Empty dict as the files are sent in the message content
+
+        """
+        return {}
+
+
+def _matches(relative: str, name: str, patterns: Iterable[str]) -> bool:
+    """Check a path, relative to the packed directory, or its name against glob patterns."""
+    return any(fnmatch(relative, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def scan_directory(
+    root: Path,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+) -> Iterator[Path]:
+    """Walk a directory and yield the files to pack.
+
+    Directories are read one at a time with os.scandir, so files are yielded as
+    each directory is read rather than after the whole tree has been walked.
+    Excluded directories are not entered.
+
+    Args:
+        root: The directory to walk
+        include: Glob patterns a file path or name must match; all files when empty
+        exclude: Glob patterns for files and directories to skip, added to DEFAULT_EXCLUDE
+
+    Yields:
+        Paths of the matching files
+
+    """
+    include = list(include or [])
+    exclude = [*DEFAULT_EXCLUDE, *(exclude or [])]
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                # Sorted so that the first of several identical files is the one kept
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    relative = Path(entry.path).relative_to(root).as_posix()
+                    if _matches(relative, entry.name, exclude):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(Path(entry.path))
+                    elif entry.is_file() and (not include or _matches(relative, entry.name, include)):
+                        yield Path(entry.path)
+        except OSError as e:
+            logging.warning("Skipping %s: %s", directory, e)
+            continue
+        directories.extend(sorted(subdirectories, reverse=True))
+
+
+def read_text_files(paths: Iterable[Path], root: Path) -> Iterator[PackedFile]:
+    """Read text files, skipping binaries, empty files and repeated content.
+
+    Args:
+        paths: Files to read
+        root: Directory the file names are made relative to
+
+    Yields:
+        One PackedFile per distinct text file
+
+    """
+    seen: dict[str, str] = {}
+    for path in paths:
+        name = path.relative_to(root).as_posix()
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            logging.warning("Skipping %s: %s", name, e)
+            continue
+        if not data.strip():
+            continue
+        if b"\0" in data[:_BINARY_SNIFF_BYTES]:
+            logging.debug("Skipping binary file %s", name)
+            continue
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            logging.debug("Skipping non UTF-8 file %s", name)
+            continue
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            logging.debug("Skipping %s, same content as %s", name, seen[digest])
+            continue
+        seen[digest] = name
+        yield PackedFile(name=name, text=text)
+
+
+def split_file(file: PackedFile, budget: int) -> list[PackedFile]:
+    """Split a file that does not fit the budget into parts at line boundaries.
+
+    Args:
+        file: The file to split
+        budget: Token budget of one request
+
+    Returns:
+        The file itself if it fits, otherwise its parts in order
+
+    """
+    # Leave room for the longest possible part header
+    max_chars = (budget - estimate_tokens(f"File: {file.name} (part 9999 of 9999)\n\n")) * CHARS_PER_TOKEN
+    if file.tokens <= budget or max_chars <= 0:
+        return [file]
+
+    chunks: list[str] = []
+    current = ""
+    for line in file.text.splitlines(keepends=True):
+        # Lines longer than a whole part are cut into pieces
+        while len(line) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+
+    return [
+        PackedFile(name=file.name, text=chunk, part=part, parts=len(chunks))
+        for part, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def pack_files(files: Iterable[PackedFile], budget: int, root: Path = Path(".")) -> list[FilePack]:
+    """Pack files into as few packs of at most `budget` tokens as possible.
+
+    Uses first-fit decreasing: the largest files are placed first, each into the
+    first pack with room for it. Files larger than the budget are split first.
+
+    Args:
+        files: The files to pack
+        budget: Token budget of one request
+        root: Directory the files were read from
+
+    Returns:
+        The packs, ordered by the first file name in each
+
+    """
+    items = [part for file in files for part in split_file(file, budget)]
+    items.sort(key=lambda item: item.tokens, reverse=True)
+
+    bins: list[list[PackedFile]] = []
+    loads: list[int] = []
+    for item in items:
+        for index, load in enumerate(loads):
+            if load + item.tokens <= budget:
+                bins[index].append(item)
+                loads[index] += item.tokens
+                break
+        else:
+            bins.append([item])
+            loads.append(item.tokens)
+
+    packs = [FilePack(root, files) for files in bins]
+    return sorted(packs, key=lambda pack: (pack.files[0].name, pack.files[0].part))
+
+
+def pack_directory(
+    root: Path,
+    *,
+    budget: int,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+) -> list[FilePack]:
+    """Discover, read and pack the text files of a directory.
+
+    Args:
+        root: The directory to pack
+        budget: Token budget of one request
+        include: Glob patterns a file path or name must match; all files when empty
+        exclude: Glob patterns for files and directories to skip
+
+    Returns:
+        The packs, empty if the directory has no text files
+
+    Raises:
+        NotADirectoryError: If root is not a directory
+
+    """
+    if not root.is_dir():
+        raise NotADirectoryError(f"Not a directory: {root}")
+
+    files = list(read_text_files(scan_directory(root, include, exclude), root))
+    packs = pack_files(files, budget, root)
+    logging.info(
+        "Packed %s files from [cyan]%s[/cyan] into %s request(s) of at most %s tokens",
+        len(files),
+        root,
+        len(packs),
+        budget,
+    )
+    return packs
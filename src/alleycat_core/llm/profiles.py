@@ -0,0 +1,68 @@
+"""Provider profiles for OpenAI-compatible backends.
+
+A profile names a backend, its default endpoint and the features it supports.
+The OpenAI API supports everything; local servers such as llama.cpp, vLLM and
+Ollama only implement Chat Completions, so requests to them are sent through the
+Chat Completions fallback and features they lack are left out with a warning.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import enum
+
+from pydantic import BaseModel, Field
+
+
+class Capability(enum.StrEnum):
+    """Features a backend may support beyond Chat Completions."""
+
+    RESPONSES = "responses"  # The Responses API, with server-side conversation state
+    FILE_UPLOAD = "file_upload"  # Uploaded input files, e.g. PDFs
+    FILE_SEARCH = "file_search"  # The file_search tool over vector stores
+    WEB_SEARCH = "web_search"  # The web_search_preview tool
+    PROMPT_CACHE_KEY = "prompt_cache_key"  # Prompt cache routing with prompt_cache_key
+
+
+class ProviderProfile(BaseModel):
+    """A backend alleycat can send requests to."""
+
+    name: str
+    base_url: str | None = Field(default=None, description="Default endpoint, None for the OpenAI API")
+    requires_api_key: bool = True
+    capabilities: frozenset[Capability] = frozenset()
+
+    def supports(self, capability: Capability) -> bool:
+        """Check whether the backend supports a feature."""
+        return capability in self.capabilities
+
+
+PROFILES: dict[str, ProviderProfile] = {
+    profile.name: profile
+    for profile in (
+        ProviderProfile(name="openai", capabilities=frozenset(Capability)),
+        ProviderProfile(name="vllm", base_url="http://localhost:8000/v1", requires_api_key=False),
+        ProviderProfile(name="llama.cpp", base_url="http://localhost:8080/v1", requires_api_key=False),
+        ProviderProfile(name="ollama", base_url="http://localhost:11434/v1", requires_api_key=False),
+        # Any other OpenAI-compatible server; set openai_base_url to its endpoint
+        ProviderProfile(name="compatible", requires_api_key=False),
+    )
+}
+
+
+def get_profile(name: str) -> ProviderProfile:
+    """Get a provider profile by name.
+
+    Args:
+        name: Profile name, e.g. "openai" or "llama.cpp"
+
+    Returns:
+        The profile
+
+    Raises:
+        ValueError: If there is no profile with that name
+
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown provider {name!r}, expected one of {', '.join(PROFILES)}") from None
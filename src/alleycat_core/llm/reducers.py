@@ -0,0 +1,315 @@
+"""Token-reducing preprocessing of text files.
+
+Text files are sent in the prompt, so every token of a file is paid for, and waited
+for, on every request. Logs and exports are highly repetitive, and local reducers
+can often halve them before they are sent. Reducers are chosen per file type and run
+in order, each seeing the output of the one before:
+
+    whitespace      Strip trailing spaces, collapse runs of spaces and blank lines
+    template        Replace IP addresses and UUIDs with <ip> and <uuid>
+    dedupe          Keep one copy of each repeated line, with its count
+    dedupe:adjacent Only collapse runs of the same line
+    columns:A,B     Keep only some CSV columns, by header name or number from 1
+
+Running template before dedupe lets lines that differ only in an address or ID be
+counted together. Each stage reports how many estimated tokens it saved.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import csv
+import io
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from .tokens import estimate_tokens
+
+
+class Reducer(ABC):
+    """A stage that shrinks text before it is sent to a model."""
+
+    name = ""
+
+    @abstractmethod
+    def __call__(self, text: str) -> str:
+        """Reduce a text.
+
+        Args:
+            text: The text to reduce
+
+        Returns:
+            The reduced text
+
+        Raises:
+            ValueError: If the text does not suit the reducer, e.g. a missing CSV column
+
+        """
+
+
+class CollapseWhitespace(Reducer):
+    """Strip trailing spaces, collapse runs of spaces inside lines and runs of blank lines.
+
+    Leading indentation is kept, since it carries meaning in code and markdown.
+    """
+
+    name = "whitespace"
+
+    _INNER_SPACE = re.compile(r"(?<=\S)[ \t]{2,}(?=\S)")
+    _BLANK_LINES = re.compile(r"\n{3,}")
+
+    def __call__(self, text: str) -> str:
+        """Collapse the whitespace of a text."""
+        lines = (self._INNER_SPACE.sub(" ", line.rstrip()) for line in text.splitlines())
+        return self._BLANK_LINES.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+class TemplateValues(Reducer):
+    """Replace IP addresses and UUIDs with placeholders."""
+
+    name = "template"
+
+    _UUID = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+    _IPV6 = re.compile(
+        r"(?<![\w:])(?:"
+        r"(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}"  # Full form
+        r"|(?:[0-9a-fA-F]{1,4}:){1,7}:(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4}){0,5})?"  # Compressed, e.g. fe80::1
+        r"|::[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4}){0,6}"  # Leading ::, e.g. ::1
+        r")(?![\w:])"
+    )
+    _OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+    _IPV4 = re.compile(rf"(?<![\w.]){_OCTET}(?:\.{_OCTET}){{3}}(?![\w.])")
+
+    def __call__(self, text: str) -> str:
+        """Template the addresses and IDs of a text."""
+        text = self._UUID.sub("<uuid>", text)
+        text = self._IPV6.sub("<ip>", text)
+        return self._IPV4.sub("<ip>", text)
+
+
+class DedupeLines(Reducer):
+    """Keep one copy of each repeated line, marked with how many times it appeared.
+
+    By default a line is kept where it first appears. With adjacent, only runs of the
+    same line are collapsed, so the order of events is kept exactly. Blank lines are
+    never collapsed.
+    """
+
+    name = "dedupe"
+
+    def __init__(self, adjacent: bool = False):
+        """Initialize the reducer.
+
+        Args:
+            adjacent: Only collapse consecutive repeats
+
+        """
+        self.adjacent = adjacent
+
+    @staticmethod
+    def _counted(line: str, count: int) -> str:
+        return f"{line} [x{count}]" if count > 1 else line
+
+    def __call__(self, text: str) -> str:
+        """Deduplicate the lines of a text."""
+        lines = text.splitlines()
+        if self.adjacent:
+            runs: list[tuple[str, int]] = []
+            for line in lines:
+                if runs and runs[-1][0] == line and line.strip():
+                    runs[-1] = (line, runs[-1][1] + 1)
+                else:
+                    runs.append((line, 1))
+            return "\n".join(self._counted(line, count) for line, count in runs)
+
+        counts = Counter(line for line in lines if line.strip())
+        seen: set[str] = set()
+        kept: list[str] = []
+        for line in lines:
+            if not line.strip():
+                kept.append(line)
+            elif line not in seen:
+                seen.add(line)
+                kept.append(self._counted(line, counts[line]))
+        return "\n".join(kept)
+
+
+class ProjectColumns(Reducer):
+    """Keep only some columns of a CSV file."""
+
+    name = "columns"
+
+    def __init__(self, columns: Sequence[str]):
+        """Initialize the reducer.
+
+        Args:
+            columns: Header names, or column numbers counting from 1, in the order to keep them
+
+        """
+        if not columns:
+            raise ValueError("columns needs at least one column, e.g. columns:time,message")
+        self.columns = list(columns)
+
+    def __call__(self, text: str) -> str:
+        """Project the columns of a CSV text."""
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            return text
+        header = rows[0]
+        indexes: list[int] = []
+        for column in self.columns:
+            if column in header:
+                indexes.append(header.index(column))
+            elif column.isdigit() and 1 <= int(column) <= len(header):
+                indexes.append(int(column) - 1)
+            else:
+                raise ValueError(f"Column '{column}' is not in the CSV header: {', '.join(header)}")
+
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        for row in rows:
+            writer.writerow([row[index] if index < len(row) else "" for index in indexes])
+        return output.getvalue().rstrip("\n")
+
+
+def _no_argument(name: str, reducer: Callable[[], Reducer]) -> Callable[[str | None], Reducer]:
+    """Build a reducer that takes no argument, rejecting one if given."""
+
+    def build(arg: str | None) -> Reducer:
+        if arg is not None:
+            raise ValueError(f"Reducer '{name}' takes no argument, got '{arg}'")
+        return reducer()
+
+    return build
+
+
+def _dedupe(arg: str | None) -> Reducer:
+    """Build a dedupe reducer, whose only argument is `adjacent`."""
+    if arg not in (None, "adjacent"):
+        raise ValueError(f"Invalid dedupe argument '{arg}', expected dedupe or dedupe:adjacent")
+    return DedupeLines(adjacent=arg == "adjacent")
+
+
+# Builds a reducer from the argument after the colon of its spec, None when there is none
+REDUCERS: dict[str, Callable[[str | None], Reducer]] = {
+    "whitespace": _no_argument("whitespace", CollapseWhitespace),
+    "template": _no_argument("template", TemplateValues),
+    "dedupe": _dedupe,
+    "columns": lambda arg: ProjectColumns([column.strip() for column in (arg or "").split(",") if column.strip()]),
+}
+
+
+def parse_reducer(spec: str) -> Reducer:
+    """Build a reducer from its spec, a name optionally followed by `:` and an argument.
+
+    Raises:
+        ValueError: If the reducer is unknown or its argument invalid
+
+    """
+    name, _, arg = spec.strip().partition(":")
+    if name not in REDUCERS:
+        raise ValueError(f"Unknown reducer '{name}', choose from {', '.join(REDUCERS)}")
+    return REDUCERS[name](arg or None)
+
+
+@dataclass
+class StageSaving:
+    """Estimated tokens before and after one reducer."""
+
+    stage: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def saved(self) -> int:
+        """Estimated tokens the stage saved."""
+        return self.tokens_before - self.tokens_after
+
+
+class ReducerPipeline:
+    """Reducers run one after another over a text."""
+
+    def __init__(self, stages: Sequence[Reducer]):
+        """Initialize the pipeline.
+
+        Args:
+            stages: The reducers, in the order they run
+
+        """
+        self.stages = list(stages)
+
+    def run(self, text: str) -> tuple[str, list[StageSaving]]:
+        """Reduce a text through every stage.
+
+        Args:
+            text: The text to reduce
+
+        Returns:
+            The reduced text, and the tokens each stage saved
+
+        Raises:
+            ValueError: If a stage cannot reduce the text
+
+        """
+        savings: list[StageSaving] = []
+        tokens = estimate_tokens(text)
+        for stage in self.stages:
+            text = stage(text)
+            reduced = estimate_tokens(text)
+            savings.append(StageSaving(stage.name, tokens, reduced))
+            tokens = reduced
+        return text, savings
+
+
+def _extension(key: str) -> str:
+    """Normalize a file type key: `log`, `.log` and `.LOG` are the same."""
+    key = key.strip().lower()
+    return key if key == "*" or key.startswith(".") else f".{key}"
+
+
+class FileReducers:
+    """The reducers for each type of file."""
+
+    def __init__(self, config: dict[str, list[str]]):
+        """Initialize from a mapping of file extension to reducer specs.
+
+        The extension `*` applies to text files of any type without reducers of their own.
+
+        Args:
+            config: Reducer specs by file extension, e.g. `{".log": ["template", "dedupe"]}`
+
+        Raises:
+            ValueError: If a spec is invalid
+
+        """
+        self.pipelines = {
+            _extension(key): ReducerPipeline([parse_reducer(spec) for spec in specs])
+            for key, specs in config.items()
+            if specs
+        }
+
+    def for_file(self, path: str | Path) -> ReducerPipeline | None:
+        """Get the pipeline for a file, None when the file type has no reducers."""
+        return self.pipelines.get(Path(path).suffix.lower()) or self.pipelines.get("*")
+
+
+def parse_reduce_options(values: Sequence[str]) -> dict[str, list[str]]:
+    """Parse `--reduce EXT=STAGE` options into reducer specs by file extension.
+
+    Each option adds one stage, so repeat the option for several stages of one type.
+
+    Raises:
+        ValueError: If an option is not of the form EXT=STAGE or names an unknown reducer
+
+    """
+    config: dict[str, list[str]] = {}
+    for value in values:
+        key, sep, spec = value.partition("=")
+        if not sep or not key.strip() or not spec.strip():
+            raise ValueError(f"Invalid --reduce '{value}', expected EXT=STAGE, e.g. log=dedupe")
+        parse_reducer(spec)
+        config.setdefault(_extension(key), []).append(spec.strip())
+    return config
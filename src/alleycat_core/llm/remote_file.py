@@ -6,19 +6,26 @@ for different file types (uploaded files vs text-based files).
 Author: Andrew Watkins <andrew@groat.nz>
 """
 
+import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import Iterable
 from pathlib import Path
 from typing import Any
 
 from openai import AsyncOpenAI
 from openai.types.responses.easy_input_message_param import EasyInputMessageParam
+from openai.types.responses.response_input_message_content_list_param import ResponseInputContentParam
 
 from .. import logging
+from ..kb.index import KBIndex
+from .reducers import FileReducers, ReducerPipeline, StageSaving
 
 
 class RemoteFile(ABC):
     """Abstract interface for remote files."""
 
+    file_path: str
+
     @abstractmethod
     async def initialize(self) -> bool:
         """Initialize the remote file, uploading if necessary."""
@@ -42,6 +49,19 @@ class RemoteFile(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_context_message(self) -> EasyInputMessageParam | None:
+        """Get the file as a message of its own, without the user's input.
+
+        Sending the file ahead of the input keeps the start of every request that uses
+        the file identical, so it can be served from the provider's prompt cache.
+
+        Returns:
+            An EasyInputMessageParam holding the file, or None if the file is not available
+
+        """
+        pass
+
     @abstractmethod
     async def get_file_context(self) -> dict[str, Any]:
         """Get the file context for API requests.
@@ -57,16 +77,19 @@ class RemoteFile(ABC):
 class UploadedFile(RemoteFile):
     """A file that has been uploaded to the OpenAI API."""
 
-    def __init__(self, file_path: str, client: AsyncOpenAI):
+    def __init__(self, file_path: str, client: AsyncOpenAI, index: KBIndex | None = None):
         """Initialize the uploaded file.
 
         Args:
             file_path: Path to the file to upload
             client: The OpenAI client
+            index: KB index the upload is recorded in until the file is deleted, so
+                `files gc` can delete it if this run never does
 
         """
         self.file_path = file_path
         self.client = client
+        self.index = index
         self.file_id: str | None = None
 
     async def initialize(self) -> bool:
@@ -77,19 +100,21 @@ class UploadedFile(RemoteFile):
 
         """
         path = Path(self.file_path)
-        if not path.exists():
+        if not await asyncio.to_thread(path.exists):
             logging.error(f"File not found: {self.file_path}")
             return False
 
         try:
-            with open(path, "rb") as file:
-                response = await self.client.files.create(
-                    file=file,
-                    purpose="user_data",
-                )
+            # Passing the path lets the client read the file without blocking the event loop
+            response = await self.client.files.create(
+                file=path,
+                purpose="user_data",
+            )
 
             self.file_id = response.id
-            logging.info(f"Uploaded file [cyan]{path.name}[/cyan] with ID [cyan]{self.file_id}[/cyan]")
+            if self.index is not None:
+                self.index.add_upload(self.file_id, path.resolve())
+            logging.info("Uploaded file [cyan]%s[/cyan] with ID [cyan]%s[/cyan]", path.name, self.file_id)
             return True
         except Exception as e:
             error_msg = str(e)
@@ -116,7 +141,9 @@ class UploadedFile(RemoteFile):
 
         try:
             await self.client.files.delete(self.file_id)
-            logging.info(f"Deleted file with ID [cyan]{self.file_id}[/cyan]")
+            logging.info("Deleted file with ID [cyan]%s[/cyan]", self.file_id)
+            if self.index is not None:
+                self.index.remove_upload(self.file_id)
             self.file_id = None
             return True
         except Exception as e:
@@ -148,6 +175,17 @@ class UploadedFile(RemoteFile):
             "type": "message",
         }
 
+    def get_context_message(self) -> EasyInputMessageParam | None:
+        """Get a message that references the uploaded file.
+
+        Returns:
+            An EasyInputMessageParam with the file_id, or None if the file is not uploaded
+
+        """
+        if not self.file_id:
+            return None
+        return {"role": "user", "content": [{"type": "input_file", "file_id": self.file_id}], "type": "message"}
+
     async def get_file_context(self) -> dict[str, Any]:
         """Get the file context for API requests.
 
@@ -162,46 +200,83 @@ class TextFile(RemoteFile):
     """A text file that will be included directly in the prompt."""
 
     MAX_SIZE_BYTES = 1024 * 1024 * 1  # 1MB
+    MAX_REDUCED_FILE_BYTES = 64 * MAX_SIZE_BYTES  # Largest file read in full to be reduced
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, reducers: ReducerPipeline | None = None):
         """Initialize the text file.
 
         Args:
             file_path: Path to the text file
+            reducers: Reducers the content is run through before it is inlined
 
         """
         self.file_path = file_path
+        self.reducers = reducers
         self.content: str | None = None
+        self.savings: list[StageSaving] = []  # Tokens each reducer saved
 
     async def initialize(self) -> bool:
         """Read the file content.
 
+        The size limit applies to the content that is sent: with reducers, to the
+        reduced content, so a large log that reduces to under the limit can be used.
+        The whole file is read before it is reduced, so files over
+        MAX_REDUCED_FILE_BYTES are still refused.
+
         Returns:
             True if the file was read successfully, False otherwise
 
         """
         path = Path(self.file_path)
-        if not path.exists():
+        try:
+            size = (await asyncio.to_thread(path.stat)).st_size
+        except FileNotFoundError:
             logging.error(f"File not found: {self.file_path}")
             return False
 
-        # Check file size
-        size = path.stat().st_size
-        if size > self.MAX_SIZE_BYTES:
-            logging.error(
-                f"File too large: {self.file_path} ({size} bytes). Maximum size is {self.MAX_SIZE_BYTES} bytes (1MB)."
-            )
+        # Check file size; reducers may bring a larger file under the limit
+        limit = self.MAX_SIZE_BYTES if self.reducers is None else self.MAX_REDUCED_FILE_BYTES
+        if size > limit:
+            self._too_large(size, limit)
             return False
 
         try:
-            with open(path, encoding="utf-8") as file:
-                self.content = file.read()
-            logging.info(f"Read text file: [cyan]{path.name}[/cyan] ({size} bytes)")
-            return True
+            self.content = await asyncio.to_thread(path.read_text, encoding="utf-8")
+            logging.info("Read text file: [cyan]%s[/cyan] (%s bytes)", path.name, size)
         except Exception as e:
             logging.error(f"Error reading file: {str(e)}")
             return False
 
+        if self.reducers is not None:
+            try:
+                content, self.savings = await asyncio.to_thread(self.reducers.run, self.content)
+            except ValueError as e:
+                logging.error("Error reducing %s: %s", path.name, e)
+                self.content = None
+                return False
+            logging.info(
+                lambda: (
+                    f"Reduced [cyan]{path.name}[/cyan] from {self.savings[0].tokens_before} to "
+                    f"{self.savings[-1].tokens_after} estimated tokens: "
+                    + ", ".join(f"{saving.stage} -{saving.saved}" for saving in self.savings)
+                )
+            )
+            reduced_size = len(content.encode("utf-8"))
+            if reduced_size > self.MAX_SIZE_BYTES:
+                self._too_large(reduced_size, self.MAX_SIZE_BYTES, reduced=True)
+                self.content = None
+                return False
+            self.content = content
+        return True
+
+    def _too_large(self, size: int, limit: int, reduced: bool = False) -> None:
+        """Report content over a size limit."""
+        what = "Reduced file" if reduced else "File"
+        logging.error(
+            f"{what} too large: {self.file_path} ({size} bytes). Maximum size is {limit} bytes "
+            f"({limit // (1024 * 1024)}MB)."
+        )
+
     async def cleanup(self) -> bool:
         """Clean up the text file (no action needed).
 
@@ -237,6 +312,22 @@ class TextFile(RemoteFile):
             "type": "message",
         }
 
+    def get_context_message(self) -> EasyInputMessageParam | None:
+        """Get a message that holds the file content.
+
+        Returns:
+            An EasyInputMessageParam with the file name and content, or None if the file has not been read
+
+        """
+        if not self.content:
+            return None
+        file_name = Path(self.file_path).name
+        return {
+            "role": "user",
+            "content": [{"type": "input_text", "text": f"File: {file_name}\n\n{self.content}"}],
+            "type": "message",
+        }
+
     async def get_file_context(self) -> dict[str, Any]:
         """Get the file context for API requests.
 
@@ -247,12 +338,49 @@ class TextFile(RemoteFile):
         return {}
 
 
-def create_remote_file(file_path: str, client: AsyncOpenAI) -> RemoteFile:
+def combine_context_messages(files: Iterable[RemoteFile]) -> EasyInputMessageParam | None:
+    """Combine the context of several files into a single message.
+
+    Args:
+        files: The files to include, in order
+
+    Returns:
+        One message holding the input_file and input_text parts of every file, or None
+        if none of the files is available
+
+    """
+    content: list[ResponseInputContentParam] = []
+    for remote_file in files:
+        message = remote_file.get_context_message()
+        if message is None:
+            continue
+        if isinstance(message["content"], str):
+            content.append({"type": "input_text", "text": message["content"]})
+        else:
+            content.extend(message["content"])
+
+    if not content:
+        return None
+    return {"role": "user", "content": content, "type": "message"}
+
+
+def create_remote_file(
+    file_path: str,
+    client: AsyncOpenAI,
+    *,
+    upload: bool = True,
+    reducers: FileReducers | None = None,
+    index: KBIndex | None = None,
+) -> RemoteFile:
     """Create the appropriate RemoteFile implementation based on file type.
 
     Args:
         file_path: Path to the file
         client: The OpenAI client
+        upload: Whether the backend accepts uploaded files; when False every file is
+            read as text and included in the prompt
+        reducers: Reducers for text files by file type
+        index: KB index recording uploaded files
 
     Returns:
         An appropriate RemoteFile implementation
@@ -266,10 +394,10 @@ def create_remote_file(file_path: str, client: AsyncOpenAI) -> RemoteFile:
     # Files that should be uploaded to OpenAI
     uploadable_extensions = [".pdf", ".json", ".jsonl"]
 
-    if path.suffix.lower() in text_extensions:
-        return TextFile(file_path)
+    if path.suffix.lower() in text_extensions or not upload:
+        return TextFile(file_path, reducers.for_file(path) if reducers is not None else None)
     elif path.suffix.lower() in uploadable_extensions:
-        return UploadedFile(file_path, client)
+        return UploadedFile(file_path, client, index)
     else:
-        logging.warning(f"Unsupported file format: {path.suffix}. Treating as uploadable file, but it may fail.")
-        return UploadedFile(file_path, client)
+        logging.warning("Unsupported file format: %s. Treating as uploadable file, but it may fail.", path.suffix)
+        return UploadedFile(file_path, client, index)
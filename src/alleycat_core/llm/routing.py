@@ -0,0 +1,204 @@
+"""Model routing with escalation.
+
+Most requests can be answered by a small, fast model; only the hard ones need an
+expensive one. The router picks a model for each request from an ordered list of
+rules - prompt size, output format, tools and a latency budget checked against the
+p95 latency the usage ledger has recorded for each model. When the answer of a fast
+model fails a check, such as schema validation or an evaluator test case, the
+request is sent again to the next model on the escalation ladder.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import json
+import os
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from openai.types.responses.response_input_param import ResponseInputParam
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from .. import logging
+from ..config.routes import RouteRequest, RouteRule
+from ..schema import Schema, SchemaValidationError
+from ..usage import UsageLedger
+from .base import LLMProvider
+from .evaluation import LLMTestCase, ResponseEvaluator
+from .packing import FilePack
+from .remote_file import RemoteFile
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+from .types import LLMResponse
+
+# A check returns a description of what is wrong with a response, or None if it passes
+ResponseCheck = Callable[[LLMResponse], str | None]
+
+# Provider attributes holding the conversation, restored before an escalated request
+_CONVERSATION_STATE = ("previous_response_id", "last_usage", "file_in_conversation")
+
+# Ledger records older than this are ignored when estimating model latency
+LATENCY_WINDOW_SECONDS = 7 * 24 * 3600
+
+
+def estimate_request_tokens(
+    input_text: str, instructions: str | None = None, remote_files: list[RemoteFile] | None = None
+) -> int:
+    """Estimate the prompt tokens of a request, including its attached files.
+
+    Args:
+        input_text: The user's input
+        instructions: System instructions
+        remote_files: Files sent with the request
+
+    Returns:
+        The estimated number of prompt tokens
+
+    """
+    tokens = estimate_tokens(input_text) + estimate_tokens(instructions or "")
+    for remote_file in remote_files or []:
+        if isinstance(remote_file, FilePack):
+            tokens += remote_file.tokens
+            continue
+        try:
+            tokens += os.path.getsize(remote_file.file_path) // CHARS_PER_TOKEN
+        except OSError:
+            pass
+    return tokens
+
+
+def schema_check(schema: Schema) -> ResponseCheck:
+    """Check that responses are JSON matching a schema."""
+
+    def check(response: LLMResponse) -> str | None:
+        try:
+            schema.validate_response(json.loads(response.output_text))
+        except json.JSONDecodeError as e:
+            return f"Response is not valid JSON: {e}"
+        except SchemaValidationError as e:
+            return str(e)
+        return None
+
+    return check
+
+
+def evaluation_check(evaluator: ResponseEvaluator, test_case: LLMTestCase) -> ResponseCheck:
+    """Check that responses reach a test case's minimum evaluation score."""
+
+    def check(response: LLMResponse) -> str | None:
+        evaluation = evaluator.evaluate(response.output_text, test_case)
+        if evaluation.score >= test_case.min_score:
+            return None
+        return f"Evaluation score {evaluation.score:.2f} is below {test_case.min_score:.2f}: {evaluation.assessment}"
+
+    return check
+
+
+class ModelRouter:
+    """Pick a model for each request and escalate to stronger models on failed checks."""
+
+    def __init__(
+        self,
+        default_model: str,
+        rules: list[RouteRule] | None = None,
+        escalation: list[str] | None = None,
+        ledger: UsageLedger | None = None,
+    ):
+        """Initialize the router.
+
+        Args:
+            default_model: Model for requests no rule matches
+            rules: Rules tried in order, usually fastest model first
+            escalation: Models to escalate to, weakest first
+            ledger: Usage ledger the latency of each model is read from
+
+        """
+        self.default_model = default_model
+        self.rules = rules or []
+        self.escalation = escalation or []
+        self.ledger = ledger
+        self._p95: dict[str, float] | None = None
+        self.escalations = 0  # Requests sent again to a stronger model
+
+    def latency_p95(self, model: str) -> float | None:
+        """Get the recent p95 latency of a model, or None if the ledger has no records of it."""
+        if self._p95 is None:
+            self._p95 = {}
+            if self.ledger is not None:
+                since = time.time() - LATENCY_WINDOW_SECONDS
+                self._p95 = {s.key: s.p95_latency_ms for s in self.ledger.summarize("model", since=since)}
+        return self._p95.get(model)
+
+    def route(self, request: RouteRequest) -> str:
+        """Pick the model for a request.
+
+        The first matching rule whose model fits the latency budget wins. Models with
+        no recorded latency are assumed to fit.
+
+        Args:
+            request: What is known about the request
+
+        Returns:
+            The model to send the request to
+
+        """
+        for rule in self.rules:
+            if not rule.matches(request):
+                continue
+            p95 = self.latency_p95(rule.model)
+            if request.latency_budget_ms is not None and p95 is not None and p95 > request.latency_budget_ms:
+                logging.debug("Skipping %s: p95 %.0fms is over %.0fms", rule.model, p95, request.latency_budget_ms)
+                continue
+            logging.debug("Routing to %s", rule.model)
+            return rule.model
+        return self.default_model
+
+    def escalate(self, model: str) -> str | None:
+        """Get the next stronger model after a model, or None if there is none."""
+        if model not in self.escalation:
+            return self.escalation[0] if self.escalation else None
+        index = self.escalation.index(model)
+        return self.escalation[index + 1] if index + 1 < len(self.escalation) else None
+
+    async def respond(
+        self,
+        llm: LLMProvider,
+        input: str | ResponseInputParam,
+        request: RouteRequest,
+        *,
+        check: ResponseCheck | None = None,
+        **kwargs: Any,
+    ) -> tuple[LLMResponse | AsyncIterator[ResponseStreamEvent], str]:
+        """Send a request to the routed model, escalating while its response fails the check.
+
+        An escalated request continues the conversation from where the failed one did,
+        so the stronger model does not see the rejected answer. Streamed responses
+        cannot be checked before they are shown, so they are never escalated.
+
+        Args:
+            llm: The provider to send the request with
+            input: The request input
+            request: What is known about the request
+            check: Check the response must pass
+            **kwargs: Parameters for `llm.respond`
+
+        Returns:
+            The last response and the model that produced it
+
+        """
+        model = self.route(request)
+        state = {name: getattr(llm, name) for name in _CONVERSATION_STATE if hasattr(llm, name)}
+        while True:
+            response = await llm.respond(input=input, model=model, **kwargs)
+            if check is None or isinstance(response, AsyncIterator):
+                return response, model
+
+            problem = check(response)
+            stronger = self.escalate(model) if problem else None
+            if stronger is None:
+                return response, model
+
+            logging.warning("Escalating from %s to %s: %s", model, stronger, problem)
+            for name, value in state.items():
+                setattr(llm, name, value)
+            self.escalations += 1
+            model = stronger
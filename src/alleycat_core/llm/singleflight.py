@@ -0,0 +1,176 @@
+"""Coalescing of identical in-flight requests.
+
+When many concurrent callers make byte-identical stateless requests, for example
+the same extraction schema over duplicate records, only the first one is sent.
+Everyone else waits for it and receives the same response. Streamed responses are
+fanned out: every caller gets its own iterator that replays the events received so
+far and then follows the live stream.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+
+class StreamAbandonedError(RuntimeError):
+    """Raised to subscribers of a shared stream that was closed before it ended."""
+
+
+class StreamFanout[T]:
+    """Replay one async stream to any number of subscribers.
+
+    The source is read by a background task that starts with the first subscriber.
+    If every subscriber stops reading before the stream ends, the source is closed
+    so the provider stops generating tokens nobody will read. Anyone who subscribes
+    after that gets StreamAbandonedError once the buffered events are replayed,
+    rather than a truncated stream that looks complete.
+    """
+
+    def __init__(self, source: AsyncIterator[T]) -> None:
+        """Initialize the fan-out.
+
+        Args:
+            source: The stream to share
+
+        """
+        self._source = source
+        self._events: list[T] = []
+        self._error: BaseException | None = None
+        self._finished = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self._pump: asyncio.Task[None] | None = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the source stream has ended."""
+        return self._finished.is_set()
+
+    async def wait_finished(self) -> None:
+        """Wait until the source stream has ended."""
+        await self._finished.wait()
+
+    async def _run(self) -> None:
+        """Read the source stream and wake up the subscribers for every event."""
+        try:
+            async for event in self._source:
+                async with self._changed:
+                    self._events.append(event)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        except asyncio.CancelledError:
+            self._error = StreamAbandonedError("The shared stream was closed before it ended")
+            raise
+        finally:
+            aclose = getattr(self._source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            async with self._changed:
+                self._finished.set()
+                self._changed.notify_all()
+
+    def subscribe(self) -> AsyncIterator[T]:
+        """Get an iterator over the whole stream, from its first event."""
+        self._subscribers += 1
+        if self._pump is None:
+            self._pump = asyncio.ensure_future(self._run())
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[T]:
+        """Yield buffered events, then wait for new ones until the stream ends."""
+        index = 0
+        try:
+            while True:
+                async with self._changed:
+                    while index >= len(self._events) and not self.finished:
+                        await self._changed.wait()
+                    if index < len(self._events):
+                        event = self._events[index]
+                    elif self._error is not None:
+                        raise self._error
+                    else:
+                        return
+                index += 1
+                yield event
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and self._pump is not None and not self.finished:
+                self._pump.cancel()
+
+
+@dataclass
+class _Flight:
+    """A call in flight and the number of callers waiting for it."""
+
+    task: asyncio.Future[Any]
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time, sharing its result with identical callers."""
+
+    def __init__(self) -> None:
+        """Initialize with no calls in flight."""
+        self._flights: dict[str, _Flight] = {}
+        self.coalesced = 0  # Calls answered by another caller's call
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        """Stop sharing a finished call."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do[T](
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        *,
+        hold: Callable[[T], Awaitable[None]] | None = None,
+    ) -> tuple[T, bool]:
+        """Run a call, or wait for the identical call already in flight.
+
+        If every caller waiting for a call is cancelled, the call is cancelled too.
+
+        Args:
+            key: Identifies identical calls
+            call: Makes the call when no identical call is in flight
+            hold: Keeps the call joinable after it returns until this finishes, e.g. until
+                a shared stream ends
+
+        Returns:
+            The result and whether it came from another caller's call
+
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, task, hold))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _finish(
+        self,
+        key: str,
+        flight: _Flight,
+        task: asyncio.Future[Any],
+        hold: Callable[[Any], Awaitable[None]] | None,
+    ) -> None:
+        """Forget a finished call, or keep it joinable until its hold finishes."""
+        if task.cancelled() or task.exception() is not None or hold is None:
+            self._forget(key, flight)
+            return
+        holding = asyncio.ensure_future(hold(task.result()))
+        holding.add_done_callback(lambda _: self._forget(key, flight))
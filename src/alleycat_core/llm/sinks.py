@@ -0,0 +1,372 @@
+"""Stream sinks.
+
+A response stream is read once by a StreamPipeline and each event is dispatched,
+by type, to the sinks that asked for it: a terminal renderer, raw stdout, a file
+tee, an NDJSON event log or a metrics collector. Every sink reads from its own
+bounded queue in its own task, so sinks are independent of each other, and a sink
+that falls behind makes the pipeline wait rather than buffer without limit.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, cast
+
+from openai.types.responses import ResponseTextDeltaEvent
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+
+TEXT_DELTA = "response.output_text.delta"
+COMPLETED = "response.completed"
+ERROR_EVENTS = frozenset({"error", "response.failed"})
+
+
+def text_delta(event: ResponseStreamEvent) -> str:
+    """Get the text of a `response.output_text.delta` event."""
+    return cast(ResponseTextDeltaEvent, event).delta
+
+
+class StreamSink(ABC):
+    """A consumer of response stream events.
+
+    Subclasses implement on_event, and open and close when they hold resources.
+    """
+
+    # Event types the sink receives, all events when None
+    event_types: frozenset[str] | None = None
+
+    async def open(self) -> None:
+        """Prepare the sink before the first event."""
+        return None
+
+    @abstractmethod
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Handle one event.
+
+        Args:
+            event: The stream event
+
+        """
+
+    async def close(self, completed: bool) -> None:
+        """Finish after the last event.
+
+        Args:
+            completed: Whether the stream ran to its end, False if it was cancelled or failed
+
+        """
+        return None
+
+
+class TerminalSink(StreamSink):
+    """Render the response text live in the terminal, as plain text or markdown."""
+
+    event_types = frozenset({TEXT_DELTA})
+
+    def __init__(self, console: Console, output_format: str = "text"):
+        """Initialize the renderer.
+
+        Args:
+            console: Console to render to
+            output_format: text or markdown
+
+        """
+        self.console = console
+        self.output_format = output_format
+        self.text = ""
+        self._live: Live | None = None
+
+    async def open(self) -> None:
+        """Start the live display."""
+        self._live = Live(console=self.console, refresh_per_second=4)
+        self._live.start()
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Add a text delta to the display."""
+        self.text += text_delta(event)
+        if self._live is None:
+            return
+        if self.output_format == "markdown":
+            self._live.update(Markdown(self.text, code_theme="github-dark", hyperlinks=True, justify="left"))
+        else:
+            self._live.update(self.text)
+
+    async def close(self, completed: bool) -> None:
+        """Stop the live display, leaving the text on screen."""
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+
+
+class JsonSink(StreamSink):
+    """Collect the response text and print it as JSON when the response completes."""
+
+    event_types = frozenset({TEXT_DELTA, COMPLETED})
+
+    def __init__(self, console: Console):
+        """Initialize the sink.
+
+        Args:
+            console: Console to print to
+
+        """
+        self.console = console
+        self.text = ""
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Collect text, and print it on completion."""
+        if event.type == TEXT_DELTA:
+            self.text += text_delta(event)
+        else:
+            self.console.print_json(self.text)
+
+
+class StdoutSink(StreamSink):
+    """Write the raw response text as it arrives, for pipes and scripts."""
+
+    event_types = frozenset({TEXT_DELTA})
+
+    def __init__(self, stream: IO[str] | None = None):
+        """Initialize the sink.
+
+        Args:
+            stream: Where to write, sys.stdout by default
+
+        """
+        self.stream = stream or sys.stdout
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Write a text delta."""
+        self.stream.write(text_delta(event))
+        self.stream.flush()
+
+    async def close(self, completed: bool) -> None:
+        """End the output with a newline."""
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+class TeeSink(StreamSink):
+    """Save the response text to a file."""
+
+    event_types = frozenset({TEXT_DELTA})
+
+    def __init__(self, path: Path):
+        """Initialize the sink.
+
+        Args:
+            path: File the text is written to, replaced if it exists
+
+        """
+        self.path = path
+        self._file: IO[str] | None = None
+
+    async def open(self) -> None:
+        """Open the file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w", encoding="utf-8")
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Write a text delta."""
+        if self._file is not None:
+            self._file.write(text_delta(event))
+
+    async def close(self, completed: bool) -> None:
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def event_record(event: ResponseStreamEvent) -> dict[str, Any]:
+    """Convert a stream event to a JSON-serialisable dict."""
+    model_dump = getattr(event, "model_dump", None)
+    if callable(model_dump):
+        try:
+            record = model_dump(mode="json", warnings=False)
+            if isinstance(record, dict):
+                return record
+        except Exception:
+            pass
+    return {"type": event.type}
+
+
+class EventLogSink(StreamSink):
+    """Append every event to an NDJSON log, one JSON object per line."""
+
+    def __init__(self, path: Path):
+        """Initialize the sink.
+
+        Args:
+            path: Log file, appended to if it exists
+
+        """
+        self.path = path
+        self._file: IO[str] | None = None
+
+    async def open(self) -> None:
+        """Open the log."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Append an event with the time it was received."""
+        if self._file is not None:
+            record = {"received_at": time.time(), **event_record(event)}
+            self._file.write(json.dumps(record, default=str) + "\n")
+
+    async def close(self, completed: bool) -> None:
+        """Close the log."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class StreamMetrics:
+    """Timings and counts of one response stream."""
+
+    events: dict[str, int] = field(default_factory=dict)  # Events received per type
+    ttft_ms: float | None = None  # Time from the first event to the first text delta
+    duration_ms: float = 0.0
+    chars: int = 0
+    completed: bool = False
+
+    @property
+    def chars_per_second(self) -> float:
+        """Text throughput over the whole stream."""
+        return self.chars / (self.duration_ms / 1000) if self.duration_ms else 0.0
+
+
+class MetricsSink(StreamSink):
+    """Measure a response stream."""
+
+    def __init__(self) -> None:
+        """Initialize with empty metrics."""
+        self.metrics = StreamMetrics()
+        self._started: float | None = None
+
+    async def open(self) -> None:
+        """Start the clock."""
+        self._started = time.perf_counter()
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - (self._started or time.perf_counter())) * 1000
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Count an event and time the first token."""
+        self.metrics.events[event.type] = self.metrics.events.get(event.type, 0) + 1
+        if event.type == TEXT_DELTA:
+            self.metrics.chars += len(text_delta(event))
+            if self.metrics.ttft_ms is None:
+                self.metrics.ttft_ms = self._elapsed_ms()
+
+    async def close(self, completed: bool) -> None:
+        """Stop the clock."""
+        self.metrics.duration_ms = self._elapsed_ms()
+        self.metrics.completed = completed
+
+
+_DONE = object()  # Queued after the last event
+
+
+class StreamPipeline:
+    """Read a response stream once and dispatch its events to sinks."""
+
+    def __init__(self, sinks: Iterable[StreamSink], *, buffer: int = 64):
+        """Initialize the pipeline.
+
+        Args:
+            sinks: The sinks to dispatch to
+            buffer: Events each sink may fall behind before the pipeline waits for it
+
+        """
+        self.sinks = list(sinks)
+        self.buffer = buffer
+        self.text = ""  # Response text received so far, kept when the stream is cancelled
+        self._routes: dict[str, list[asyncio.Queue[Any]]] = {}
+        self._all: list[asyncio.Queue[Any]] = []
+        self._tasks: list[asyncio.Task[None]] = []
+        self._errors: list[Exception] = []
+
+    def _queues_for(self, event_type: str) -> list[asyncio.Queue[Any]]:
+        """Get the queues of the sinks that receive an event type, resolved once per type."""
+        if event_type not in self._routes:
+            self._routes[event_type] = [
+                queue
+                for sink, queue in zip(self.sinks, self._all, strict=True)
+                if sink.event_types is None or event_type in sink.event_types
+            ]
+        return self._routes[event_type]
+
+    async def _drain(self, sink: StreamSink, queue: asyncio.Queue[Any]) -> None:
+        """Feed a sink from its queue until the end of the stream.
+
+        After the sink fails, its events are discarded so the pipeline never waits on it.
+        """
+        failed = False
+        while (event := await queue.get()) is not _DONE:
+            if failed:
+                continue
+            try:
+                await sink.on_event(event)
+            except Exception as e:
+                self._errors.append(e)
+                failed = True
+
+    def _raise_failed(self) -> None:
+        """Raise the first error of a sink that has failed."""
+        if self._errors:
+            raise self._errors[0]
+
+    async def run(self, stream: AsyncIterator[ResponseStreamEvent]) -> str:
+        """Read the stream to its end, dispatching every event.
+
+        Sinks are closed whether the stream completes, fails or is cancelled. An error
+        raised by a sink stops the stream and is raised here.
+
+        Args:
+            stream: The response stream
+
+        Returns:
+            The response text
+
+        """
+        self._all = [asyncio.Queue(self.buffer) for _ in self.sinks]
+        self._routes = {}
+        self._errors = []
+        for sink in self.sinks:
+            await sink.open()
+        self._tasks = [
+            asyncio.ensure_future(self._drain(sink, queue)) for sink, queue in zip(self.sinks, self._all, strict=True)
+        ]
+
+        completed = False
+        try:
+            async for event in stream:
+                if event.type == TEXT_DELTA:
+                    self.text += text_delta(event)
+                for queue in self._queues_for(event.type):
+                    await queue.put(event)
+                self._raise_failed()
+            for queue in self._all:
+                await queue.put(_DONE)
+            await asyncio.gather(*self._tasks)
+            self._raise_failed()
+            completed = True
+            return self.text
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            for sink in self.sinks:
+                await sink.close(completed)
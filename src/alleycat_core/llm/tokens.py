@@ -0,0 +1,17 @@
+"""Local token estimates.
+
+Token counts are estimated from the text length rather than with a tokenizer, so
+they cost nothing to compute. The estimate is deliberately conservative.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import math
+
+# Rough average for English text and code with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -21,6 +21,29 @@ class ResponseUsage(BaseModel):
     total_tokens: int
     prompt_tokens: int
     completion_tokens: int
+    cached_tokens: int = 0  # prompt tokens served from the provider's prompt cache
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fraction of prompt tokens served from the provider's prompt cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    @classmethod
+    def from_api(cls, usage: Any) -> "ResponseUsage":
+        """Convert an OpenAI usage block.
+
+        The Responses API reports input/output tokens while older endpoints report
+        prompt/completion tokens, so both spellings are accepted.
+        """
+        prompt_tokens = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "input_tokens_details", None) or getattr(usage, "prompt_tokens_details", None)
+        return cls(
+            total_tokens=getattr(usage, "total_tokens", 0) or 0,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        )
 
 
 class ResponseFormatText(TypedDict):
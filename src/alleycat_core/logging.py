@@ -1,8 +1,29 @@
-"""Logging configuration for AlleyCat."""
+"""Logging configuration for AlleyCat.
 
-from typing import Any
+Messages are filtered by level before they are formatted, so a message that will
+not be shown costs almost nothing. Pass arguments `%`-style, or a callable that
+builds the message, rather than an f-string:
+
+    logging.info("Using tools: %s", tools)
+    logging.debug(lambda: f"Request: {json.dumps(params)}")
+
+Log records go to the rich stderr consoles, or, when a JSON sink is set, to a file
+as JSON lines for machines to read.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import enum
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from typing import IO, Any
 
 from rich.console import Console, ConsoleRenderable
+from rich.errors import MarkupError
+from rich.text import Text
 from rich.theme import Theme
 
 # Create themed console for logging
@@ -23,47 +44,157 @@ error_console = Console(stderr=True, theme=theme)
 # Console for normal output (stdout)
 output_console = Console(theme=theme)
 
-_verbose_enabled = False
+# A message, or a callable that builds it when the message is shown
+Message = str | Callable[[], str]
+
+
+class Level(enum.IntEnum):
+    """Log levels, lowest first."""
+
+    DEBUG = 10
+    INFO = 20
+    SUCCESS = 25
+    WARNING = 30
+    ERROR = 40
+
+
+# Only errors are shown unless verbose output is enabled
+_level = Level.ERROR
+_json_sink: IO[str] | None = None
+_json_sink_opened = False  # Whether set_json_sink opened the sink, and so closes it
+_json_lock = threading.Lock()
+
+_PREFIXES = {
+    Level.DEBUG: "[debug]🔍 [/debug]",
+    Level.INFO: "[info]ℹ [/info]",
+    Level.SUCCESS: "[success]✓ [/success]",
+    Level.WARNING: "[warning]⚠ [/warning]",
+    Level.ERROR: "[error]✗ [/error]",
+}
 
 
 def set_verbose(enabled: bool) -> None:
     """Enable or disable verbose output."""
-    global _verbose_enabled
-    _verbose_enabled = enabled
+    set_level(Level.DEBUG if enabled else Level.ERROR)
 
 
 def is_verbose() -> bool:
     """Check if verbose output is enabled."""
-    return _verbose_enabled
+    return _level <= Level.INFO
+
+
+def set_level(level: Level | str) -> None:
+    """Set the lowest level of the messages logged.
+
+    Args:
+        level: A Level, or its name in any case
+
+    Raises:
+        ValueError: If the level name is unknown
+
+    """
+    global _level
+    if isinstance(level, str):
+        try:
+            level = Level[level.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown log level: {level}") from None
+    _level = level
+
+
+def is_enabled(level: Level) -> bool:
+    """Check whether messages of a level are logged."""
+    return level >= _level
+
+
+def set_json_sink(target: str | int | IO[str] | None) -> None:
+    """Write log records as JSON lines instead of to the consoles.
+
+    Args:
+        target: A file descriptor, or its number as a string, a file path to append
+            to, an open text file, or None to log to the consoles again
+
+    """
+    global _json_sink, _json_sink_opened
+    if _json_sink is not None and _json_sink_opened:
+        _json_sink.close()
+    if isinstance(target, str) and target.isdigit():
+        target = int(target)
+    _json_sink_opened = isinstance(target, int | str)
+    if isinstance(target, int):
+        _json_sink = os.fdopen(target, "w", buffering=1, encoding="utf-8", closefd=False)
+    elif isinstance(target, str):
+        _json_sink = open(target, "a", buffering=1, encoding="utf-8")
+    else:
+        _json_sink = target
+
+
+def _format(message: Message, args: tuple[Any, ...]) -> str:
+    """Build a message that is going to be shown."""
+    text = message() if callable(message) else message
+    return text % args if args else text
+
+
+def _plain(text: str) -> str:
+    """Strip rich markup from a message."""
+    try:
+        return Text.from_markup(text).plain
+    except MarkupError:
+        return text
+
+
+def _write_json(level: Level, text: str) -> None:
+    """Write a log record to the JSON sink."""
+    record = {"ts": time.time(), "level": level.name.lower(), "message": _plain(text)}
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _json_lock:
+        if _json_sink is not None:
+            _json_sink.write(line)
+
+
+def log(level: Level, message: Message, *args: Any, **kwargs: Any) -> None:
+    """Log a message at a level.
+
+    Args:
+        level: The message level
+        message: The message, a `%`-style format for args, or a callable returning it
+        *args: Arguments for the format, only applied if the message is logged
+        **kwargs: Options for `Console.print`, such as style
+
+    """
+    if level < _level:
+        return
+    text = _format(message, args)
+    if _json_sink is not None:
+        _write_json(level, text)
+        return
+    console = error_console if level >= Level.ERROR else verbose_console
+    console.print(f"{_PREFIXES[level]}{text}", **kwargs)
 
 
-def info(message: str, **kwargs: Any) -> None:
+def info(message: Message, *args: Any, **kwargs: Any) -> None:
     """Log an info message."""
-    if _verbose_enabled:
-        verbose_console.print(f"[info]ℹ [/info]{message}", **kwargs)
+    log(Level.INFO, message, *args, **kwargs)
 
 
-def warning(message: str, **kwargs: Any) -> None:
+def warning(message: Message, *args: Any, **kwargs: Any) -> None:
     """Log a warning message."""
-    if _verbose_enabled:
-        verbose_console.print(f"[warning]⚠ [/warning]{message}", **kwargs)
+    log(Level.WARNING, message, *args, **kwargs)
 
 
-def error(message: str, **kwargs: Any) -> None:
+def error(message: Message, *args: Any, **kwargs: Any) -> None:
     """Log an error message."""
-    error_console.print(f"[error]✗ [/error]{message}", **kwargs)
+    log(Level.ERROR, message, *args, **kwargs)
 
 
-def success(message: str, **kwargs: Any) -> None:
+def success(message: Message, *args: Any, **kwargs: Any) -> None:
     """Log a success message."""
-    if _verbose_enabled:
-        verbose_console.print(f"[success]✓ [/success]{message}", **kwargs)
+    log(Level.SUCCESS, message, *args, **kwargs)
 
 
-def debug(message: str, **kwargs: Any) -> None:
+def debug(message: Message, *args: Any, **kwargs: Any) -> None:
     """Log a debug message."""
-    if _verbose_enabled:
-        verbose_console.print(f"[debug]🔍 [/debug]{message}", **kwargs)
+    log(Level.DEBUG, message, *args, **kwargs)
 
 
 def output(message: str | ConsoleRenderable, **kwargs: Any) -> None:
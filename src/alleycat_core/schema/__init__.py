@@ -1,6 +1,7 @@
 """Schema management module for handling structured output schemas."""
 
 from .manager import SchemaManager
+from .refs import resolve_local_refs
 from .schema import Schema, SchemaValidationError
 
-__all__ = ["Schema", "SchemaManager", "SchemaValidationError"]
+__all__ = ["Schema", "SchemaManager", "SchemaValidationError", "resolve_local_refs"]
@@ -1,16 +1,78 @@
 """Schema manager for handling schema caching and management."""
 
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Any
 
-from .schema import Schema
+from jsonschema.protocols import Validator
+
+from .. import logging
+from .refs import resolve_local_refs
+from .schema import Schema, SchemaValidationError, compile_validator
+
+# Bump when the layout of persisted cache entries changes
+CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class FileStamp:
+    """Identity of a file on disk, used to detect changes without reading it."""
+
+    path: str
+    mtime_ns: int
+    size: int
+
+    @classmethod
+    def of(cls, path: Path) -> "FileStamp":
+        """Stamp a file from its current metadata."""
+        stat = path.stat()
+        return cls(path=str(path), mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+    def is_current(self) -> bool:
+        """Check if the file still has the same metadata."""
+        try:
+            return FileStamp.of(Path(self.path)) == self
+        except OSError:
+            return False
+
+
+@dataclass
+class _CacheEntry:
+    """A loaded schema with the stamps of every file it was built from."""
+
+    stamps: list[FileStamp]
+    schema: Schema
+
+    def is_current(self) -> bool:
+        """Check if none of the files the schema was built from have changed."""
+        return all(stamp.is_current() for stamp in self.stamps)
 
 
 class SchemaManager:
-    """Manager class for handling schema caching and management."""
+    """Manager class for handling schema caching and management.
 
-    def __init__(self) -> None:
-        """Initialize schema manager."""
-        self._schema_cache: dict[str, Schema] = {}
+    Schemas are cached in memory and, when a cache directory is set, persisted to disk
+    with local `$ref`s already resolved. Cache entries are keyed by the resolved path
+    and invalidated when the modification time or size of the schema file, or of any
+    file it references, changes.
+    """
+
+    def __init__(self, cache_dir: Path | None = None) -> None:
+        """Initialize schema manager.
+
+        Args:
+            cache_dir: Directory for the persistent schema cache, or None to cache in memory only
+
+        """
+        self.cache_dir = cache_dir
+        self._schema_cache: dict[str, _CacheEntry] = {}
+        # Compiled validators keyed by schema content hash
+        self._validator_cache: dict[str, Validator] = {}
 
     def get_schema(self, schema_path: str | Path) -> Schema:
         """Get schema from cache or load from file.
@@ -25,17 +87,62 @@ class SchemaManager:
             SchemaValidationError: If schema is invalid or cannot be loaded
 
         """
-        schema_path = str(schema_path)
-        if schema_path not in self._schema_cache:
-            self._schema_cache[schema_path] = Schema.from_file(schema_path)
-        return self._schema_cache[schema_path]
+        path = Path(schema_path).resolve()
+        if not path.exists():
+            raise SchemaValidationError(f"Schema file not found: {schema_path}")
+
+        key = str(path)
+        entry = self._schema_cache.get(key)
+        if entry is None or not entry.is_current():
+            entry = self._read_persisted(path) or self._load(path)
+            entry.schema.use_validator(self.get_validator(entry.schema))
+            self._schema_cache[key] = entry
+        return entry.schema
+
+    def get_validator(self, schema: Schema) -> Validator:
+        """Get the compiled validator for a schema.
+
+        Validators are compiled once per distinct schema definition and shared by
+        every Schema object with the same content hash.
+
+        Args:
+            schema: Schema to get a validator for
+
+        Returns:
+            Validator: Compiled validator
+
+        Raises:
+            SchemaValidationError: If the schema is not a valid JSON schema
+
+        """
+        key = schema.content_hash
+        if key not in self._validator_cache:
+            self._validator_cache[key] = compile_validator(schema.json_schema_data)
+        return self._validator_cache[key]
+
+    def validate_many(self, schema_path: str | Path, records: Iterable[Any]) -> Iterator[list[str]]:
+        """Validate a stream of records against a schema file.
+
+        Args:
+            schema_path: Path to schema file
+            records: Records to validate
+
+        Yields:
+            A list of error messages for each record, empty when the record is valid
+
+        """
+        return self.get_schema(schema_path).validate_many(records)
 
     def clear_cache(self) -> None:
-        """Clear schema cache."""
+        """Clear the in-memory and persistent schema caches."""
         self._schema_cache.clear()
+        self._validator_cache.clear()
+        if self.cache_dir and self.cache_dir.exists():
+            for cache_file in self.cache_dir.glob("*.json"):
+                cache_file.unlink(missing_ok=True)
 
     def validate_schema_file(self, schema_path: str | Path) -> None:
-        """Validate schema file without caching.
+        """Validate schema file, including any local files it references.
 
         Args:
             schema_path: Path to schema file
@@ -44,4 +151,75 @@ class SchemaManager:
             SchemaValidationError: If schema is invalid
 
         """
-        Schema.from_file(schema_path)
+        self.get_validator(self.get_schema(schema_path))
+
+    def _load(self, path: Path) -> _CacheEntry:
+        """Load a schema file, resolve its local references and persist the result."""
+        # Stamp before reading so a concurrent edit invalidates the entry
+        stamp = FileStamp.of(path)
+        raw = Schema.from_file(path)
+        resolved, dependencies = resolve_local_refs(raw.json_schema_data, path)
+        schema = Schema(name=raw.name, schema=resolved, strict=raw.strict)
+        entry = _CacheEntry(stamps=[stamp, *(FileStamp.of(dep) for dep in dependencies)], schema=schema)
+        self._write_persisted(path, entry)
+        return entry
+
+    def _cache_file(self, path: Path) -> Path | None:
+        """Path of the persistent cache entry for a schema file."""
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256(str(path).encode("utf-8")).hexdigest()[:32]
+        return self.cache_dir / f"{digest}.json"
+
+    def _read_persisted(self, path: Path) -> _CacheEntry | None:
+        """Read a persisted cache entry if it exists and is still current."""
+        cache_file = self._cache_file(path)
+        if cache_file is None or not cache_file.exists():
+            return None
+
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION or data.get("path") != str(path):
+                return None
+            entry = _CacheEntry(
+                stamps=[FileStamp(**stamp) for stamp in data["stamps"]],
+                schema=Schema(name=data["name"], schema=data["schema"], strict=data["strict"]),
+            )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.debug(f"Ignoring unreadable schema cache entry {cache_file}: {e}")
+            return None
+
+        if not entry.is_current():
+            return None
+        entry.schema.use_request_format(data.get("request_format"), data.get("content_hash"))
+        logging.debug(f"Loaded schema {path} from cache {cache_file}")
+        return entry
+
+    def _write_persisted(self, path: Path, entry: _CacheEntry) -> None:
+        """Persist a cache entry atomically, so concurrent readers never see partial files."""
+        cache_file = self._cache_file(path)
+        if cache_file is None:
+            return
+
+        data = {
+            "version": CACHE_VERSION,
+            "path": str(path),
+            "stamps": [asdict(stamp) for stamp in entry.stamps],
+            "name": entry.schema.name,
+            "strict": entry.schema.strict,
+            "schema": entry.schema.json_schema_data,
+            "content_hash": entry.schema.content_hash,
+            "request_format": entry.schema.to_request_format(),
+        }
+        tmp_name: str | None = None
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_name, cache_file)
+        except OSError as e:
+            logging.debug(f"Could not write schema cache entry {cache_file}: {e}")
+            if tmp_name:
+                Path(tmp_name).unlink(missing_ok=True)
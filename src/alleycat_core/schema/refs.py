@@ -0,0 +1,117 @@
+"""Resolution of `$ref`s that point at local schema files.
+
+Large schemas are often composed from several files. The OpenAI API only accepts a
+single self-contained schema, so references to other local files are inlined once
+when the schema is loaded. References inside the top-level document (`#/$defs/...`)
+are left for the API and the validator to resolve.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+from urllib.parse import unquote
+
+from .schema import SchemaValidationError
+
+
+def _is_file_ref(ref: str) -> bool:
+    """Check if a `$ref` points at another local file rather than this document or a URL."""
+    return not ref.startswith("#") and "://" not in ref
+
+
+def _resolve_pointer(document: Any, pointer: str, ref: str) -> Any:
+    """Resolve a JSON pointer (the part after `#`) within a document."""
+    target = document
+    for token in [t for t in pointer.split("/") if t]:
+        token = unquote(token).replace("~1", "/").replace("~0", "~")
+        try:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            raise SchemaValidationError(f"Cannot resolve $ref '{ref}': no '{token}' in target") from e
+    return target
+
+
+class _Resolver:
+    """Inline local file references, tracking the files read and detecting cycles."""
+
+    def __init__(self) -> None:
+        """Initialize the resolver with no documents loaded."""
+        self.documents: dict[Path, Any] = {}
+        self.stack: list[str] = []
+
+    def load(self, path: Path) -> Any:
+        """Load a JSON document once per path."""
+        if path not in self.documents:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.documents[path] = json.load(f)
+            except FileNotFoundError as e:
+                raise SchemaValidationError(f"Referenced schema file not found: {path}") from e
+            except json.JSONDecodeError as e:
+                raise SchemaValidationError(f"Invalid JSON in referenced schema file {path}: {e}") from e
+        return self.documents[path]
+
+    def resolve(self, node: Any, base: Path, document: Any, *, root: bool) -> Any:
+        """Return a copy of node with local references inlined.
+
+        Args:
+            node: The schema fragment to resolve
+            base: The file the fragment was read from
+            document: The whole document containing the fragment
+            root: Whether the document is the top-level schema, whose own `#` refs are kept
+
+        """
+        if isinstance(node, list):
+            return [self.resolve(item, base, document, root=root) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        ref = node.get("$ref")
+        if isinstance(ref, str) and (_is_file_ref(ref) or not root):
+            file_part, _, pointer = ref.partition("#")
+            target_path = (base.parent / file_part).resolve() if file_part else base
+            key = f"{target_path}#{pointer}"
+            if key in self.stack:
+                raise SchemaValidationError(f"Circular $ref detected: {' -> '.join([*self.stack, key])}")
+
+            target_document = self.load(target_path) if file_part else document
+            self.stack.append(key)
+            try:
+                resolved = self.resolve(
+                    _resolve_pointer(target_document, pointer, ref),
+                    target_path,
+                    target_document,
+                    root=False,
+                )
+            finally:
+                self.stack.pop()
+
+            # Keywords next to the $ref (e.g. a description) override the referenced schema
+            siblings = {k: self.resolve(v, base, document, root=root) for k, v in node.items() if k != "$ref"}
+            if isinstance(resolved, dict):
+                return {**resolved, **siblings}
+            return resolved
+
+        return {key: self.resolve(value, base, document, root=root) for key, value in node.items()}
+
+
+def resolve_local_refs(schema: dict[str, Any], schema_path: Path) -> tuple[dict[str, Any], list[Path]]:
+    """Inline every `$ref` to another local file.
+
+    Args:
+        schema: The top-level schema document
+        schema_path: Path the schema was read from, used to resolve relative references
+
+    Returns:
+        The schema with local file references inlined, and the referenced files
+
+    Raises:
+        SchemaValidationError: If a reference cannot be resolved or references are circular
+
+    """
+    resolver = _Resolver()
+    base = schema_path.resolve()
+    resolved: dict[str, Any] = resolver.resolve(schema, base, schema, root=True)
+    return resolved, sorted(path for path in resolver.documents if path != base)
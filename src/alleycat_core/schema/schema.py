@@ -1,10 +1,15 @@
 """Schema class for handling JSON schema validation and processing."""
 
+import hashlib
 import json
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 from typing import Any, Literal
 
-from pydantic import BaseModel, Field, ValidationError
+from jsonschema import exceptions as jsonschema_exceptions
+from jsonschema import validators
+from jsonschema.protocols import Validator
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
 
 
 class SchemaValidationError(Exception):
@@ -13,6 +18,30 @@ class SchemaValidationError(Exception):
     pass
 
 
+def compile_validator(schema: dict[str, Any]) -> Validator:
+    """Compile a JSON schema into a reusable validator.
+
+    The validator class is chosen from the schema's `$schema` keyword, defaulting to
+    the latest draft supported by jsonschema.
+
+    Args:
+        schema: The JSON schema definition
+
+    Returns:
+        Validator: A compiled validator instance
+
+    Raises:
+        SchemaValidationError: If the schema itself is not a valid JSON schema
+
+    """
+    validator_cls = validators.validator_for(schema)
+    try:
+        validator_cls.check_schema(schema)
+    except jsonschema_exceptions.SchemaError as e:
+        raise SchemaValidationError(f"Invalid JSON schema: {e.message}") from e
+    return validator_cls(schema, format_checker=validator_cls.FORMAT_CHECKER)
+
+
 class Schema(BaseModel):
     """Schema for structured output."""
 
@@ -21,6 +50,10 @@ class Schema(BaseModel):
     json_schema_data: dict[str, Any] = Field(..., description="JSON schema definition", alias="schema")
     strict: bool = True
 
+    _validator: Validator | None = PrivateAttr(default=None)
+    _content_hash: str | None = PrivateAttr(default=None)
+    _request_format: dict[str, Any] | None = PrivateAttr(default=None)
+
     @classmethod
     def from_file(cls, file_path: str | Path) -> "Schema":
         """Load schema from a JSON file.
@@ -56,6 +89,45 @@ class Schema(BaseModel):
         except Exception as e:
             raise SchemaValidationError(f"Error loading schema: {e}") from e
 
+    @property
+    def content_hash(self) -> str:
+        """Hash of the canonical JSON schema definition.
+
+        Two schemas with the same definition share a hash regardless of key order,
+        file name or location.
+        """
+        if self._content_hash is None:
+            canonical = json.dumps(self.json_schema_data, sort_keys=True, separators=(",", ":"))
+            self._content_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return self._content_hash
+
+    @property
+    def validator(self) -> Validator:
+        """Compiled validator for this schema, compiled on first use."""
+        if self._validator is None:
+            self._validator = compile_validator(self.json_schema_data)
+        return self._validator
+
+    def use_validator(self, validator: Validator) -> None:
+        """Use an already compiled validator, e.g. one shared through SchemaManager.
+
+        Args:
+            validator: A validator compiled from this schema's definition
+
+        """
+        self._validator = validator
+
+    def use_request_format(self, request_format: dict[str, Any] | None, content_hash: str | None = None) -> None:
+        """Use a previously computed request payload and content hash, e.g. from a persistent cache.
+
+        Args:
+            request_format: The payload previously returned by to_request_format()
+            content_hash: The previously computed content hash
+
+        """
+        self._request_format = request_format
+        self._content_hash = content_hash
+
     def to_request_format(self) -> dict[str, Any]:
         """Convert schema to format expected by OpenAI API.
 
@@ -63,7 +135,14 @@ class Schema(BaseModel):
             Dict[str, Any]: Schema in OpenAI API format
 
         """
-        return {"type": self.type, "schema": self.json_schema_data, "name": self.name, "strict": self.strict}
+        if self._request_format is None:
+            self._request_format = {
+                "type": self.type,
+                "schema": self.json_schema_data,
+                "name": self.name,
+                "strict": self.strict,
+            }
+        return self._request_format
 
     def validate_response(self, response: dict[str, Any]) -> None:
         """Validate response against schema.
@@ -75,11 +154,36 @@ class Schema(BaseModel):
             SchemaValidationError: If response does not match schema
 
         """
-        # TODO: Implement response validation against schema
-        # This will require a JSON Schema validator like jsonschema
-        pass
+        error = jsonschema_exceptions.best_match(self.validator.iter_errors(response))
+        if error is not None:
+            raise SchemaValidationError(f"Response does not match schema '{self.name}': {_describe(error)}")
 
     def validate_data(self, data: Any) -> bool:
         """Validate data against the schema."""
-        # TODO: Implement validation
-        return True
+        return bool(self.validator.is_valid(data))
+
+    def validate_many(self, records: Iterable[Any]) -> Iterator[list[str]]:
+        """Validate a stream of records against the schema.
+
+        The compiled validator is reused for every record, so this is suitable for
+        very large batches. Records are consumed lazily.
+
+        Args:
+            records: Records to validate
+
+        Yields:
+            A list of error messages for each record, empty when the record is valid
+
+        """
+        validator = self.validator
+        for record in records:
+            if validator.is_valid(record):
+                yield []
+            else:
+                yield [_describe(error) for error in validator.iter_errors(record)]
+
+
+def _describe(error: jsonschema_exceptions.ValidationError) -> str:
+    """Describe a validation error with the JSON path where it occurred."""
+    location = error.json_path if error.path else "$"
+    return f"{location}: {error.message}"
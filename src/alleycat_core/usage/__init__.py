@@ -0,0 +1,11 @@
+"""Usage accounting for AlleyCat.
+
+This package contains the local usage ledger that records token counts and
+latency for every LLM request, and the aggregation used by `alleycat-admin usage`.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from .ledger import UsageLedger, UsageRecord, UsageSummary
+
+__all__ = ["UsageLedger", "UsageRecord", "UsageSummary"]
@@ -0,0 +1,306 @@
+"""SQLite backed usage ledger.
+
+Every request made through a provider can be appended to a local SQLite database.
+The ledger is shared by all alleycat processes on the machine, so it uses WAL
+journalling and a busy timeout to tolerate concurrent scripted jobs.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import math
+import sqlite3
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from .. import logging
+
+GROUP_BY_OPTIONS = ("day", "model", "tag")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    model TEXT NOT NULL,
+    tag TEXT,
+    response_id TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL NOT NULL,
+    ttft_ms REAL,
+    streamed INTEGER NOT NULL DEFAULT 0,
+    kb TEXT NOT NULL DEFAULT '',
+    tools TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'completed',
+    stalls INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS usage_created_at ON usage (created_at);
+CREATE INDEX IF NOT EXISTS usage_model ON usage (model);
+CREATE INDEX IF NOT EXISTS usage_tag ON usage (tag);
+"""
+
+_COLUMNS = (
+    "created_at",
+    "model",
+    "tag",
+    "response_id",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cached_tokens",
+    "latency_ms",
+    "ttft_ms",
+    "streamed",
+    "kb",
+    "tools",
+    "status",
+    "stalls",
+)
+
+# Columns added after the first release, with their definitions, added to older ledgers on open
+_ADDED_COLUMNS = {"stalls": "INTEGER NOT NULL DEFAULT 0"}
+
+
+class UsageRecord(BaseModel):
+    """A single request as stored in the ledger."""
+
+    created_at: float = Field(default_factory=time.time, description="Unix time the request started")
+    model: str
+    tag: str | None = None
+    response_id: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cached_tokens: int = 0
+    latency_ms: float = 0.0
+    ttft_ms: float | None = Field(default=None, description="Time to first token for streamed responses")
+    streamed: bool = False
+    kb: str = Field(default="", description="Comma-separated vector store IDs used for file search")
+    tools: str = Field(default="", description="Comma-separated tool types used by the request")
+    status: str = "completed"
+    stalls: int = Field(default=0, description="Times the stream stalled and was resumed or retried")
+
+
+class UsageSummary(BaseModel):
+    """Aggregated statistics for one group of ledger records."""
+
+    key: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cached_tokens: int
+    p50_latency_ms: float
+    p95_latency_ms: float
+    tokens_per_second: float
+    stalls: int = 0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fraction of prompt tokens served from the provider's prompt cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values: Values to rank, need not be sorted
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile value, or 0.0 for an empty list
+
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class UsageLedger:
+    """Append-only ledger of LLM requests."""
+
+    def __init__(self, path: Path):
+        """Initialize the ledger.
+
+        The database is opened lazily on first use so that creating a ledger is free
+        for commands that never make a request.
+
+        Args:
+            path: Path to the SQLite database file
+
+        """
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema if needed."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=10.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(usage)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE usage ADD COLUMN {column} {definition}")
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def record(self, record: UsageRecord) -> None:
+        """Append a record to the ledger.
+
+        Failures are logged rather than raised - losing a ledger entry must never
+        fail the request it describes.
+
+        Args:
+            record: The usage record to store
+
+        """
+        try:
+            conn = self._connect()
+            values = record.model_dump()
+            with conn:
+                conn.execute(
+                    f"INSERT INTO usage ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    [values[column] for column in _COLUMNS],
+                )
+        except sqlite3.Error as e:
+            logging.warning("Could not record usage in %s: %s", self.path, e)
+
+    def records(
+        self,
+        *,
+        since: float | None = None,
+        model: str | None = None,
+        tag: str | None = None,
+    ) -> Iterator[UsageRecord]:
+        """Iterate over stored records, oldest first.
+
+        Args:
+            since: Only include records created at or after this Unix time
+            model: Only include records for this model
+            tag: Only include records with this tag
+
+        Yields:
+            Matching usage records
+
+        """
+        clauses: list[str] = []
+        params: list[object] = []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if tag is not None:
+            clauses.append("tag = ?")
+            params.append(tag)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM usage{where} ORDER BY created_at"
+        for row in self._connect().execute(query, params):
+            data = dict(zip(_COLUMNS, row, strict=True))
+            data["streamed"] = bool(data["streamed"])
+            yield UsageRecord.model_validate(data)
+
+    def latency_percentile(
+        self,
+        pct: float,
+        *,
+        model: str | None = None,
+        since: float | None = None,
+        first_token: bool = False,
+        min_samples: int = 1,
+    ) -> float | None:
+        """Get a percentile of the latency of recent completed requests.
+
+        Args:
+            pct: Percentile between 0 and 100
+            model: Only include records for this model
+            since: Only include records created at or after this Unix time
+            first_token: Use the time to first token of streamed requests instead of the total latency
+            min_samples: Fewest records the percentile is computed from
+
+        Returns:
+            The percentile in milliseconds, or None if there are fewer than min_samples records
+
+        """
+        values = [
+            record.ttft_ms if first_token else record.latency_ms
+            for record in self.records(since=since, model=model)
+            if record.status == "completed" and (record.ttft_ms is not None or not first_token)
+        ]
+        if len(values) < max(1, min_samples):
+            return None
+        return percentile([value for value in values if value is not None], pct)
+
+    def summarize(
+        self,
+        group_by: str = "day",
+        *,
+        since: float | None = None,
+        model: str | None = None,
+        tag: str | None = None,
+    ) -> list[UsageSummary]:
+        """Aggregate records into per-group latency and token statistics.
+
+        Args:
+            group_by: Group records by calendar day (local time), model or tag
+            since: Only include records created at or after this Unix time
+            model: Only include records for this model
+            tag: Only include records with this tag
+
+        Returns:
+            One summary per group, ordered by group key
+
+        Raises:
+            ValueError: If group_by is not one of day, model or tag
+
+        """
+        if group_by not in GROUP_BY_OPTIONS:
+            raise ValueError(f"Cannot group usage by {group_by!r}, expected one of {', '.join(GROUP_BY_OPTIONS)}")
+
+        groups: dict[str, list[UsageRecord]] = {}
+        for record in self.records(since=since, model=model, tag=tag):
+            if group_by == "day":
+                key = time.strftime("%Y-%m-%d", time.localtime(record.created_at))
+            elif group_by == "model":
+                key = record.model
+            else:
+                key = record.tag or "(none)"
+            groups.setdefault(key, []).append(record)
+
+        summaries = []
+        for key in sorted(groups):
+            group = groups[key]
+            latencies = [r.latency_ms for r in group]
+            completion_tokens = sum(r.completion_tokens for r in group)
+            total_seconds = sum(latencies) / 1000
+            summaries.append(
+                UsageSummary(
+                    key=key,
+                    requests=len(group),
+                    prompt_tokens=sum(r.prompt_tokens for r in group),
+                    completion_tokens=completion_tokens,
+                    total_tokens=sum(r.total_tokens for r in group),
+                    cached_tokens=sum(r.cached_tokens for r in group),
+                    p50_latency_ms=percentile(latencies, 50),
+                    p95_latency_ms=percentile(latencies, 95),
+                    tokens_per_second=completion_tokens / total_seconds if total_seconds else 0.0,
+                    stalls=sum(r.stalls for r in group),
+                )
+            )
+        return summaries
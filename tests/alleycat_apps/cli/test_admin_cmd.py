@@ -15,14 +15,16 @@ from typer.testing import CliRunner
 # Ignore missing stubs
 from alleycat_apps.cli.admin_cmd import app  # type: ignore
 from alleycat_core.config.settings import Settings  # type: ignore
+from alleycat_core.kb.index import KBIndex
 
 
 @pytest.fixture
-def mock_settings(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
+def mock_settings(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> MagicMock:
     """Mock Settings class."""
     mock = MagicMock(spec=Settings)
     mock.knowledge_bases = {}
     mock.kb_files = {}
+    mock.kb_index = tmp_path / "kb.db"
     mock.default_kb = None
     mock.openai_api_key = "test-api-key"
     mock.config_file = Path("/tmp/config.yml")
@@ -74,7 +76,7 @@ def mock_kb_provider(monkeypatch: pytest.MonkeyPatch) -> AsyncMock:
     mock.delete_file.return_value = True
 
     # Patch the get_kb_provider function
-    async def mock_get_provider(settings: Any) -> AsyncMock:
+    async def mock_get_provider(settings: Any, index: Any = None) -> AsyncMock:
         return mock
 
     monkeypatch.setattr("alleycat_apps.cli.admin_cmd.get_kb_provider", mock_get_provider)
@@ -102,7 +104,6 @@ def test_kb_create(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider
 
     # Check that settings were updated
     assert mock_settings.knowledge_bases == {"test-kb": "vs_test123"}
-    assert mock_settings.kb_files == {"vs_test123": {}}
     assert mock_settings.default_kb == "test-kb"
     mock_settings.save_to_file.assert_called_once()
 
@@ -165,16 +166,16 @@ def test_kb_rm(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: As
 
     # Check that settings were updated
     assert mock_settings.knowledge_bases == {}
-    assert "vs_test123" not in mock_settings.kb_files
+    assert KBIndex(mock_settings.kb_index).count("vs_test123") == 0
     assert mock_settings.default_kb is None
-    mock_settings.save_to_file.assert_called_once()
+    # Once to move the file mappings out of the config file, once to remove the KB
+    assert mock_settings.save_to_file.call_count == 2
 
 
 def test_kb_add_files(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock, tmp_path: Path) -> None:
     """Test the 'kb add' command."""
     # Setup mocks
     mock_settings.knowledge_bases = {"test-kb": "vs_test123"}
-    mock_settings.kb_files = {"vs_test123": {}}
 
     # Create a test file
     test_file = tmp_path / "test.txt"
@@ -197,9 +198,9 @@ def test_kb_add_files(runner: CliRunner, mock_settings: MagicMock, mock_kb_provi
     assert len(args[1]) == 1
     assert str(args[1][0]) == str(test_file)
 
-    # Check settings were updated
-    assert mock_settings.kb_files["vs_test123"] == {"file_test123": "/tmp/test.txt"}
-    mock_settings.save_to_file.assert_called_once()
+    # The file is recorded in the KB index, not the config file
+    assert KBIndex(mock_settings.kb_index).files("vs_test123") == {"file_test123": "/tmp/test.txt"}
+    mock_settings.save_to_file.assert_not_called()
 
 
 def test_kb_delete_file(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock) -> None:
@@ -218,6 +219,180 @@ def test_kb_delete_file(runner: CliRunner, mock_settings: MagicMock, mock_kb_pro
     # KB provider should have been called to delete the file
     mock_kb_provider.delete_file.assert_called_once_with("vs_test123", "file_test123")
 
-    # Check settings were updated
-    assert "file_test123" not in mock_settings.kb_files["vs_test123"]
+    # Check the KB index was updated
+    assert KBIndex(mock_settings.kb_index).files("vs_test123") == {}
+
+
+def test_kb_files_move_from_config_to_index(runner: CliRunner, mock_settings: MagicMock) -> None:
+    """Test that file mappings still in the config file are moved to the KB index."""
+    mock_settings.knowledge_bases = {"test-kb": "vs_test123"}
+    mock_settings.kb_files = {"vs_test123": {"file_a": "/tmp/a.txt", "file_b": "/tmp/b.txt"}}
+
+    result = runner.invoke(app, ["kb", "ls"])
+
+    assert result.exit_code == 0
+    assert "Moved 2 KB file mappings" in result.stdout
+    assert mock_settings.kb_files == {}
     mock_settings.save_to_file.assert_called_once()
+    assert KBIndex(mock_settings.kb_index).files("vs_test123") == {"file_a": "/tmp/a.txt", "file_b": "/tmp/b.txt"}
+
+
+def test_usage(runner: CliRunner, mock_settings: MagicMock, tmp_path: Path) -> None:
+    """Test the 'usage' command aggregates the ledger."""
+    from alleycat_core.usage import UsageLedger, UsageRecord
+
+    mock_settings.usage_db = tmp_path / "usage.db"
+    ledger = UsageLedger(mock_settings.usage_db)
+    ledger.record(UsageRecord(model="gpt-4o-mini", latency_ms=250.0, completion_tokens=20, total_tokens=30))
+    ledger.close()
+
+    result = runner.invoke(app, ["usage", "--by", "model"])
+
+    assert result.exit_code == 0
+    assert "Usage by model:" in result.stdout
+    assert "gpt-4o-mini" in result.stdout
+
+
+def test_parse_batch() -> None:
+    """Test parsing a batch file."""
+    from alleycat_apps.cli.admin_cmd import parse_batch
+
+    operations = parse_batch('# Build the docs KB\nkb create docs\n\nadd docs "My Notes.md" b.txt  # two files\nls\n')
+
+    assert [(op.line, op.command, op.args) for op in operations] == [
+        (2, "create", ["docs"]),
+        (4, "add", ["docs", "My Notes.md", "b.txt"]),
+        (5, "ls", []),
+    ]
+    assert operations[0].kb == "docs"
+    assert operations[2].kb is None
+
+    with pytest.raises(ValueError, match="Line 1: unknown operation 'drop'"):
+        parse_batch("drop docs")
+    with pytest.raises(ValueError, match="Line 2: wrong number of arguments for 'delete'"):
+        parse_batch("ls\ndelete docs")
+
+
+def test_batch(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock, tmp_path: Path) -> None:
+    """Test that 'batch' runs operations with one provider and saves settings once."""
+    provider_calls = 0
+
+    async def counting_get_provider(settings: Any, index: Any = None) -> AsyncMock:
+        nonlocal provider_calls
+        provider_calls += 1
+        return mock_kb_provider
+
+    mock_settings.knowledge_bases = {"old-kb": "vs_old"}
+    test_file = tmp_path / "test.txt"
+    test_file.write_text("This is a test file")
+    batch_file = tmp_path / "ops.txt"
+    batch_file.write_text(f"create test-kb\nadd test-kb {test_file}\nrm old-kb\ndelete missing-kb file_x\nls\n")
+
+    with patch("alleycat_apps.cli.admin_cmd.get_kb_provider", counting_get_provider):
+        result = runner.invoke(app, ["batch", str(batch_file)])
+
+    assert result.exit_code == 1
+    assert "Line 1: Created knowledge base 'test-kb'" in result.stdout
+    assert "Line 2: Added 1 files to knowledge base 'test-kb'" in result.stdout
+    assert "Line 3: Removed knowledge base 'old-kb'" in result.stdout
+    assert "Line 4: Knowledge base 'missing-kb' does not exist" in result.stdout
+    assert "Knowledge Bases:" in result.stdout
+    assert "4 of 5 operations succeeded" in result.stdout
+
+    assert provider_calls == 1
+    mock_kb_provider.close.assert_awaited_once()
+    mock_kb_provider.delete_vector_store.assert_called_once_with("vs_old")
+    assert mock_settings.knowledge_bases == {"test-kb": "vs_test123"}
+    mock_settings.save_to_file.assert_called_once()
+
+
+def test_batch_stdin(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock) -> None:
+    """Test that 'batch' reads operations from stdin."""
+    result = runner.invoke(app, ["batch"], input="kb create test-kb\n")
+
+    assert result.exit_code == 0
+    assert "Line 1: Created knowledge base 'test-kb'" in result.stdout
+    assert "1 of 1 operations succeeded" in result.stdout
+
+
+def test_batch_saves_settings_when_interrupted(
+    runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock, tmp_path: Path
+) -> None:
+    """Test that knowledge bases created before an interrupt are saved."""
+    test_file = tmp_path / "test.txt"
+    test_file.write_text("This is a test file")
+    mock_kb_provider.add_files.side_effect = KeyboardInterrupt
+
+    result = runner.invoke(app, ["batch"], input=f"create test-kb\nadd test-kb {test_file}\n")
+
+    assert result.exit_code == 130
+
+    assert mock_settings.knowledge_bases == {"test-kb": "vs_test123"}
+    mock_settings.save_to_file.assert_called_once()
+
+
+def test_run_batch_orders_operations_per_kb() -> None:
+    """Test that operations on one KB run in order while other KBs run alongside."""
+    import asyncio
+
+    from alleycat_apps.cli.admin_cmd import KBSession, parse_batch, run_batch
+
+    events: list[str] = []
+
+    class RecordingSession(KBSession):
+        async def create(self, name: str) -> str:
+            events.append(f"start create {name}")
+            await asyncio.sleep(0.01)
+            events.append(f"end create {name}")
+            self.settings.knowledge_bases[name] = f"vs_{name}"
+            return f"vs_{name}"
+
+        async def remove(self, name: str) -> None:
+            events.append(f"rm {name}")
+
+    settings = MagicMock(spec=Settings)
+    settings.knowledge_bases = {}
+    session = RecordingSession(settings)
+    operations = parse_batch("create a\nrm a\ncreate b\nrm b")
+
+    results = asyncio.run(run_batch(session, operations, concurrency=2))
+
+    assert results == {
+        1: "Created knowledge base 'a' (vs_a)",
+        2: "Removed knowledge base 'a'",
+        3: "Created knowledge base 'b' (vs_b)",
+        4: "Removed knowledge base 'b'",
+    }
+    # Both creates start before either finishes, and each rm follows its own create
+    assert events[:2] == ["start create a", "start create b"]
+    assert events.index("rm a") > events.index("end create a")
+    assert events.index("rm b") > events.index("end create b")
+
+
+def test_files_gc(runner: CliRunner, mock_settings: MagicMock, mock_kb_provider: AsyncMock) -> None:
+    """Test that 'files gc' reports orphans on a dry run and deletes them otherwise."""
+    mock_kb_provider.list_vector_stores.return_value = [{"id": "vs_test123"}]
+    mock_kb_provider.list_account_files.return_value = [
+        {"id": "file_test123", "filename": "test.txt", "purpose": "assistants", "bytes": 10, "created_at": 1},
+        {"id": "file_orphan", "filename": "lost.pdf", "purpose": "user_data", "bytes": 2048, "created_at": 1},
+        {"id": "file_other", "filename": "app.pdf", "purpose": "assistants", "bytes": 4096, "created_at": 1},
+    ]
+    index = KBIndex(mock_settings.kb_index)
+    index.add_upload("file_orphan", "/tmp/lost.pdf")
+    index.close()
+
+    result = runner.invoke(app, ["files", "gc", "--dry-run"])
+
+    assert result.exit_code == 0
+    assert "Orphaned files:" in result.stdout
+    assert "file_orphan" in result.stdout and "file_other" not in result.stdout
+    assert "Found 1 orphaned files (2.0 KB) among 3 account files: 1 in use" in result.stdout
+    assert "1 not uploaded by alleycat" in result.stdout
+    mock_kb_provider.delete_account_file.assert_not_called()
+
+    mock_kb_provider.delete_account_file.return_value = True
+    result = runner.invoke(app, ["files", "gc", "--force"])
+
+    assert result.exit_code == 0
+    assert "Deleted 1 orphaned files" in result.stdout
+    mock_kb_provider.delete_account_file.assert_called_once_with("file_orphan")
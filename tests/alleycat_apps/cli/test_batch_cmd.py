@@ -0,0 +1,79 @@
+"""Tests for the batch CLI commands.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import json
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from openai import AsyncOpenAI
+from typer.testing import CliRunner
+
+from alleycat_apps.cli import main
+from alleycat_apps.cli.batch_cmd import app
+from alleycat_core.llm.batch import BatchRunner
+
+from ...fixtures.batch_fixtures import BatchStandIn
+
+
+@pytest.fixture
+def batch_env(batch_server: tuple[str, BatchStandIn], monkeypatch: pytest.MonkeyPatch) -> BatchStandIn:
+    """Point the batch commands at the stand-in server and poll without delay."""
+    base_url, state = batch_server
+    monkeypatch.setenv("ALLEYCAT_OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("ALLEYCAT_OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr("alleycat_apps.cli.batch_cmd.BatchRunner", _fast_runner)
+    return state
+
+
+def _fast_runner(client: AsyncOpenAI) -> BatchRunner:
+    """Create a batch runner with a short poll interval."""
+    return BatchRunner(client, poll_interval=0.01)
+
+
+def test_submit_wait_writes_results(batch_env: BatchStandIn, tmp_path: Path) -> None:
+    """Test submitting a batch and writing its results in input order."""
+    input_path = tmp_path / "in.jsonl"
+    input_path.write_text("\n".join(json.dumps({"id": i, "text": f"line {i}"}) for i in range(5)))
+    output_path = tmp_path / "out.jsonl"
+
+    result = CliRunner().invoke(app, ["submit", str(input_path), "--field", "text", "--wait", "-o", str(output_path)])
+
+    assert result.exit_code == 0, result.output
+    assert "batch_1" in result.output
+    entries = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [(entry["id"], entry["result"]) for entry in entries] == [(i, f"LINE {i}") for i in range(5)]
+
+
+def test_status_and_fetch(batch_env: BatchStandIn, tmp_path: Path) -> None:
+    """Test checking on a batch and fetching it later."""
+    input_path = tmp_path / "in.jsonl"
+    input_path.write_text(json.dumps({"id": "x", "text": "hello"}))
+    runner = CliRunner()
+    assert runner.invoke(app, ["submit", str(input_path), "--field", "text"]).exit_code == 0
+
+    status = runner.invoke(app, ["status", "batch_1"])
+    assert status.exit_code == 0
+    assert "in_progress" in status.output
+
+    fetched = runner.invoke(app, ["fetch", "batch_1"])
+    assert fetched.exit_code == 0
+    assert json.loads(fetched.output.strip().splitlines()[-1])["result"] == "HELLO"
+
+
+def test_main_dispatches_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that `alleycat batch ...` runs the batch commands and anything else runs chat."""
+    monkeypatch.setattr(sys, "argv", ["alleycat", "batch", "status", "batch_1"])
+    with mock.patch.object(main, "batch_app") as batch_app, mock.patch.object(main, "app") as chat_app:
+        main.main()
+    batch_app.assert_called_once_with(["status", "batch_1"], prog_name="alleycat batch")
+    chat_app.assert_not_called()
+
+    monkeypatch.setattr(sys, "argv", ["alleycat", "tell", "me", "a", "joke"])
+    with mock.patch.object(main, "batch_app") as batch_app, mock.patch.object(main, "app") as chat_app:
+        main.main()
+    batch_app.assert_not_called()
+    chat_app.assert_called_once()
@@ -223,3 +223,209 @@ def test_yaml_test_cases(cli_runner: CliRunner, evaluator: ResponseEvaluator) ->
                 # if not loop.is_closed():
                 #     loop.run_until_complete(asyncio.sleep(0))
                 time.sleep(1)
+
+
+@pytest.mark.asyncio
+async def test_respond_validated_reasks_on_invalid_output(tmp_path: Path) -> None:
+    """Test that --validate re-asks the model until the output matches the schema."""
+    from alleycat_apps.cli.main import respond_validated
+    from alleycat_core.config.settings import Settings
+    from alleycat_core.llm.types import LLMResponse
+    from alleycat_core.schema import SchemaValidationError
+
+    schema_path = tmp_path / "number.schema.json"
+    schema_path.write_text('{"type": "object", "properties": {"number": {"type": "integer"}}, "required": ["number"]}')
+
+    settings = Settings()
+    settings.schema_file = schema_path
+    settings.validate_retries = 1
+
+    llm = mock.AsyncMock()
+    llm.respond.side_effect = [LLMResponse(output_text='{"number": "x"}'), LLMResponse(output_text='{"number": 42}')]
+
+    response = await respond_validated(llm, "Give me a number", settings)
+    assert response.output_text == '{"number": 42}'
+    assert llm.respond.call_count == 2
+    assert "did not match" in llm.respond.call_args.kwargs["input"]
+
+    # Without retries the first invalid response fails fast
+    settings.validate_retries = 0
+    llm.respond.side_effect = [LLMResponse(output_text="not json")]
+    with pytest.raises(SchemaValidationError, match="not valid JSON"):
+        await respond_validated(llm, "Give me a number", settings)
+
+
+@pytest.mark.asyncio
+async def test_respond_validated_escalates_to_stronger_model(tmp_path: Path) -> None:
+    """Test that invalid output from the routed model is re-asked of the escalation model."""
+    from alleycat_apps.cli.main import create_router, respond_validated
+    from alleycat_core.config.routes import RouteRule
+    from alleycat_core.config.settings import Settings
+    from alleycat_core.llm.types import LLMResponse
+
+    schema_path = tmp_path / "number.schema.json"
+    schema_path.write_text('{"type": "object", "properties": {"number": {"type": "integer"}}, "required": ["number"]}')
+
+    settings = Settings(model="gpt-4o")
+    settings.schema_file = schema_path
+    settings.output_format = "schema"
+    settings.routes = [RouteRule(model="gpt-4o-mini", max_prompt_tokens=100)]
+    settings.escalation_models = ["gpt-4o"]
+
+    llm = mock.AsyncMock(remote_files=[], usage_ledger=None)
+    llm.respond.side_effect = [LLMResponse(output_text='{"number": "x"}'), LLMResponse(output_text='{"number": 42}')]
+
+    response = await respond_validated(llm, "Give me a number", settings, router=create_router(llm, settings))
+    assert response.output_text == '{"number": 42}'
+    assert [call.kwargs["model"] for call in llm.respond.call_args_list] == ["gpt-4o-mini", "gpt-4o"]
+    assert llm.respond.call_args.kwargs["input"] == "Give me a number"
+
+
+@pytest.mark.asyncio
+async def test_run_chat_resumes_named_session(tmp_path: Path) -> None:
+    """Test that --resume continues a session from its stored response ID."""
+    from alleycat_apps.cli.main import run_chat
+    from alleycat_core.config.settings import Settings
+    from alleycat_core.history import SessionLog
+
+    settings = Settings()
+    settings.history_file = tmp_path / "history.db"
+    settings.record_usage = False
+
+    responses = [
+        mock.MagicMock(output_text="first", id="resp_1", usage=None, refusal=None),
+        mock.MagicMock(output_text="second", id="resp_2", usage=None, refusal=None),
+    ]
+    with mock.patch("alleycat_core.llm.openai.AsyncOpenAI") as client_cls:
+        client_cls.return_value.responses.create = mock.AsyncMock(side_effect=responses)
+        client_cls.return_value.close = mock.AsyncMock()
+        await run_chat("hello", settings, session="work")
+        await run_chat("and again", settings, session="work")
+        calls = client_cls.return_value.responses.create.call_args_list
+
+    assert "previous_response_id" not in calls[0].kwargs
+    assert calls[1].kwargs["previous_response_id"] == "resp_1"
+    session = SessionLog(tmp_path / "history.db").get_session("work")
+    assert session is not None and session.last_response_id == "resp_2" and session.turns == 2
+
+
+@pytest.mark.asyncio
+async def test_ctrl_c_cancels_stream_and_keeps_partial_answer() -> None:
+    """Test that SIGINT during streaming cancels the stream but not the caller."""
+    import asyncio
+    import os
+    import signal
+
+    from alleycat_apps.cli.main import run_interruptible, stream_response
+
+    closed = asyncio.Event()
+
+    async def endless_stream() -> Any:
+        try:
+            yield mock.MagicMock(type="response.output_text.delta", delta="partial")
+            await asyncio.Event().wait()
+        finally:
+            closed.set()
+
+    previous_handler = signal.getsignal(signal.SIGINT)
+    asyncio.get_running_loop().call_later(0.05, os.kill, os.getpid(), signal.SIGINT)
+    result = await asyncio.wait_for(run_interruptible(stream_response(endless_stream(), "text")), timeout=5)
+
+    assert result == ("partial", False)
+    assert closed.is_set()
+    # The previous handler is back, so Ctrl-C at the prompt still exits the chat
+    assert signal.getsignal(signal.SIGINT) == previous_handler
+
+
+def test_expand_file_patterns(tmp_path: Path) -> None:
+    """Test that --file globs expand to sorted matches and plain paths pass through."""
+    from alleycat_apps.cli.main import expand_file_patterns
+
+    for name in ("b.md", "a.md", "notes.txt"):
+        (tmp_path / name).write_text(name)
+
+    assert expand_file_patterns([str(tmp_path / "notes.txt"), str(tmp_path / "*.md")]) == [
+        str(tmp_path / "notes.txt"),
+        str(tmp_path / "a.md"),
+        str(tmp_path / "b.md"),
+    ]
+    with pytest.raises(FileNotFoundError):
+        expand_file_patterns([str(tmp_path / "*.pdf")])
+
+
+@pytest.mark.asyncio
+async def test_run_chat_answers_each_directory_pack(tmp_path: Path) -> None:
+    """Test that a directory larger than the context budget is answered part by part."""
+    from alleycat_apps.cli.main import run_chat
+    from alleycat_core.config.settings import Settings
+
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(name * 60)
+    settings = Settings()
+    settings.record_usage = False
+    settings.dir_path = tmp_path
+    settings.context_budget = 100
+
+    with mock.patch("alleycat_core.llm.openai.AsyncOpenAI") as client_cls:
+        client_cls.return_value.responses.create = mock.AsyncMock(
+            return_value=mock.MagicMock(output_text="summary", id="resp", usage=None, refusal=None)
+        )
+        client_cls.return_value.close = mock.AsyncMock()
+        await run_chat("Summarise", settings)
+        calls = client_cls.return_value.responses.create.call_args_list
+
+    assert len(calls) == 3
+    assert all("previous_response_id" not in call.kwargs for call in calls)
+    assert [call.kwargs["input"][0]["content"][0]["text"][:12] for call in calls] == [
+        "File: a.txt\n",
+        "File: b.txt\n",
+        "File: c.txt\n",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_comparison_writes_each_answer(tmp_path: Path) -> None:
+    """Test that --models sends the prompt to every model and writes each answer to its own file."""
+    from alleycat_apps.cli.main import run_comparison
+    from alleycat_core.config.settings import Settings
+
+    async def answer(model: str) -> Any:
+        yield mock.MagicMock(type="response.output_text.delta", delta=f"{model} answer")
+        yield mock.MagicMock(type="response.completed", response=mock.MagicMock(id="resp", usage=None))
+
+    settings = Settings()
+    settings.record_usage = False
+    settings.stream = True
+
+    with mock.patch("alleycat_core.llm.openai.AsyncOpenAI") as client_cls:
+        client_cls.return_value.responses.create = mock.AsyncMock(side_effect=lambda **kwargs: answer(kwargs["model"]))
+        client_cls.return_value.close = mock.AsyncMock()
+        runs = await run_comparison("Hello", settings, ["gpt-4o-mini", "org/model"], output_dir=tmp_path)
+
+    assert [run.text for run in runs] == ["gpt-4o-mini answer", "org/model answer"]
+    assert (tmp_path / "gpt-4o-mini.txt").read_text() == "gpt-4o-mini answer"
+    assert (tmp_path / "org_model.txt").read_text() == "org/model answer"
+
+
+@pytest.mark.asyncio
+async def test_piped_stream_is_written_raw() -> None:
+    """Test that a stream is rendered on a terminal and written as raw text when piped."""
+    import io
+
+    from rich.console import Console
+
+    from alleycat_apps.cli.main import stream_sinks
+    from alleycat_core.llm.sinks import StdoutSink, StreamPipeline, TerminalSink
+
+    async def stream() -> Any:
+        for delta in ("**Hello**", " there"):
+            yield mock.MagicMock(type="response.output_text.delta", delta=delta)
+
+    terminal = Console(file=io.StringIO(), force_terminal=True)
+    assert isinstance(stream_sinks("markdown", terminal)[0], TerminalSink)
+
+    output = io.StringIO()
+    sinks = stream_sinks("markdown", Console(file=output))
+    assert isinstance(sinks[0], StdoutSink)
+    assert await StreamPipeline(sinks).run(stream()) == "**Hello** there"
+    assert output.getvalue() == "**Hello** there\n"
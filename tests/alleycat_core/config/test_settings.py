@@ -47,7 +47,7 @@ def test_default_settings(clean_env: None) -> None:
 
     # Get the expected path based on platformdirs
     expected_data_dir = platformdirs.user_data_dir("alleycat")
-    assert settings.history_file == Path(expected_data_dir) / "history.json"
+    assert settings.history_file == Path(expected_data_dir) / "history.db"
 
 
 def test_environment_override(monkeypatch: "MonkeyPatch", clean_env: None) -> None:
@@ -107,6 +107,7 @@ def test_provider_validation() -> None:
 
     # Valid provider should not raise
     Settings(provider="openai")
+    Settings(provider="llama.cpp")
 
 
 def test_custom_history_file() -> None:
@@ -114,3 +115,66 @@ def test_custom_history_file() -> None:
     custom_path = Path("/tmp/test_history.json")
     settings = Settings(history_file=custom_path)
     assert settings.history_file == custom_path
+
+
+def test_merge_changes() -> None:
+    """Test that only the changed entries of nested dictionaries are merged."""
+    from alleycat_core.config.settings import merge_changes
+
+    current = {"model": "gpt-4o", "knowledge_bases": {"a": "vs_a", "b": "vs_b"}, "default_kb": "a"}
+    before = {"model": "gpt-4o-mini", "knowledge_bases": {"a": "vs_a"}, "default_kb": "a"}
+    after = {"model": "gpt-4o-mini", "knowledge_bases": {"a": "vs_a", "c": "vs_c"}}
+
+    assert merge_changes(current, before, after) == {
+        "model": "gpt-4o",
+        "knowledge_bases": {"a": "vs_a", "b": "vs_b", "c": "vs_c"},
+    }
+
+
+def test_concurrent_saves_keep_each_others_changes(tmp_path: Path) -> None:
+    """Test that processes saving the same config file do not lose each other's changes."""
+    config_file = tmp_path / "config.yml"
+    first = Settings(config_file=config_file)
+    second = Settings(config_file=config_file)
+
+    first.knowledge_bases["docs"] = "vs_docs"
+    first.save_to_file()
+    second.knowledge_bases["notes"] = "vs_notes"
+    second.default_kb = "notes"
+    second.save_to_file()
+
+    reloaded = Settings(config_file=config_file)
+    assert reloaded.knowledge_bases == {"docs": "vs_docs", "notes": "vs_notes"}
+    assert reloaded.default_kb == "notes"
+    assert not list(tmp_path.glob(".config.*.tmp"))
+
+
+def _add_knowledge_base(config_file: Path, index: int) -> None:
+    """Add a knowledge base to a config file from another process."""
+    settings = Settings(config_file=config_file)
+    settings.knowledge_bases[f"kb{index}"] = f"vs_{index}"
+    settings.save_to_file()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs fork and advisory file locks")
+def test_parallel_processes_save_safely(tmp_path: Path) -> None:
+    """Test that many processes saving at once all land in the config file."""
+    import multiprocessing
+
+    config_file = tmp_path / "config.yml"
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        pool.starmap(_add_knowledge_base, [(config_file, index) for index in range(8)])
+
+    assert Settings(config_file=config_file).knowledge_bases == {f"kb{index}": f"vs_{index}" for index in range(8)}
+
+
+def test_settings_do_not_import_the_llm_clients() -> None:
+    """Test that loading the settings, as every command does, leaves the LLM packages unloaded."""
+    import subprocess
+    import sys
+
+    code = "import sys, alleycat_core.config.settings; print(sorted({'openai', 'jsonschema'} & set(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+
+    assert result.stdout.strip() == "[]"
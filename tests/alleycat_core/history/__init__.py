@@ -0,0 +1,6 @@
+"""Tests for the history module.
+
+This module contains tests for the session log.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
@@ -0,0 +1,66 @@
+"""Tests for the chat session log.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from pathlib import Path
+
+from alleycat_core.history import SessionLog, Turn
+from alleycat_core.llm.types import ResponseUsage
+
+
+def test_record_and_resume(tmp_path: Path) -> None:
+    """Test that turns are stored and the session resumes from the last response ID."""
+    log = SessionLog(tmp_path / "history.db")
+    log.record(
+        "work",
+        "hello",
+        "hi there",
+        model="gpt-4o-mini",
+        response_id="resp_1",
+        usage=ResponseUsage(total_tokens=12, prompt_tokens=8, completion_tokens=4),
+    )
+    log.record("work", "and again", "hello again", model="gpt-4o-mini", response_id="resp_2")
+    log.close()
+
+    reopened = SessionLog(tmp_path / "history.db")
+    session = reopened.get_session("work")
+    assert session is not None
+    assert session.last_response_id == "resp_2"
+    assert session.turns == 2
+    turns = reopened.turns("work")
+    assert [turn.prompt for turn in turns] == ["hello", "and again"]
+    assert turns[0].total_tokens == 12
+    assert reopened.get_session("other") is None
+
+
+def test_turn_without_response_id_keeps_last(tmp_path: Path) -> None:
+    """Test that a turn without a response ID does not lose the resume point."""
+    log = SessionLog(tmp_path / "history.db")
+    log.append("s", Turn(prompt="a", response="b", response_id="resp_1"))
+    log.append("s", Turn(prompt="c", response="", response_id=None))
+
+    session = log.get_session("s")
+    assert session is not None and session.last_response_id == "resp_1"
+
+
+def test_history_pruned_to_max_history(tmp_path: Path) -> None:
+    """Test that old turns are pruned beyond max_history messages."""
+    log = SessionLog(tmp_path / "history.db", max_history=6)
+    for i in range(10):
+        log.record("s", f"prompt {i}", f"response {i}", response_id=f"resp_{i}")
+    log.record("other", "x", "y")
+
+    assert [turn.prompt for turn in log.turns("s")] == ["prompt 7", "prompt 8", "prompt 9"]
+    assert [turn.prompt for turn in log.turns("s", limit=1)] == ["prompt 9"]
+    assert [session.name for session in log.sessions()] == ["other", "s"]
+
+
+def test_delete(tmp_path: Path) -> None:
+    """Test that deleting a session removes its turns."""
+    log = SessionLog(tmp_path / "history.db")
+    log.record("s", "a", "b")
+
+    assert log.delete("s")
+    assert not log.delete("s")
+    assert log.turns("s") == []
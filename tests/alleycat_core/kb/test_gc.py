@@ -0,0 +1,92 @@
+"""Tests for garbage collection of orphaned account files.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+from alleycat_core.kb.gc import delete_orphans, find_orphans
+from alleycat_core.kb.index import KBFile, KBIndex
+
+NOW = 1_700_000_000.0
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def provider() -> AsyncMock:
+    """Mock a KB provider with two vector stores and some account files."""
+    mock = AsyncMock()
+    mock.list_vector_stores.return_value = [{"id": "vs_1"}, {"id": "vs_2"}]
+    store_files = {"vs_1": [{"id": "file_attached"}], "vs_2": []}
+    mock.list_files.side_effect = lambda vs_id: store_files[vs_id]
+    mock.list_account_files.return_value = [
+        {"id": "file_attached", "purpose": "assistants", "bytes": 10, "created_at": NOW - 2 * DAY},
+        {"id": "file_indexed", "purpose": "assistants", "bytes": 20, "created_at": NOW - 2 * DAY},
+        {"id": "file_orphan", "purpose": "assistants", "bytes": 300, "created_at": NOW - 2 * DAY},
+        {"id": "file_chat", "purpose": "user_data", "bytes": 400, "created_at": NOW - 3 * DAY},
+        {"id": "file_recent", "purpose": "user_data", "bytes": 50, "created_at": NOW - 60},
+        {"id": "file_batch", "purpose": "batch", "bytes": 60, "created_at": NOW - 5 * DAY},
+        {"id": "file_foreign", "purpose": "assistants", "bytes": 70, "created_at": NOW - 5 * DAY},
+    ]
+    mock.delete_account_file.side_effect = lambda file_id: file_id != "file_chat"
+    return mock
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> Iterator[KBIndex]:
+    """Create a KB index recording alleycat's uploads, all the files but file_foreign."""
+    index = KBIndex(tmp_path / "kb.db")
+    for file_id in ("file_attached", "file_indexed", "file_orphan", "file_chat", "file_recent", "file_batch"):
+        index.add_upload(file_id, f"/tmp/{file_id}")
+    yield index
+    index.close()
+
+
+async def test_find_orphans(provider: AsyncMock, index: KBIndex) -> None:
+    """Test that only old files alleycat uploaded, of its purposes, that nothing uses are orphans."""
+    index.add(KBFile(vector_store_id="vs_gone", file_id="file_indexed", path="/tmp/a.md"))
+
+    report = await find_orphans(provider, index, now=NOW)
+
+    assert [file["id"] for file in report.orphans] == ["file_orphan", "file_chat"]
+    assert report.orphan_bytes == 700
+    assert (report.scanned, report.in_use, report.skipped, report.foreign) == (7, 2, 2, 1)
+    assert provider.list_files.await_count == 2
+
+
+async def test_find_orphans_options(provider: AsyncMock, index: KBIndex) -> None:
+    """Test choosing purposes and the minimum age."""
+    report = await find_orphans(provider, index, purposes=frozenset({"batch", "user_data"}), min_age=0, now=NOW)
+
+    assert [file["id"] for file in report.orphans] == ["file_chat", "file_recent", "file_batch"]
+
+
+async def test_files_alleycat_did_not_upload_are_never_orphans(provider: AsyncMock) -> None:
+    """Test that without a record of alleycat's uploads nothing is collected."""
+    report = await find_orphans(provider, min_age=0, now=NOW)
+
+    assert report.orphans == []
+    assert report.foreign == 5
+
+
+async def test_find_orphans_fails_when_a_store_cannot_be_listed(provider: AsyncMock) -> None:
+    """Test that a failed listing is raised rather than making every file look orphaned."""
+    provider.list_files.side_effect = RuntimeError("rate limited")
+
+    with pytest.raises(RuntimeError, match="rate limited"):
+        await find_orphans(provider, now=NOW)
+
+
+async def test_delete_orphans(provider: AsyncMock, index: KBIndex) -> None:
+    """Test that orphans are deleted and failures recorded."""
+    report = await find_orphans(provider, index, now=NOW)
+
+    await delete_orphans(provider, report, concurrency=1)
+
+    assert report.deleted == ["file_indexed", "file_orphan"]
+    assert report.failed == ["file_chat"]
+    assert provider.delete_account_file.await_count == 3
@@ -0,0 +1,64 @@
+"""Tests for the KB file index.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from pathlib import Path
+
+from alleycat_core.kb.index import UNKNOWN_PATH, KBFile, KBIndex, file_hash
+
+
+def test_lookups_by_id_path_and_hash(tmp_path: Path) -> None:
+    """Test that files can be found by file ID, path and content hash."""
+    source = tmp_path / "notes.md"
+    source.write_text("notes")
+    digest = file_hash(source)
+    index = KBIndex(tmp_path / "kb.db")
+    index.add(
+        KBFile(vector_store_id="vs_1", file_id="file_a", path=str(source), hash=digest),
+        KBFile(vector_store_id="vs_2", file_id="file_b", path=str(source), hash=digest),
+        KBFile(vector_store_id="vs_2", file_id="file_c", path="/tmp/other.md"),
+    )
+
+    assert index.files("vs_2") == {"file_b": str(source), "file_c": "/tmp/other.md"}
+    assert index.count("vs_1") == 1
+    assert [file.vector_store_id for file in index.get("file_a")] == ["vs_1"]
+    assert {file.file_id for file in index.find_by_path(source)} == {"file_a", "file_b"}
+    assert [file.file_id for file in index.find_by_hash(digest, "vs_2")] == ["file_b"]
+    assert index.file_ids() == {"file_a", "file_b", "file_c"}
+    index.close()
+
+
+def test_remove_files_and_stores(tmp_path: Path) -> None:
+    """Test removing one file and a whole knowledge base."""
+    index = KBIndex(tmp_path / "kb.db")
+    index.add(*(KBFile(vector_store_id="vs_1", file_id=f"file_{n}", path=f"/tmp/{n}.md") for n in range(3)))
+
+    assert index.remove("vs_1", "file_0")
+    assert not index.remove("vs_1", "file_0")
+    assert index.remove_store("vs_1") == 2
+    assert index.count("vs_1") == 0
+
+
+def test_uploads(tmp_path: Path) -> None:
+    """Test recording uploaded files until they are deleted."""
+    index = KBIndex(tmp_path / "kb.db")
+    index.add_upload("file_a", "/tmp/a.pdf")
+    index.add_upload("file_b", Path("/tmp/b.pdf"))
+
+    index.remove_upload("file_a")
+    index.remove_upload("file_missing")
+    assert index.upload_ids() == {"file_b"}
+
+
+def test_import_mapping_and_add_missing(tmp_path: Path) -> None:
+    """Test importing the config.yml mapping and recording files added outside alleycat."""
+    index = KBIndex(tmp_path / "kb.db")
+    index.add(KBFile(vector_store_id="vs_1", file_id="file_a", path="/tmp/a.md", hash="abc"))
+
+    # Files already in the index keep their records
+    assert index.import_mapping({"vs_1": {"file_a": "/old/a.md", "file_b": "/tmp/b.md"}}) == 1
+    assert index.get("file_a")[0].hash == "abc"
+
+    assert index.add_missing("vs_1", ["file_a", "file_b", "file_c"]) == 1
+    assert index.files("vs_1")["file_c"] == UNKNOWN_PATH
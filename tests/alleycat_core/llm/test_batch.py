@@ -0,0 +1,124 @@
+"""Tests for Batch API execution against a local stand-in server.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import json
+from typing import Any
+
+import pytest
+from openai import AsyncOpenAI
+
+from alleycat_core.llm.batch import BatchRunner, ResultBuffer, batch_requests, parse_custom_id
+
+from ...fixtures.batch_fixtures import BatchStandIn
+
+RECORDS = [
+    {"id": "a", "text": "first"},
+    {"id": 2, "text": "second"},
+    {"id": "c", "text": "please fail"},
+    {"text": "no id"},
+]
+
+
+def make_runner(batch_server: tuple[str, BatchStandIn]) -> BatchRunner:
+    """Create a runner that polls the stand-in server without delay."""
+    base_url, _ = batch_server
+    return BatchRunner(AsyncOpenAI(api_key="test-key", base_url=base_url), poll_interval=0.01)
+
+
+def test_batch_requests() -> None:
+    """Test conversion of records to Batch API requests."""
+    lines = [json.dumps(record) for record in RECORDS] + ["{broken"]
+    schema_format: dict[str, Any] = {"type": "json_schema", "name": "upper", "schema": {}, "strict": True}
+
+    requests = list(batch_requests(lines, model="gpt-test", field="text", text_format=schema_format))
+
+    assert len(requests) == 4
+    assert requests[0]["url"] == "/v1/responses"
+    body = requests[0]["body"]
+    assert body.pop("prompt_cache_key").startswith("alleycat-")
+    assert body == {"model": "gpt-test", "input": "first", "text": {"format": schema_format}}
+    # Requests share their prefix, so they share a prompt cache key
+    assert len({request["body"].get("prompt_cache_key") for request in requests[1:]}) == 1
+    assert [parse_custom_id(request["custom_id"]) for request in requests] == [(0, "a"), (1, 2), (2, "c"), (3, 4)]
+
+
+@pytest.mark.asyncio
+async def test_submit_wait_and_fetch_in_order(batch_server: tuple[str, BatchStandIn]) -> None:
+    """Test a batch round trip returns results in input order with their record IDs."""
+    lines = [json.dumps(record) for record in RECORDS]
+
+    async with make_runner(batch_server) as runner:
+        batch = await runner.submit(batch_requests(lines, model="gpt-test", field="text"))
+        assert batch.status == "in_progress"
+
+        finished = await runner.wait(batch.id)
+        assert finished.status == "completed"
+
+        results = [entry async for entry in runner.results(finished)]
+        assert [entry["id"] for entry in results] == ["a", 2, "c", 4]
+    # Leaving the block closes the client
+    assert runner.client.is_closed()
+    assert results[0] == {
+        "id": "a",
+        "result": "FIRST",
+        "usage": {"total_tokens": 5, "prompt_tokens": 3, "completion_tokens": 2, "cached_tokens": 0},
+        "error": None,
+    }
+    assert results[2]["error"] == "Bad request"
+
+
+@pytest.mark.asyncio
+async def test_json_results_parsed(batch_server: tuple[str, BatchStandIn]) -> None:
+    """Test that schema batches have their results parsed as JSON."""
+    runner = make_runner(batch_server)
+    text_format: dict[str, Any] = {"type": "json_schema", "name": "upper", "schema": {}, "strict": True}
+    requests = batch_requests([json.dumps(RECORDS[0])], model="gpt-test", field="text", text_format=text_format)
+
+    batch = await runner.wait((await runner.submit(requests, parse_json=True)).id)
+    results = [entry async for entry in runner.results(batch)]
+
+    assert results[0]["result"] == {"upper": "FIRST"}
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out(batch_server: tuple[str, BatchStandIn]) -> None:
+    """Test that waiting gives up after the timeout."""
+    _, state = batch_server
+    state.polls_until_done = 100
+    runner = make_runner(batch_server)
+    batch = await runner.submit(batch_requests([json.dumps(RECORDS[0])], model="gpt-test"))
+
+    with pytest.raises(TimeoutError):
+        await runner.wait(batch.id, timeout=0.05)
+
+
+def test_result_buffer_moves_results_to_disk() -> None:
+    """Test that results past the memory limit wait on disk and come back in order."""
+    buffer = ResultBuffer(limit=2)
+    for index in [5, 3, 4, 1, 2]:
+        buffer.put(index, {"id": index})
+
+    assert buffer._disk is not None
+    assert buffer.pop(1) == {"id": 1}
+    assert buffer.pop(1) is None
+    buffer.put(7, {"id": 7})
+    assert [entry["id"] for entry in buffer.drain()] == [2, 3, 4, 5, 7]
+    assert buffer._disk is None
+
+
+@pytest.mark.asyncio
+async def test_results_in_order_with_a_small_buffer(batch_server: tuple[str, BatchStandIn]) -> None:
+    """Test that an early failure keeps later results in order when they wait on disk."""
+    base_url, _ = batch_server
+    runner = BatchRunner(AsyncOpenAI(api_key="test-key", base_url=base_url), poll_interval=0.01, max_buffered=1)
+    records = [{"id": "x", "text": "please fail"}] + [{"id": n, "text": f"record {n}"} for n in range(1, 6)]
+
+    batch = await runner.wait(
+        (await runner.submit(batch_requests(map(json.dumps, records), model="gpt-test", field="text"))).id
+    )
+    results = [entry async for entry in runner.results(batch)]
+
+    assert [entry["id"] for entry in results] == ["x", 1, 2, 3, 4, 5]
+    assert results[0]["error"] == "Bad request"
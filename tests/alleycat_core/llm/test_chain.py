@@ -0,0 +1,148 @@
+"""Tests for pipelined schema chains.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from alleycat_core.llm import SchemaChain, StageCache
+from alleycat_core.llm.openai import OpenAIConfig, OpenAIProvider
+from alleycat_core.llm.types import LLMResponse, ResponseUsage
+from alleycat_core.schema import Schema
+
+ENTITIES = Schema(
+    name="entities",
+    schema={"type": "object", "properties": {"entities": {"type": "array"}}, "required": ["entities"]},
+)
+SUMMARY = Schema(
+    name="summary",
+    schema={"type": "object", "properties": {"summary": {"type": "string"}}, "required": ["summary"]},
+)
+
+
+class FakeProvider:
+    """Provider that answers each stage from its schema name, tracking concurrency."""
+
+    def __init__(self, delay: float = 0.01) -> None:
+        """Initialize the fake provider."""
+        self.delay = delay
+        self.calls: list[dict[str, Any]] = []
+        self.in_flight: set[str] = set()
+        self.overlapped = False
+
+    async def respond(self, **kwargs: Any) -> LLMResponse:
+        """Answer a stage request."""
+        self.calls.append(kwargs)
+        stage = kwargs["text"]["name"]
+        self.in_flight.add(stage)
+        if len(self.in_flight) > 1:
+            self.overlapped = True
+        await asyncio.sleep(self.delay)
+        self.in_flight.discard(stage)
+
+        first_line = kwargs["input"].splitlines()[0]
+        output = {"entities": [first_line]} if stage == "entities" else {"summary": f"about {first_line}"}
+        return LLMResponse(
+            output_text=json.dumps(output),
+            usage=ResponseUsage(total_tokens=10, prompt_tokens=7, completion_tokens=3),
+        )
+
+
+@pytest.mark.asyncio
+async def test_run_feeds_stage_output_forward() -> None:
+    """Test that each stage receives the original input and the previous stage's output."""
+    provider = FakeProvider()
+    chain = SchemaChain(provider, [ENTITIES, SUMMARY], instructions="be brief")  # type: ignore[arg-type]
+
+    result = await chain.run("Ada Lovelace")
+
+    assert result.error is None
+    assert result.result == {"summary": "about Ada Lovelace"}
+    assert result.usage is not None and result.usage.total_tokens == 20
+    second_input = provider.calls[1]["input"]
+    assert second_input.startswith("Ada Lovelace")
+    assert '{"entities": ["Ada Lovelace"]}' in second_input
+    assert all(call["stateless"] and call["instructions"] == "be brief" for call in provider.calls)
+
+
+@pytest.mark.asyncio
+async def test_run_many_overlaps_stages() -> None:
+    """Test that records are pipelined through the stages and all complete."""
+    provider = FakeProvider()
+    chain = SchemaChain(provider, [ENTITIES, SUMMARY], concurrency=2)  # type: ignore[arg-type]
+
+    results = [result async for result in chain.run_many(f"record {i}" for i in range(10))]
+
+    assert sorted(result.index for result in results) == list(range(10))
+    assert all(result.result == {"summary": f"about record {result.index}"} for result in results)
+    assert provider.overlapped
+    assert len(provider.calls) == 20
+
+
+@pytest.mark.asyncio
+async def test_run_many_raises_input_error() -> None:
+    """Test that an error reading the inputs is raised after the records before it, not hung on."""
+    chain = SchemaChain(FakeProvider(), [ENTITIES, SUMMARY], concurrency=2)  # type: ignore[arg-type]
+
+    def prompts() -> Any:
+        yield "record 0"
+        raise ValueError("bad input")
+
+    results = []
+    with pytest.raises(ValueError, match="bad input"):
+        async with asyncio.timeout(3):
+            async for result in chain.run_many(prompts()):
+                results.append(result)
+
+    assert [result.index for result in results] == [0]
+
+
+@pytest.mark.asyncio
+async def test_stage_cache_skips_completed_stages(tmp_path: Path) -> None:
+    """Test that cached stage outputs are reused by a later run."""
+    chain = SchemaChain(FakeProvider(), [ENTITIES, SUMMARY], cache=StageCache(tmp_path))  # type: ignore[arg-type]
+    await chain.run("Grace Hopper")
+
+    provider = FakeProvider()
+    rerun = SchemaChain(provider, [ENTITIES, SUMMARY], cache=StageCache(tmp_path))  # type: ignore[arg-type]
+    result = await rerun.run("Grace Hopper")
+
+    assert result.result == {"summary": "about Grace Hopper"}
+    assert result.cached_stages == 2
+    assert provider.calls == []
+
+
+@pytest.mark.asyncio
+async def test_stage_failure_reported() -> None:
+    """Test that invalid stage output stops the record and reports the stage."""
+    provider = FakeProvider()
+    strict_summary = Schema(name="summary", schema={**SUMMARY.json_schema_data, "additionalProperties": False})
+    strict_summary.json_schema_data["properties"] = {"title": {"type": "string"}}
+    chain = SchemaChain(provider, [ENTITIES, strict_summary], validate=True)  # type: ignore[arg-type]
+
+    result = await chain.run("Alan Turing")
+
+    assert result.result is None
+    assert result.error is not None and result.error.startswith("Stage 2 (summary) failed")
+
+
+@pytest.mark.asyncio
+async def test_stateless_request_keeps_conversation() -> None:
+    """Test that stateless requests neither send nor replace the previous response ID."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.previous_response_id = "resp_conversation"
+    mock_response = mock.MagicMock(output_text="{}", id="resp_stage", usage=None, refusal=None)
+    provider.client = mock.AsyncMock()
+    provider.client.responses.create.return_value = mock_response
+
+    await provider.respond(input="stage input", stateless=True)
+
+    assert "previous_response_id" not in provider.client.responses.create.call_args.kwargs
+    assert "stateless" not in provider.client.responses.create.call_args.kwargs
+    assert provider.previous_response_id == "resp_conversation"
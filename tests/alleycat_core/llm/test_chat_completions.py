@@ -0,0 +1,135 @@
+"""Tests for the Chat Completions fallback used by local backends.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest import mock
+
+import pytest
+from openai.types import CompletionUsage
+
+from alleycat_core.llm.chat_completions import ChatCompletionsFallback, chat_messages, chat_response_format
+from alleycat_core.llm.openai import OpenAIConfig, OpenAIProvider
+from alleycat_core.llm.profiles import Capability, get_profile
+from alleycat_core.llm.remote_file import TextFile, create_remote_file
+from alleycat_core.llm.types import LLMResponse
+
+
+def completion(id: str, content: str) -> mock.Mock:
+    """Mock a Chat Completions response."""
+    return mock.Mock(
+        id=id,
+        choices=[mock.Mock(message=mock.Mock(content=content))],
+        usage=CompletionUsage(prompt_tokens=5, completion_tokens=2, total_tokens=7),
+    )
+
+
+def chunk(content: str | None, usage: Any = None) -> mock.Mock:
+    """Mock a Chat Completions stream chunk."""
+    choices = [mock.Mock(delta=mock.Mock(content=content))] if content is not None else []
+    return mock.Mock(id="chatcmpl-s", choices=choices, usage=usage)
+
+
+def test_profiles() -> None:
+    """Test the capability matrix of the built-in profiles."""
+    assert all(get_profile("openai").supports(capability) for capability in Capability)
+    local = get_profile("llama.cpp")
+    assert local.base_url == "http://localhost:8080/v1"
+    assert not local.requires_api_key
+    assert not local.supports(Capability.RESPONSES)
+    with pytest.raises(ValueError, match="Unknown provider"):
+        get_profile("nope")
+
+
+def test_request_conversion() -> None:
+    """Test that Responses requests become chat messages and response formats."""
+    params = {
+        "instructions": "Be brief",
+        "input": [
+            {"role": "user", "type": "message", "content": [{"type": "input_text", "text": "File: a.txt\n\nhi"}]},
+            {"role": "developer", "content": "Use English"},
+            {"role": "user", "content": "Hello"},
+        ],
+    }
+    assert chat_messages(params) == [
+        {"role": "system", "content": "Be brief"},
+        {"role": "user", "content": "File: a.txt\n\nhi"},
+        {"role": "system", "content": "Use English"},
+        {"role": "user", "content": "Hello"},
+    ]
+
+    schema = {"type": "json_schema", "name": "person", "schema": {"type": "object"}, "strict": True}
+    assert chat_response_format({"format": schema}) == {
+        "type": "json_schema",
+        "json_schema": {"name": "person", "schema": {"type": "object"}, "strict": True},
+    }
+    assert chat_response_format({"format": {"format": "json"}}) == {"type": "json_object"}
+    assert chat_response_format(None) is None
+
+
+def test_files_are_read_as_text_without_uploads(tmp_path: Any) -> None:
+    """Test that backends without file uploads get every file as text."""
+    path = tmp_path / "data.json"
+    path.write_text("{}")
+    assert isinstance(create_remote_file(str(path), mock.Mock(), upload=False), TextFile)
+
+
+@pytest.mark.asyncio
+async def test_fallback_keeps_the_conversation_locally() -> None:
+    """Test that a local backend is sent the earlier turns and no unsupported tools."""
+    provider = OpenAIProvider(OpenAIConfig(profile="llama.cpp", model="qwen"))
+    assert str(provider.client.base_url).startswith("http://localhost:8080/v1")
+
+    create = mock.AsyncMock(side_effect=[completion("chatcmpl-1", "Hi there"), completion("chatcmpl-2", "Fine")])
+    responses = mock.AsyncMock()
+    with (
+        mock.patch.object(provider.client.chat.completions, "create", create),
+        mock.patch.object(provider.client.responses, "create", responses),
+    ):
+        first = await provider.respond("Hello", web_search=True, vector_store_id="vs_1")
+        second = await provider.respond("How are you?")
+
+    assert isinstance(first, LLMResponse) and first.output_text == "Hi there"
+    assert isinstance(second, LLMResponse) and second.usage is not None and second.usage.prompt_tokens == 5
+    responses.assert_not_called()
+
+    first_call, second_call = (call.kwargs for call in create.call_args_list)
+    assert "tools" not in first_call and "prompt_cache_key" not in first_call
+    assert first_call["messages"] == [{"role": "user", "content": "Hello"}]
+    assert second_call["messages"] == [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi there"},
+        {"role": "user", "content": "How are you?"},
+    ]
+    assert provider.previous_response_id == "chatcmpl-2"
+
+
+@pytest.mark.asyncio
+async def test_fallback_streams_responses_events() -> None:
+    """Test that streamed chunks become text delta and completed events."""
+    usage = CompletionUsage(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+
+    async def chunks() -> AsyncIterator[mock.Mock]:
+        for item in (chunk("Hel"), chunk("lo"), chunk(None, usage)):
+            yield item
+
+    stream = mock.Mock(close=mock.AsyncMock())
+    stream.__aiter__ = lambda self: chunks()
+    client = mock.Mock()
+    client.chat.completions.create = mock.AsyncMock(return_value=stream)
+
+    fallback = ChatCompletionsFallback(client)
+    events = [event async for event in await fallback.stream({"model": "m", "input": "Hi"})]
+
+    assert [event.type for event in events] == [
+        "response.output_text.delta",
+        "response.output_text.delta",
+        "response.completed",
+    ]
+    completed = events[-1].response  # type: ignore[union-attr]
+    assert completed.output_text == "Hello" and completed.usage is usage
+    assert client.chat.completions.create.call_args.kwargs["stream_options"] == {"include_usage": True}
+    assert fallback.history_id == "chatcmpl-s"
+    stream.close.assert_awaited_once()
@@ -0,0 +1,109 @@
+"""Tests for multi-model comparison.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest import mock
+
+import pytest
+from openai.types import CompletionUsage
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from alleycat_core.llm.comparison import ModelRun, compare_models
+from alleycat_core.llm.evaluation import LLMTestCase, ResponseEvaluator
+from alleycat_core.llm.sinks import TEXT_DELTA, StreamSink, text_delta
+from alleycat_core.llm.types import ResponseUsage
+
+
+async def answer(text: str, delay: float) -> AsyncIterator[ResponseStreamEvent]:
+    """Stream an answer word by word after a delay."""
+    await asyncio.sleep(delay)
+    for word in text.split(" "):
+        yield ResponseTextDeltaEvent.model_construct(type=TEXT_DELTA, delta=word + " ")
+    usage = CompletionUsage(prompt_tokens=10, completion_tokens=len(text.split(" ")), total_tokens=0)
+    yield ResponseCompletedEvent.model_construct(
+        type="response.completed", response=mock.MagicMock(id="resp", usage=usage)
+    )
+
+
+class CollectingSink(StreamSink):
+    """Collect the text streamed to it."""
+
+    event_types = frozenset({TEXT_DELTA})
+
+    def __init__(self) -> None:
+        """Initialize with no text."""
+        self.text = ""
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Collect a text delta."""
+        self.text += text_delta(event)
+
+
+@pytest.mark.asyncio
+async def test_models_answer_concurrently() -> None:
+    """Test that every model gets the same stateless request, at the same time, and is measured."""
+    delays = {"fast": 0.01, "slow": 0.1}
+
+    async def respond(**kwargs: Any) -> AsyncIterator[ResponseStreamEvent]:
+        return answer(f"{kwargs['model']} says hi", delays[kwargs["model"]])
+
+    llm = mock.MagicMock()
+    llm.respond = mock.AsyncMock(side_effect=respond)
+    collected: dict[str, CollectingSink] = {}
+
+    def sinks(model: str) -> list[StreamSink]:
+        collected[model] = CollectingSink()
+        return [collected[model]]
+
+    runs = await compare_models(llm, ["slow", "fast"], "Hello", sinks=sinks, instructions="Be brief")
+
+    assert [run.model for run in runs] == ["slow", "fast"]
+    assert all(
+        call.kwargs["stateless"] and call.kwargs["instructions"] == "Be brief" for call in llm.respond.mock_calls
+    )
+    slow, fast = runs
+    assert slow.text == collected["slow"].text == "slow says hi "
+    assert fast.ttft_ms is not None and slow.ttft_ms is not None and fast.ttft_ms < slow.ttft_ms
+    # Run concurrently, the comparison takes about as long as the slowest model
+    assert slow.duration_ms < 180
+    assert fast.usage == ResponseUsage(total_tokens=0, prompt_tokens=10, completion_tokens=3)
+    assert fast.tokens_per_second is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_model_does_not_stop_others() -> None:
+    """Test that one model's error is kept in its run while the others answer and are scored."""
+
+    async def respond(**kwargs: Any) -> AsyncIterator[ResponseStreamEvent]:
+        if kwargs["model"] == "broken":
+            raise RuntimeError("model not found")
+        return answer("Paris is the capital", 0)
+
+    llm = mock.MagicMock()
+    llm.respond = mock.AsyncMock(side_effect=respond)
+    test_case = LLMTestCase(name="capital", prompt="Capital of France?", required_elements=["Paris"])
+
+    runs = await compare_models(
+        llm, ["broken", "good"], "Capital of France?", evaluator=ResponseEvaluator(), test_case=test_case
+    )
+
+    assert runs[0].error == "model not found" and runs[0].evaluation is None
+    assert runs[1].error is None
+    assert runs[1].evaluation is not None and runs[1].evaluation.score > 0
+
+
+def test_tokens_per_second_excludes_first_token_wait() -> None:
+    """Test that throughput is measured over generation only."""
+    run = ModelRun(
+        model="m",
+        ttft_ms=500,
+        duration_ms=1500,
+        usage=ResponseUsage(total_tokens=60, prompt_tokens=10, completion_tokens=50),
+    )
+    assert run.tokens_per_second == 50
+    assert ModelRun(model="m").tokens_per_second is None
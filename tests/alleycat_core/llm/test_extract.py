@@ -0,0 +1,132 @@
+"""Tests for JSONL structured extraction.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from alleycat_core.llm import JsonlExtractor, SchemaChain
+from alleycat_core.llm.extract import RecordError, build_prompt, completed_ids
+from alleycat_core.llm.types import LLMResponse, ResponseUsage
+from alleycat_core.schema import Schema
+
+CHARACTERS = Schema(
+    name="characters",
+    schema={"type": "object", "properties": {"characters": {"type": "array"}}, "required": ["characters"]},
+)
+
+
+class FakeProvider:
+    """Provider that extracts the capitalised words of the prompt."""
+
+    def __init__(self) -> None:
+        """Initialize the fake provider."""
+        self.prompts: list[str] = []
+
+    async def respond(self, **kwargs: Any) -> LLMResponse:
+        """Answer an extraction request."""
+        self.prompts.append(kwargs["input"])
+        if "fail" in kwargs["input"]:
+            return LLMResponse(output_text="not json")
+        names = [word for word in kwargs["input"].split() if word.istitle()]
+        return LLMResponse(
+            output_text=json.dumps({"characters": names}),
+            usage=ResponseUsage(total_tokens=5, prompt_tokens=4, completion_tokens=1),
+        )
+
+
+def make_extractor(provider: FakeProvider, **kwargs: Any) -> JsonlExtractor:
+    """Create an extractor for the characters schema."""
+    return JsonlExtractor(SchemaChain(provider, [CHARACTERS], concurrency=3), **kwargs)  # type: ignore[arg-type]
+
+
+def test_build_prompt() -> None:
+    """Test prompts from whole records, fields and templates."""
+    record = {"id": 1, "doc": {"text": "Alice met Bob"}, "lang": "en"}
+
+    assert build_prompt(record) == json.dumps(record)
+    assert build_prompt(record, "doc.text") == "Alice met Bob"
+    assert build_prompt(record, "doc.text", "List characters ({lang}): {text}") == "List characters (en): Alice met Bob"
+    with pytest.raises(RecordError):
+        build_prompt(record, "doc.title")
+    with pytest.raises(RecordError):
+        build_prompt(record, "doc.text", "{missing}")
+
+
+@pytest.mark.asyncio
+async def test_run_writes_one_line_per_record() -> None:
+    """Test that every record produces an output line with its ID, result, usage or error."""
+    lines = [
+        json.dumps({"id": "a", "text": "Alice met Bob"}),
+        "{not json",
+        json.dumps({"id": "b", "text": "please fail"}),
+        json.dumps({"id": "c"}),
+        "",
+        json.dumps({"text": "Carol"}),
+    ]
+    output = io.StringIO()
+
+    stats = await make_extractor(FakeProvider(), field="text").run(lines, output)
+
+    entries = {entry["id"]: entry for entry in map(json.loads, output.getvalue().splitlines())}
+    assert set(entries) == {"a", 2, "b", "c", 6}
+    assert entries["a"]["result"] == {"characters": ["Alice", "Bob"]}
+    assert entries["a"]["usage"]["total_tokens"] == 5
+    assert entries["a"]["error"] is None
+    assert "Invalid JSON on line 2" in entries[2]["error"]
+    assert entries["b"]["result"] is None and entries["b"]["error"]
+    assert "Field 'text' not found" in entries["c"]["error"]
+    assert entries[6]["result"] == {"characters": ["Carol"]}
+    assert (stats.succeeded, stats.failed, stats.total_tokens) == (2, 3, 10)
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_completed_records(tmp_path: Path) -> None:
+    """Test that records completed in a previous output are skipped and failures retried."""
+    output_path = tmp_path / "out.jsonl"
+    output_path.write_text(
+        json.dumps({"id": "a", "result": {}, "usage": None, "error": None})
+        + "\n"
+        + json.dumps({"id": "b", "result": None, "usage": None, "error": "boom"})
+        + "\n"
+        + '{"id": "c", "res'
+    )
+    provider = FakeProvider()
+    lines = [json.dumps({"id": key, "text": f"Record {key}"}) for key in ("a", "b", "c")]
+
+    skip_ids = completed_ids(output_path)
+    with open(output_path, "a", encoding="utf-8") as output:
+        stats = await make_extractor(provider, field="text").run(lines, output, skip_ids)
+
+    assert skip_ids == {"a"}
+    assert stats.skipped == 1
+    assert sorted(provider.prompts) == ["Record b", "Record c"]
+
+
+@pytest.mark.asyncio
+async def test_input_is_read_off_the_event_loop() -> None:
+    """Test that a slow input keeps requests in flight instead of blocking the event loop."""
+    import threading
+    import time
+
+    provider = FakeProvider()
+    reader_threads: set[int] = set()
+
+    def slow_lines() -> Iterator[str]:
+        for name in ["Alice", "Bob"]:
+            reader_threads.add(threading.get_ident())
+            # Blocks like a slow pipe
+            time.sleep(0.05)
+            yield json.dumps({"id": name, "text": name})
+
+    output = io.StringIO()
+    stats = await make_extractor(provider, field="text").run(slow_lines(), output)
+
+    assert stats.succeeded == 2
+    assert threading.get_ident() not in reader_threads
@@ -1,5 +1,6 @@
 """Tests for file support in OpenAI provider."""
 
+import asyncio
 from pathlib import Path
 from unittest import mock
 
@@ -79,22 +80,18 @@ async def test_respond_with_file(mock_async_openai_client: mock.AsyncMock) -> No
     args, kwargs = mock_async_openai_client.responses.create.call_args
     assert "input" in kwargs
 
-    # Verify the input is an array with one item
+    # Verify the file context is sent as its own message ahead of the user query
     input_array = kwargs["input"]
     assert isinstance(input_array, list)
-    assert len(input_array) == 1
+    assert len(input_array) == 2
 
-    # Verify the structured input format
-    structured_input = input_array[0]
-    assert isinstance(structured_input, dict)
-    assert structured_input["role"] == "user"
-    assert isinstance(structured_input["content"], list)
-
-    # Verify file reference and text content
-    content = structured_input["content"]
-    assert len(content) == 2
-    assert content[0]["type"] == "input_text"  # First item is file content
-    assert content[1]["type"] == "input_text"  # Second item is user query
+    context_message, query_message = input_array
+    assert context_message["role"] == "user"
+    assert isinstance(context_message["content"], list)
+    assert context_message["content"][0]["type"] == "input_text"
+    assert "sample.txt" in context_message["content"][0]["text"]
+    assert query_message["content"] == "Analyze this file"
+    assert kwargs["instructions"] == "see attached files for context."
 
 
 @pytest.mark.asyncio
@@ -125,3 +122,85 @@ async def test_respond_with_file_and_instructions(mock_async_openai_client: mock
     assert "instructions" in kwargs
     assert original_instructions in kwargs["instructions"]
     assert "Act as a helpful assistant" in kwargs["instructions"]
+
+
+@pytest.mark.asyncio
+async def test_file_sent_once_per_conversation(mock_async_openai_client: mock.AsyncMock) -> None:
+    """Test that a text file is only attached on the first turn of a conversation."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.client = mock_async_openai_client
+    mock_async_openai_client.responses.create.side_effect = [
+        mock.Mock(output_text="answer", id=f"resp_{turn}", usage=None, refusal=None) for turn in range(3)
+    ]
+
+    file_path = Path(__file__).parent.parent.parent / "fixtures" / "sample.txt"
+    await provider.add_file(str(file_path))
+
+    await provider.respond("Summarise the file", instructions="Be brief.")
+    first = mock_async_openai_client.responses.create.call_args.kwargs
+    assert len(first["input"]) == 2
+    assert first["instructions"] == "Be brief.\n\nsee attached files for context."
+
+    await provider.respond("And the last line?", instructions="Be brief.")
+    second = mock_async_openai_client.responses.create.call_args.kwargs
+    assert second["previous_response_id"] == "resp_0"
+    assert [message["content"] for message in second["input"]] == ["And the last line?"]
+    assert second["instructions"] == "Be brief."
+
+    # A new conversation needs the file again
+    provider.previous_response_id = None
+    await provider.respond("Summarise the file")
+    assert len(mock_async_openai_client.responses.create.call_args.kwargs["input"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_multiple_files_in_one_message(mock_async_openai_client: mock.AsyncMock) -> None:
+    """Test that several files are set up together and sent as one message."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.client = mock_async_openai_client
+    mock_async_openai_client.files.create.return_value = mock.Mock(spec=FileObject, id="file-pdf")
+    mock_async_openai_client.responses.create.return_value = mock.Mock(
+        output_text="answer", id="resp_1", usage=None, refusal=None
+    )
+
+    fixtures_path = Path(__file__).parent.parent.parent / "fixtures"
+    text_path, pdf_path = str(fixtures_path / "sample.txt"), str(fixtures_path / "sample.pdf")
+    assert await provider.add_files([text_path, pdf_path, text_path])
+    assert len(provider.remote_files) == 2
+
+    await provider.respond("Compare these files")
+    context_message, query_message = mock_async_openai_client.responses.create.call_args.kwargs["input"]
+    assert [part["type"] for part in context_message["content"]] == ["input_text", "input_file"]
+    assert context_message["content"][1]["file_id"] == "file-pdf"
+    assert query_message["content"] == "Compare these files"
+
+    assert await provider.cleanup_file()
+    assert provider.remote_files == []
+    mock_async_openai_client.files.delete.assert_called_once_with("file-pdf")
+
+
+@pytest.mark.asyncio
+async def test_add_files_bounds_concurrency(tmp_path: Path) -> None:
+    """Test that files are initialized concurrently, at most `concurrency` at a time."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    in_flight = peak = 0
+
+    async def initialize() -> bool:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return True
+
+    paths = []
+    for index in range(6):
+        path = tmp_path / f"report{index}.txt"
+        path.write_text(f"Report {index}")
+        paths.append(str(path))
+
+    with mock.patch("alleycat_core.llm.remote_file.TextFile.initialize", side_effect=initialize):
+        assert await provider.add_files(paths, concurrency=2)
+
+    assert peak == 2
+    assert [remote_file.file_path for remote_file in provider.remote_files] == paths
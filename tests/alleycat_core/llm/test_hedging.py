@@ -0,0 +1,179 @@
+"""Tests for hedged requests.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from alleycat_core.llm.hedging import hedge, resume_stream, start_stream
+from alleycat_core.llm.openai import OpenAIConfig, OpenAIProvider
+
+
+@pytest.mark.asyncio
+async def test_fast_call_is_not_hedged() -> None:
+    """Test that a call finishing within the delay runs once."""
+    call = mock.AsyncMock(return_value="answer")
+    assert await hedge(call, 1.0) == ("answer", False)
+    assert call.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stalled_call_loses_to_hedge() -> None:
+    """Test that the hedge wins over a stalled call, which is cancelled."""
+    cancelled = asyncio.Event()
+    delays = iter([10.0, 0.0])
+
+    async def call() -> str:
+        delay = next(delays)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return f"after {delay}"
+
+    assert await hedge(call, 0.01) == ("after 0.0", True)
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_failed_call_falls_back_to_the_other() -> None:
+    """Test that one failure is hidden and losing results are discarded."""
+    outcomes: list[Any] = [RuntimeError("boom"), "second"]
+
+    async def call() -> str:
+        outcome = outcomes.pop(0)
+        await asyncio.sleep(0.02)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return str(outcome)
+
+    assert await hedge(call, 0.01) == ("second", True)
+
+    async def fail() -> None:
+        await asyncio.sleep(0.02)
+        raise RuntimeError("always")
+
+    with pytest.raises(RuntimeError, match="always"):
+        await hedge(fail, 0.01)
+
+
+def event(type: str, **fields: Any) -> mock.Mock:
+    """Mock a response stream event."""
+    return mock.Mock(type=type, **fields)
+
+
+@pytest.mark.asyncio
+async def test_start_stream_reads_up_to_the_first_token() -> None:
+    """Test that events before the first token are kept and replayed."""
+    events = [event("response.created"), event("response.output_text.delta", delta="Hi"), event("response.done")]
+
+    async def source() -> AsyncIterator[Any]:
+        for item in events:
+            yield item
+
+    stream = source()
+    opened, read = await start_stream(mock.AsyncMock(return_value=stream))
+    assert [item.type for item in read] == ["response.created", "response.output_text.delta"]
+    assert [item async for item in resume_stream(opened, read)] == events
+
+
+@pytest.mark.asyncio
+async def test_provider_hedges_stalled_stream() -> None:
+    """Test that the provider streams from the hedge when the first stream stalls."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test", stream=True, hedge_percentile=95, hedge_delay_ms=10))
+    hedge_sent = asyncio.Event()
+
+    async def slow() -> AsyncIterator[Any]:
+        yield event("response.created")
+        await asyncio.sleep(10)
+        yield event("response.output_text.delta", delta="late")
+
+    async def fast() -> AsyncIterator[Any]:
+        yield event("response.output_text.delta", delta="quick")
+        yield event("response.completed", response=mock.Mock(id="resp_2", usage=None))
+
+    streams = [slow(), fast()]
+
+    async def create(**kwargs: Any) -> AsyncIterator[Any]:
+        if not streams[1:]:
+            hedge_sent.set()
+        return streams.pop(0)
+
+    with mock.patch.object(provider.client.responses, "create", side_effect=create):
+        response = await provider.respond("Hello")
+        assert isinstance(response, AsyncIterator)
+        deltas = [item.delta async for item in response if item.type == "response.output_text.delta"]
+
+    assert deltas == ["quick"]
+    assert hedge_sent.is_set() and provider.hedges == 1
+    assert provider.previous_response_id == "resp_2"
+
+
+def completion(id: str, content: str) -> mock.Mock:
+    """Mock a Chat Completions response."""
+    return mock.Mock(id=id, choices=[mock.Mock(message=mock.Mock(content=content))], usage=None)
+
+
+@pytest.mark.asyncio
+async def test_losing_copy_does_not_continue_the_local_conversation() -> None:
+    """Test that a hedge finishing after the winner does not replace the fallback's history."""
+    provider = OpenAIProvider(OpenAIConfig(profile="llama.cpp", model="qwen", hedge_percentile=95, hedge_delay_ms=10))
+    hedge_sent, first_done = asyncio.Event(), asyncio.Event()
+
+    async def first() -> mock.Mock:
+        await hedge_sent.wait()
+        first_done.set()
+        return completion("chatcmpl-1", "first")
+
+    async def second() -> mock.Mock:
+        hedge_sent.set()
+        await first_done.wait()
+        return completion("chatcmpl-2", "second")
+
+    calls = [first, second]
+
+    async def create(**kwargs: Any) -> mock.Mock:
+        return await calls.pop(0)()
+
+    with mock.patch.object(provider.client.chat.completions, "create", side_effect=create):
+        response = await provider.respond("Hello")
+
+    assert response.output_text == "first" and provider.hedges == 1  # type: ignore[union-attr]
+    assert provider.chat_fallback is not None
+    assert provider.chat_fallback.history_id == provider.previous_response_id == "chatcmpl-1"
+    assert provider.chat_fallback.history[-1] == {"role": "assistant", "content": "first"}
+
+
+@pytest.mark.asyncio
+async def test_hedged_fallback_stream_continues_the_local_conversation() -> None:
+    """Test that the winning stream of a hedged local request is remembered when it completes."""
+    provider = OpenAIProvider(
+        OpenAIConfig(profile="llama.cpp", model="qwen", stream=True, hedge_percentile=95, hedge_delay_ms=10)
+    )
+
+    def chunks(id: str, text: str, wait: float) -> mock.Mock:
+        async def source() -> AsyncIterator[Any]:
+            await asyncio.sleep(wait)
+            yield mock.Mock(id=id, choices=[mock.Mock(delta=mock.Mock(content=text))], usage=None)
+
+        stream = mock.Mock(close=mock.AsyncMock())
+        stream.__aiter__ = lambda self: source()
+        return stream
+
+    streams = [chunks("chatcmpl-1", "late", 10), chunks("chatcmpl-2", "quick", 0)]
+    create = mock.AsyncMock(side_effect=lambda **kwargs: streams.pop(0))
+    with mock.patch.object(provider.client.chat.completions, "create", create):
+        response = await provider.respond("Hello")
+        assert isinstance(response, AsyncIterator)
+        deltas = [item.delta async for item in response if item.type == "response.output_text.delta"]
+
+    assert deltas == ["quick"] and provider.hedges == 1
+    assert provider.chat_fallback is not None
+    assert provider.chat_fallback.history_id == provider.previous_response_id == "chatcmpl-2"
+    assert provider.chat_fallback.history[-1] == {"role": "assistant", "content": "quick"}
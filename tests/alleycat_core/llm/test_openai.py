@@ -1,6 +1,8 @@
 """Tests for OpenAI provider implementation."""
 
+import asyncio
 import os
+from collections.abc import AsyncIterator
 from pathlib import Path
 from unittest import mock
 
@@ -232,12 +234,9 @@ class TestOpenAIProvider:
 
         # Mock text file and its methods
         mock_text_file = mock.AsyncMock(spec=TextFile)
-        mock_text_file.get_file_prompt.return_value = {
+        mock_text_file.get_context_message.return_value = {
             "role": "user",
-            "content": [
-                {"type": "input_text", "text": "File content"},
-                {"type": "input_text", "text": "Analyze this file"},
-            ],
+            "content": [{"type": "input_text", "text": "File content"}],
         }
         mock_text_file.get_file_context.return_value = {}  # Return empty dict for file context
         provider.remote_file = mock_text_file
@@ -264,12 +263,9 @@ class TestOpenAIProvider:
 
         # Mock uploaded file and its methods
         mock_uploaded_file = mock.AsyncMock(spec=UploadedFile)
-        mock_uploaded_file.get_file_prompt.return_value = {
+        mock_uploaded_file.get_context_message.return_value = {
             "role": "user",
-            "content": [
-                {"type": "input_file", "file_id": "test-file-id"},
-                {"type": "input_text", "text": "Analyze this file"},
-            ],
+            "content": [{"type": "input_file", "file_id": "test-file-id"}],
         }
         mock_uploaded_file.get_file_context.return_value = {}  # Return empty dict for file context
         provider.remote_file = mock_uploaded_file
@@ -278,3 +274,105 @@ class TestOpenAIProvider:
         response = await provider.respond("Analyze this file")
         assert isinstance(response, LLMResponse)
         assert response.output_text == "Analysis of the PDF"
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_key_follows_the_request_prefix() -> None:
+    """Test that requests sharing instructions and files share a prompt cache key."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.client = mock.AsyncMock()
+    provider.client.responses.create.return_value = mock.Mock(output_text="ok", id="resp", usage=None, refusal=None)
+
+    async def cache_key(prompt: str, instructions: str) -> str:
+        await provider.respond(prompt, instructions=instructions, stateless=True)
+        return str(provider.client.responses.create.call_args.kwargs["prompt_cache_key"])
+
+    first = await cache_key("Summarise chapter one", "You are an editor.")
+    assert first == await cache_key("Summarise chapter two", "You are an editor.")
+    assert first != await cache_key("Summarise chapter one", "You are a critic.")
+
+    provider.config.prompt_cache_key = "my-job"
+    assert await cache_key("Summarise chapter one", "You are an editor.") == "my-job"
+
+    # Derived keys are not sent to other OpenAI-compatible endpoints
+    compatible = OpenAIProvider(OpenAIConfig(api_key="test-key", base_url="http://localhost:8080/v1"))
+    compatible.client = provider.client
+    await compatible.respond("Summarise chapter one")
+    assert "prompt_cache_key" not in provider.client.responses.create.call_args.kwargs
+
+
+@pytest.mark.asyncio
+async def test_stream_wrapper_closes_http_stream_when_abandoned() -> None:
+    """Test that closing a wrapped stream early closes the underlying HTTP stream."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.previous_response_id = "resp_previous"
+
+    class FakeStream:
+        closed = False
+
+        def __aiter__(self) -> "FakeStream":
+            return self
+
+        async def __anext__(self) -> mock.MagicMock:
+            return mock.MagicMock(type="response.output_text.delta", delta="more")
+
+        async def close(self) -> None:
+            self.closed = True
+
+    stream = FakeStream()
+    wrapped = provider._wrap_stream_with_id_capture(stream)  # type: ignore[arg-type]
+    await wrapped.__anext__()
+    await wrapped.aclose()
+
+    assert stream.closed
+    assert provider.previous_response_id == "resp_previous"
+
+
+@pytest.mark.asyncio
+async def test_stalled_stream_resumes_from_partial_text() -> None:
+    """Test that a stream that stops sending events is resumed from the text received so far."""
+    from alleycat_core.llm.openai import RESUME_INSTRUCTION
+
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key", stream=True, idle_timeout=0.05))
+
+    async def stalls() -> AsyncIterator[mock.MagicMock]:
+        yield mock.MagicMock(type="response.output_text.delta", delta="Hello ")
+        await asyncio.sleep(10)
+
+    async def resumed() -> AsyncIterator[mock.MagicMock]:
+        yield mock.MagicMock(type="response.output_text.delta", delta="world")
+        yield mock.MagicMock(type="response.completed", response=mock.MagicMock(id="resp_2", usage=None))
+
+    create = mock.AsyncMock(side_effect=[stalls(), resumed()])
+    with mock.patch.object(provider.client.responses, "create", create):
+        response = await provider.respond("Greet me")
+        assert isinstance(response, AsyncIterator)
+        text = "".join([event.delta async for event in response if event.type == "response.output_text.delta"])
+
+    assert text == "Hello world"
+    assert provider.previous_response_id == "resp_2"
+    resume_input = create.call_args_list[1].kwargs["input"]
+    assert resume_input[-2] == {"role": "assistant", "content": "Hello ", "type": "message"}
+    assert resume_input[-1]["content"] == RESUME_INSTRUCTION
+
+
+@pytest.mark.asyncio
+async def test_stream_gives_up_after_stall_retries() -> None:
+    """Test that repeated stalls end the stream with an error instead of hanging."""
+    from alleycat_core.llm.openai import StreamStalledError
+
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key", stream=True, idle_timeout=0.02, stall_retries=1))
+
+    async def silent() -> AsyncIterator[mock.MagicMock]:
+        await asyncio.sleep(10)
+        yield mock.MagicMock()
+
+    create = mock.AsyncMock(side_effect=[silent(), silent()])
+    with mock.patch.object(provider.client.responses, "create", create):
+        response = await provider.respond("Hello")
+        assert isinstance(response, AsyncIterator)
+        with pytest.raises(StreamStalledError, match="after 2 attempt"):
+            async for _ in response:
+                pass
+
+    assert create.await_count == 2
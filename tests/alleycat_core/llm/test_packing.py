@@ -0,0 +1,93 @@
+"""Tests for context packing of directory inputs.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from pathlib import Path
+
+import pytest
+
+from alleycat_core.llm.packing import (
+    PackedFile,
+    estimate_tokens,
+    pack_directory,
+    pack_files,
+    read_text_files,
+    scan_directory,
+    split_file,
+)
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    """Create a small project directory."""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("print('hello')\n")
+    (tmp_path / "src" / "copy.py").write_text("print('hello')\n")
+    (tmp_path / "README.md").write_text("# Project\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0\0")
+    (tmp_path / "empty.txt").write_text("")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.txt").write_text("generated\n")
+    return tmp_path
+
+
+def test_scan_directory_filters(project: Path) -> None:
+    """Test that hidden directories and excluded paths are skipped and includes applied."""
+    names = {path.relative_to(project).as_posix() for path in scan_directory(project, exclude=["build"])}
+    assert names == {"src/app.py", "src/copy.py", "README.md", "logo.png", "empty.txt"}
+
+    names = {path.relative_to(project).as_posix() for path in scan_directory(project, include=["*.py"])}
+    assert names == {"src/app.py", "src/copy.py"}
+
+
+def test_read_text_files_skips_binary_empty_and_duplicates(project: Path) -> None:
+    """Test that only distinct, non-empty text files are read."""
+    files = list(read_text_files(scan_directory(project, exclude=["build"]), project))
+    assert [file.name for file in files] == ["README.md", "src/app.py"]
+
+
+def test_split_file_at_line_boundaries() -> None:
+    """Test that a file over the budget is split into numbered parts that fit."""
+    text = "".join(f"line {index:04d}\n" for index in range(400))
+    parts = split_file(PackedFile(name="big.log", text=text), budget=200)
+
+    assert len(parts) > 1
+    assert "".join(part.text for part in parts) == text
+    assert all(part.tokens <= 200 for part in parts)
+    assert all(part.text.endswith("\n") for part in parts)
+    assert parts[1].header == f"File: big.log (part 2 of {len(parts)})\n\n"
+
+
+def test_pack_files_uses_few_packs() -> None:
+    """Test first-fit decreasing packing of files into the budget."""
+    sizes = {"a": 60, "b": 50, "c": 40, "d": 30, "e": 20}
+    files = [
+        PackedFile(name=name, text="x" * (tokens * 4 - len(f"File: {name}\n\n"))) for name, tokens in sizes.items()
+    ]
+    assert [file.tokens for file in files] == list(sizes.values())
+
+    packs = pack_files(files, budget=100)
+
+    assert len(packs) == 2
+    assert all(pack.tokens <= 100 for pack in packs)
+    assert sorted(file.name for pack in packs for file in pack.files) == list(sizes)
+
+
+def test_pack_directory_context_message(project: Path) -> None:
+    """Test that a pack is sent as one message with a section per file."""
+    packs = pack_directory(project, budget=1000, exclude=["build"])
+
+    assert len(packs) == 1
+    message = packs[0].get_context_message()
+    assert message is not None
+    assert [part["text"] for part in message["content"]] == [  # type: ignore[index]
+        "File: README.md\n\n# Project\n",
+        "File: src/app.py\n\nprint('hello')\n",
+    ]
+    assert estimate_tokens("abcd" * 10) == 10
+
+    with pytest.raises(NotADirectoryError):
+        pack_directory(project / "README.md", budget=1000)
@@ -0,0 +1,98 @@
+"""Tests for the token-reducing preprocessing of text files.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import pytest
+
+from alleycat_core.llm.reducers import (
+    CollapseWhitespace,
+    DedupeLines,
+    FileReducers,
+    ProjectColumns,
+    ReducerPipeline,
+    TemplateValues,
+    parse_reduce_options,
+    parse_reducer,
+)
+
+
+def test_collapse_whitespace_keeps_indentation() -> None:
+    """Test that trailing spaces, inner runs of spaces and blank lines are collapsed."""
+    text = "\n\ndef f():   \n    return  1\t\t+ 2\n\n\n\n# end\n\n"
+
+    assert CollapseWhitespace()(text) == "def f():\n    return 1 + 2\n\n# end"
+
+
+def test_template_values() -> None:
+    """Test that IP addresses and UUIDs are templated, and look-alikes are not."""
+    text = (
+        "10.0.0.1:443 -> 2001:db8::2:1 [::1] req 123e4567-e89b-12d3-a456-426614174000 "
+        "at 12:30:45 v1.2.3 std::vector 999.1.1.1"
+    )
+
+    assert TemplateValues()(text) == "<ip>:443 -> <ip> [<ip>] req <uuid> at 12:30:45 v1.2.3 std::vector 999.1.1.1"
+
+
+def test_dedupe_lines() -> None:
+    """Test that repeated lines are kept once with a count."""
+    text = "start\nretry\nretry\n\nok\n\nretry"
+
+    assert DedupeLines()(text) == "start\nretry [x3]\n\nok\n"
+    assert DedupeLines(adjacent=True)(text) == "start\nretry [x2]\n\nok\n\nretry"
+
+
+def test_project_columns() -> None:
+    """Test that CSV columns are kept by name or number, in the order given."""
+    text = 'time,level,message\n1,INFO,"hello, world"\n2,WARN\n'
+
+    assert ProjectColumns(["message", "1"])(text) == 'message,time\n"hello, world",1\n,2'
+    with pytest.raises(ValueError, match="Column 'host' is not in the CSV header"):
+        ProjectColumns(["host"])(text)
+
+
+def test_pipeline_reports_savings() -> None:
+    """Test that each stage reports the estimated tokens it saved."""
+    text = "\n".join(f"GET /health from 10.0.0.{n}" for n in range(1, 41))
+    pipeline = ReducerPipeline([parse_reducer("template"), parse_reducer("dedupe")])
+
+    reduced, savings = pipeline.run(text)
+
+    assert reduced == "GET /health from <ip> [x40]"
+    assert [saving.stage for saving in savings] == ["template", "dedupe"]
+    assert savings[0].tokens_before > savings[0].tokens_after == savings[1].tokens_before
+    assert savings[1].saved > 0
+    assert savings[1].tokens_after == 7
+
+
+def test_file_reducers_by_type() -> None:
+    """Test choosing reducers by file extension, with * for other types."""
+    reducers = FileReducers({"LOG": ["dedupe"], "*": ["whitespace"], ".md": []})
+
+    log_pipeline = reducers.for_file("logs/app.log")
+    assert log_pipeline is not None
+    assert [stage.name for stage in log_pipeline.stages] == ["dedupe"]
+    other_pipeline = reducers.for_file("notes.md")
+    assert other_pipeline is not None
+    assert [stage.name for stage in other_pipeline.stages] == ["whitespace"]
+    assert FileReducers({".log": ["dedupe"]}).for_file("notes.md") is None
+
+
+def test_parse_reduce_options() -> None:
+    """Test parsing --reduce options, one stage per option."""
+    options = ["log=template", ".log=dedupe:adjacent", "csv=columns:time,message"]
+
+    assert parse_reduce_options(options) == {
+        ".log": ["template", "dedupe:adjacent"],
+        ".csv": ["columns:time,message"],
+    }
+    with pytest.raises(ValueError, match="expected EXT=STAGE"):
+        parse_reduce_options(["dedupe"])
+    with pytest.raises(ValueError, match="Unknown reducer 'squash'"):
+        parse_reduce_options(["log=squash"])
+    with pytest.raises(ValueError, match="columns needs at least one column"):
+        parse_reducer("columns")
+    for spec in ("dedupe:foo", "whitespace:x", "template:ip"):
+        with pytest.raises(ValueError, match="argument"):
+            parse_reducer(spec)
+    assert isinstance(parse_reducer("whitespace:"), CollapseWhitespace)
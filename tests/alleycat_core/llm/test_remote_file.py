@@ -8,6 +8,8 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 from openai import AsyncOpenAI
 
+from alleycat_core.kb.index import KBIndex
+from alleycat_core.llm.reducers import FileReducers
 from alleycat_core.llm.remote_file import TextFile, UploadedFile, create_remote_file
 
 
@@ -83,6 +85,21 @@ class TestRemoteFile(unittest.TestCase):
         self.assertEqual(content[1]["type"], "input_text")
         self.assertEqual(content[1]["text"], "Analyze this file")
 
+    @patch("alleycat_core.llm.remote_file.logging")
+    def test_text_file_context_message(self, mock_logging: Any) -> None:
+        """Test getting the file content as a message of its own."""
+        text_file = TextFile(str(self.text_file_path))
+        self.assertIsNone(text_file.get_context_message())
+
+        asyncio.run(text_file.initialize())
+        message = text_file.get_context_message()
+
+        self.assertIsNotNone(message)
+        content: list[dict[str, Any]] = message["content"]  # type: ignore
+        self.assertEqual(len(content), 1)
+        self.assertTrue(content[0]["text"].startswith("File: test.txt"))
+        self.assertTrue("This is a test file." in content[0]["text"])
+
     @patch("alleycat_core.llm.remote_file.logging")
     def test_uploaded_file_initialization(self, mock_logging: Any) -> None:
         """Test initializing an uploaded file."""
@@ -116,6 +133,21 @@ class TestRemoteFile(unittest.TestCase):
         # Verify client method was called
         self.mock_client.files.delete.assert_called_once_with("test_file_id")
 
+    @patch("alleycat_core.llm.remote_file.logging")
+    def test_uploaded_file_is_recorded_until_deleted(self, mock_logging: Any) -> None:
+        """Test that an upload is recorded in the KB index until it is cleaned up."""
+        index = KBIndex(self.test_file_dir / "kb.db")
+        try:
+            uploaded_file = UploadedFile(str(self.text_file_path), self.mock_client, index)
+            asyncio.run(uploaded_file.initialize())
+            self.assertEqual(index.upload_ids(), {"test_file_id"})
+
+            asyncio.run(uploaded_file.cleanup())
+            self.assertEqual(index.upload_ids(), set())
+        finally:
+            index.close()
+            (self.test_file_dir / "kb.db").unlink()
+
     @patch("alleycat_core.llm.remote_file.logging")
     def test_uploaded_file_prompt(self, mock_logging: Any) -> None:
         """Test getting a prompt from an uploaded file."""
@@ -158,6 +190,56 @@ class TestRemoteFile(unittest.TestCase):
                 if path.exists():
                     path.unlink()
 
+    @patch("alleycat_core.llm.remote_file.logging")
+    def test_text_file_reducers(self, mock_logging: Any) -> None:
+        """Test that text files are reduced by the reducers for their type before they are inlined."""
+        path = self.test_file_dir / "test.log"
+        path.write_text("GET /    from 10.0.0.1\nGET /    from 10.0.0.2\n")
+        reducers = FileReducers({"log": ["whitespace", "template", "dedupe"]})
+
+        try:
+            remote_file = create_remote_file(str(path), self.mock_client, reducers=reducers)
+            self.assertIsInstance(remote_file, TextFile)
+            assert isinstance(remote_file, TextFile)
+            self.assertTrue(asyncio.run(remote_file.initialize()))
+
+            self.assertEqual(remote_file.content, "GET / from <ip> [x2]")
+            self.assertEqual([saving.stage for saving in remote_file.savings], ["whitespace", "template", "dedupe"])
+
+            # Other file types are sent as they are
+            other_file = create_remote_file(str(self.text_file_path), self.mock_client, reducers=reducers)
+            assert isinstance(other_file, TextFile)
+            self.assertIsNone(other_file.reducers)
+        finally:
+            path.unlink()
+
+    @patch("alleycat_core.llm.remote_file.logging")
+    def test_text_file_size_limit_applies_after_reducing(self, mock_logging: Any) -> None:
+        """Test that a file over the size limit is accepted when its reduced content is under it."""
+        path = self.test_file_dir / "big.log"
+        path.write_text("GET / from 10.0.0.1\n" * 20)
+        reducers = FileReducers({"log": ["dedupe"]}).for_file(path)
+
+        try:
+            with patch.object(TextFile, "MAX_SIZE_BYTES", 100):
+                self.assertFalse(asyncio.run(TextFile(str(path)).initialize()))
+
+                reduced = TextFile(str(path), reducers)
+                self.assertTrue(asyncio.run(reduced.initialize()))
+                self.assertEqual(reduced.content, "GET / from 10.0.0.1 [x20]")
+
+                path.write_text("".join(f"GET / from 10.0.0.{n}\n" for n in range(20)))
+                still_large = TextFile(str(path), reducers)
+                self.assertFalse(asyncio.run(still_large.initialize()))
+                self.assertIsNone(still_large.content)
+
+            # Files too large to read in full are refused before they are read
+            with patch.object(TextFile, "MAX_REDUCED_FILE_BYTES", 100), patch("pathlib.Path.read_text") as read_text:
+                self.assertFalse(asyncio.run(TextFile(str(path), reducers).initialize()))
+                read_text.assert_not_called()
+        finally:
+            path.unlink()
+
     def test_create_remote_file_uploaded(self) -> None:
         """Test creating a RemoteFile for an uploadable file."""
         # Test with known uploadable extensions
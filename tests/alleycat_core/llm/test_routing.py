@@ -0,0 +1,112 @@
+"""Tests for model routing and escalation.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from alleycat_core.llm.evaluation import LLMTestCase, ResponseEvaluator
+from alleycat_core.llm.routing import (
+    ModelRouter,
+    RouteRequest,
+    RouteRule,
+    estimate_request_tokens,
+    evaluation_check,
+    schema_check,
+)
+from alleycat_core.llm.types import LLMResponse
+from alleycat_core.schema import Schema
+from alleycat_core.usage import UsageLedger, UsageRecord
+
+RULES = [
+    RouteRule(model="nano", max_prompt_tokens=1000, tools=False),
+    RouteRule(model="mini", output_formats=["schema"]),
+]
+
+
+def test_rules_match_in_order() -> None:
+    """Test that the first matching rule picks the model."""
+    router = ModelRouter("large", rules=RULES)
+    assert router.route(RouteRequest(prompt_tokens=10)) == "nano"
+    assert router.route(RouteRequest(prompt_tokens=10, tools=True)) == "large"
+    assert router.route(RouteRequest(prompt_tokens=5000, output_format="schema")) == "mini"
+    assert router.route(RouteRequest(prompt_tokens=5000)) == "large"
+
+
+def test_latency_budget_uses_ledger_p95(tmp_path: Path) -> None:
+    """Test that models slower than the budget are skipped."""
+    ledger = UsageLedger(tmp_path / "usage.db")
+    for latency in (50.0, 60.0, 900.0):
+        ledger.record(UsageRecord(model="nano", latency_ms=latency))
+    ledger.record(UsageRecord(model="mini", latency_ms=80.0))
+
+    router = ModelRouter("large", rules=[RULES[0], RouteRule(model="mini")], ledger=ledger)
+    assert router.latency_p95("nano") == 900.0
+    assert router.latency_p95("unknown") is None
+    assert router.route(RouteRequest(latency_budget_ms=100)) == "mini"
+    assert router.route(RouteRequest()) == "nano"
+    ledger.close()
+
+
+def test_escalation_ladder() -> None:
+    """Test that escalation walks the ladder from weakest to strongest."""
+    router = ModelRouter("nano", escalation=["mini", "large"])
+    assert router.escalate("nano") == "mini"
+    assert router.escalate("mini") == "large"
+    assert router.escalate("large") is None
+    assert ModelRouter("nano").escalate("nano") is None
+
+
+def test_estimate_request_tokens(tmp_path: Path) -> None:
+    """Test that attached files count towards the prompt size."""
+    path = tmp_path / "notes.txt"
+    path.write_text("x" * 400)
+    assert estimate_request_tokens("abcd", "efgh", [mock.Mock(file_path=str(path))]) == 102
+
+
+def test_checks() -> None:
+    """Test the schema and evaluator checks."""
+    schema = Schema(
+        name="person",
+        schema={"type": "object", "properties": {"name": {"type": "string"}}, "required": ["name"]},
+    )
+    check = schema_check(schema)
+    assert check(LLMResponse(output_text='{"name": "Ada"}')) is None
+    assert "not valid JSON" in (check(LLMResponse(output_text="nope")) or "")
+    assert check(LLMResponse(output_text="{}")) is not None
+
+    test_case = LLMTestCase(name="capital", prompt="Capital of France?", required_elements=["Paris"], min_score=1.0)
+    evaluate = evaluation_check(ResponseEvaluator(), test_case)
+    assert evaluate(LLMResponse(output_text="Paris")) is None
+    assert "below" in (evaluate(LLMResponse(output_text="Lyon")) or "")
+
+
+@pytest.mark.asyncio
+async def test_respond_escalates_and_restores_the_conversation() -> None:
+    """Test that a failed answer is re-asked of a stronger model from the same point."""
+    llm = mock.Mock(previous_response_id="resp_0", file_in_conversation=True)
+    answers = {"nano": "Lyon", "mini": "Marseille", "large": "Paris"}
+    continued_from: list[str] = []
+
+    async def respond(input: str, **kwargs: Any) -> LLMResponse:
+        continued_from.append(llm.previous_response_id)
+        llm.previous_response_id = f"resp_{kwargs['model']}"
+        return LLMResponse(output_text=answers[kwargs["model"]])
+
+    llm.respond = mock.AsyncMock(side_effect=respond)
+
+    router = ModelRouter("nano", escalation=["mini", "large"])
+    test_case = LLMTestCase(name="capital", prompt="Capital of France?", required_elements=["Paris"], min_score=1.0)
+    response, model = await router.respond(
+        llm, "Capital of France?", RouteRequest(), check=evaluation_check(ResponseEvaluator(), test_case)
+    )
+
+    assert isinstance(response, LLMResponse) and response.output_text == "Paris"
+    assert model == "large"
+    assert router.escalations == 2
+    assert continued_from == ["resp_0", "resp_0", "resp_0"]
+    assert llm.previous_response_id == "resp_large"
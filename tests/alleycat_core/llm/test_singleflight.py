@@ -0,0 +1,154 @@
+"""Tests for coalescing identical in-flight requests.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest import mock
+
+import pytest
+
+from alleycat_core.llm.openai import OpenAIConfig, OpenAIProvider
+from alleycat_core.llm.singleflight import SingleFlight, StreamAbandonedError, StreamFanout
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_call() -> None:
+    """Test that concurrent calls with the same key run once."""
+    flights = SingleFlight()
+    calls: list[str] = []
+
+    async def call(value: str) -> str:
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value.upper()
+
+    results = await asyncio.gather(
+        *(flights.do(value, lambda value=value: call(value)) for value in ("a", "a", "b", "a"))  # type: ignore[misc]
+    )
+
+    assert [result for result, _ in results] == ["A", "A", "B", "A"]
+    assert [shared for _, shared in results] == [False, True, False, True]
+    assert sorted(calls) == ["a", "b"]
+    assert flights.coalesced == 2
+
+    # Finished calls are not reused
+    assert await flights.do("a", lambda: call("a")) == ("A", False)
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_cancelling_all_cancels_the_call() -> None:
+    """Test error propagation and cancellation of abandoned calls."""
+    flights = SingleFlight()
+
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flights.do("x", fail), flights.do("x", fail), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def slow() -> None:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.ensure_future(flights.do("y", slow))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_stream_fanout_replays_to_late_subscribers() -> None:
+    """Test that every subscriber sees the whole stream."""
+    release = asyncio.Event()
+
+    async def source() -> AsyncIterator[int]:
+        yield 1
+        await release.wait()
+        yield 2
+
+    fanout = StreamFanout(source())
+    first = fanout.subscribe()
+    assert await anext(first) == 1
+
+    second = fanout.subscribe()
+    release.set()
+    assert [event async for event in second] == [1, 2]
+    assert [event async for event in first] == [2]
+    assert fanout.finished
+
+
+@pytest.mark.asyncio
+async def test_stream_fanout_closes_abandoned_source() -> None:
+    """Test that the source is closed when every subscriber stops reading."""
+    closed = asyncio.Event()
+
+    async def endless() -> AsyncIterator[int]:
+        try:
+            while True:
+                yield 1
+                await asyncio.sleep(0.01)
+        finally:
+            closed.set()
+
+    fanout = StreamFanout(endless())
+    subscriber = fanout.subscribe()
+    assert await anext(subscriber) == 1
+    await subscriber.aclose()  # type: ignore[attr-defined]
+
+    await asyncio.wait_for(closed.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_stream_fanout_fails_late_subscribers_of_an_abandoned_stream() -> None:
+    """Test that subscribing after the stream was abandoned raises instead of ending early."""
+
+    async def endless() -> AsyncIterator[int]:
+        while True:
+            yield 1
+            await asyncio.sleep(0.01)
+
+    fanout = StreamFanout(endless())
+    subscriber = fanout.subscribe()
+    assert await anext(subscriber) == 1
+    await subscriber.aclose()  # type: ignore[attr-defined]
+    await asyncio.wait_for(fanout.wait_finished(), timeout=1)
+
+    late = fanout.subscribe()
+    assert await anext(late) == 1
+    with pytest.raises(StreamAbandonedError):
+        await anext(late)
+
+
+@pytest.mark.asyncio
+async def test_provider_coalesces_stateless_requests() -> None:
+    """Test that identical stateless requests make one API call and report its usage once."""
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key"))
+    provider.client = mock.AsyncMock()
+
+    async def create(**kwargs: object) -> mock.Mock:
+        await asyncio.sleep(0.01)
+        usage = mock.Mock(
+            input_tokens=10, output_tokens=2, total_tokens=12, input_tokens_details=mock.Mock(cached_tokens=0)
+        )
+        return mock.Mock(output_text=f"label for {kwargs['input']}", id="resp", usage=usage, refusal=None)
+
+    provider.client.responses.create.side_effect = create
+
+    responses = await asyncio.gather(*(provider.respond("disk full", stateless=True) for _ in range(5)))
+
+    assert provider.client.responses.create.call_count == 1
+    assert len({response.output_text for response in responses}) == 1  # type: ignore[union-attr]
+    assert sum(1 for response in responses if response.usage is not None) == 1  # type: ignore[union-attr]
+
+    # Requests that continue a conversation are never shared
+    await asyncio.gather(provider.respond("disk full"), provider.respond("disk full"))
+    assert provider.client.responses.create.call_count == 3
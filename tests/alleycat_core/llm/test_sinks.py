@@ -0,0 +1,142 @@
+"""Tests for the stream sink pipeline.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+from openai.types.responses.response_stream_event import ResponseStreamEvent
+
+from alleycat_core.llm.sinks import (
+    COMPLETED,
+    TEXT_DELTA,
+    EventLogSink,
+    MetricsSink,
+    StreamPipeline,
+    StreamSink,
+    TeeSink,
+)
+
+
+def delta(text: str) -> ResponseStreamEvent:
+    """Make a text delta event."""
+    return ResponseTextDeltaEvent.model_construct(type=TEXT_DELTA, delta=text)
+
+
+def completed() -> ResponseStreamEvent:
+    """Make a completed event."""
+    return ResponseCompletedEvent.model_construct(type=COMPLETED)
+
+
+async def events(*items: ResponseStreamEvent) -> AsyncIterator[ResponseStreamEvent]:
+    """Stream some events."""
+    for item in items:
+        yield item
+
+
+class RecordingSink(StreamSink):
+    """Record the events and lifecycle calls a sink receives."""
+
+    def __init__(self, event_types: frozenset[str] | None = None, delay: float = 0.0):
+        """Initialize the sink, receiving all events by default."""
+        self.event_types = event_types
+        self.delay = delay
+        self.received: list[str] = []
+        self.closed: bool | None = None
+
+    async def on_event(self, event: ResponseStreamEvent) -> None:
+        """Record an event after the sink's delay."""
+        await asyncio.sleep(self.delay)
+        self.received.append(event.type)
+
+    async def close(self, completed: bool) -> None:
+        """Record how the stream ended."""
+        self.closed = completed
+
+
+@pytest.mark.asyncio
+async def test_events_fan_out_by_type() -> None:
+    """Test that each sink receives only the event types it asks for, from one read of the stream."""
+    everything = RecordingSink()
+    text_only = RecordingSink(frozenset({TEXT_DELTA}))
+
+    text = await StreamPipeline([everything, text_only]).run(events(delta("Hel"), delta("lo"), completed()))
+
+    assert text == "Hello"
+    assert everything.received == [TEXT_DELTA, TEXT_DELTA, COMPLETED]
+    assert text_only.received == [TEXT_DELTA, TEXT_DELTA]
+    assert everything.closed is True and text_only.closed is True
+
+
+@pytest.mark.asyncio
+async def test_slow_sink_applies_backpressure() -> None:
+    """Test that the pipeline stops reading ahead of a slow sink once its buffer is full."""
+    read = 0
+    slow = RecordingSink(delay=0.01)
+
+    async def counted() -> AsyncIterator[ResponseStreamEvent]:
+        nonlocal read
+        for _ in range(10):
+            read += 1
+            # A buffer of 2 plus the event in the sink's hands
+            assert read - len(slow.received) <= 4
+            yield delta("x")
+
+    assert await StreamPipeline([slow], buffer=2).run(counted()) == "x" * 10
+    assert len(slow.received) == 10
+
+
+@pytest.mark.asyncio
+async def test_sink_error_stops_stream() -> None:
+    """Test that a failing sink stops the stream, its error is raised and every sink is closed."""
+
+    class FailingSink(StreamSink):
+        async def on_event(self, event: ResponseStreamEvent) -> None:
+            raise ValueError("disk full")
+
+    other = RecordingSink()
+    with pytest.raises(ValueError, match="disk full"):
+        await StreamPipeline([FailingSink(), other]).run(events(*[delta("x") for _ in range(100)]))
+    assert other.closed is False
+
+
+@pytest.mark.asyncio
+async def test_cancelled_pipeline_keeps_text() -> None:
+    """Test that cancelling the pipeline closes the sinks and keeps the text received."""
+    sink = RecordingSink()
+
+    async def endless() -> AsyncIterator[ResponseStreamEvent]:
+        yield delta("partial")
+        await asyncio.Event().wait()
+
+    pipeline = StreamPipeline([sink])
+    task = asyncio.ensure_future(pipeline.run(endless()))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert pipeline.text == "partial"
+    assert sink.closed is False
+
+
+@pytest.mark.asyncio
+async def test_file_and_metrics_sinks(tmp_path: Path) -> None:
+    """Test that the tee, event log and metrics sinks all see the same stream."""
+    tee = TeeSink(tmp_path / "out" / "answer.txt")
+    log = EventLogSink(tmp_path / "events.ndjson")
+    metrics = MetricsSink()
+
+    await StreamPipeline([tee, log, metrics]).run(events(delta("Hi "), delta("there"), completed()))
+
+    assert (tmp_path / "out" / "answer.txt").read_text() == "Hi there"
+    records = [json.loads(line) for line in (tmp_path / "events.ndjson").read_text().splitlines()]
+    assert [record["type"] for record in records] == [TEXT_DELTA, TEXT_DELTA, COMPLETED]
+    assert all("received_at" in record for record in records)
+    assert metrics.metrics.events == {TEXT_DELTA: 2, COMPLETED: 1}
+    assert metrics.metrics.chars == 8
+    assert metrics.metrics.ttft_ms is not None and metrics.metrics.completed
@@ -0,0 +1,6 @@
+"""Tests for the schema module.
+
+This module contains tests for structured output schemas and the schema manager.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
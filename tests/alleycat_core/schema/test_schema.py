@@ -0,0 +1,164 @@
+"""Tests for schema validation and the schema manager.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from alleycat_core.schema import Schema, SchemaManager, SchemaValidationError, resolve_local_refs
+
+PERSON_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "age": {"type": "number"},
+    },
+    "required": ["name", "age"],
+    "additionalProperties": False,
+}
+
+
+@pytest.fixture
+def schema_file(tmp_path: Path) -> Path:
+    """Write the person schema to a temporary file."""
+    path = tmp_path / "person.schema.json"
+    path.write_text(json.dumps(PERSON_SCHEMA))
+    return path
+
+
+def test_validate_response() -> None:
+    """Test that invalid responses raise with the failing location."""
+    schema = Schema(name="person", schema=PERSON_SCHEMA)
+
+    schema.validate_response({"name": "Ada", "age": 36})
+
+    with pytest.raises(SchemaValidationError, match=r"\$\.age"):
+        schema.validate_response({"name": "Ada", "age": "thirty six"})
+    with pytest.raises(SchemaValidationError, match="required"):
+        schema.validate_response({"name": "Ada"})
+
+
+def test_validate_data() -> None:
+    """Test boolean validation."""
+    schema = Schema(name="person", schema=PERSON_SCHEMA)
+    assert schema.validate_data({"name": "Ada", "age": 36})
+    assert not schema.validate_data({"name": "Ada", "age": 36, "extra": True})
+
+
+def test_validate_many() -> None:
+    """Test bulk validation yields errors per record in order."""
+    schema = Schema(name="person", schema=PERSON_SCHEMA)
+    records = ({"name": f"p{i}", "age": i} if i % 2 else {"name": f"p{i}"} for i in range(6))
+
+    results = list(schema.validate_many(records))
+
+    assert len(results) == 6
+    assert [bool(errors) for errors in results] == [True, False, True, False, True, False]
+    assert "required" in results[0][0]
+
+
+def test_invalid_json_schema() -> None:
+    """Test that a malformed JSON schema is rejected when compiled."""
+    schema = Schema(name="bad", schema={"type": "not-a-type"})
+    with pytest.raises(SchemaValidationError, match="Invalid JSON schema"):
+        schema.validate_data({})
+
+
+def test_manager_shares_validators_by_content(schema_file: Path, tmp_path: Path) -> None:
+    """Test that identical schemas share one compiled validator."""
+    copy = tmp_path / "copy.schema.json"
+    # Same content with a different key order
+    copy.write_text(json.dumps(dict(reversed(list(PERSON_SCHEMA.items())))))
+
+    manager = SchemaManager()
+    first = manager.get_schema(schema_file)
+    second = manager.get_schema(copy)
+
+    assert first.content_hash == second.content_hash
+    assert first.validator is second.validator
+    assert list(manager.validate_many(schema_file, [{"name": "Ada", "age": 1}])) == [[]]
+
+
+def test_manager_validate_schema_file(tmp_path: Path) -> None:
+    """Test that validate_schema_file rejects invalid JSON schemas."""
+    bad = tmp_path / "bad.schema.json"
+    bad.write_text(json.dumps({"type": 42}))
+
+    with pytest.raises(SchemaValidationError):
+        SchemaManager().validate_schema_file(bad)
+
+
+def test_persistent_cache_reused_across_managers(schema_file: Path, tmp_path: Path) -> None:
+    """Test that a second manager loads the schema from the cache directory without parsing it."""
+    cache_dir = tmp_path / "cache"
+    first = SchemaManager(cache_dir=cache_dir).get_schema(schema_file)
+    assert len(list(cache_dir.glob("*.json"))) == 1
+
+    with mock.patch.object(Schema, "from_file", side_effect=AssertionError("schema file was re-parsed")):
+        second = SchemaManager(cache_dir=cache_dir).get_schema(schema_file)
+
+    assert second.to_request_format() == first.to_request_format()
+    assert second.content_hash == first.content_hash
+
+
+def test_cache_invalidated_when_file_changes(schema_file: Path, tmp_path: Path) -> None:
+    """Test that changing the schema file invalidates memory and disk cache entries."""
+    manager = SchemaManager(cache_dir=tmp_path / "cache")
+    assert manager.get_schema(schema_file).validate_data({"name": "Ada", "age": 36})
+
+    changed = {**PERSON_SCHEMA, "properties": {"name": {"type": "string"}, "age": {"type": "string"}}}
+    schema_file.write_text(json.dumps(changed, indent=2))
+
+    assert not manager.get_schema(schema_file).validate_data({"name": "Ada", "age": 36})
+    assert (
+        not SchemaManager(cache_dir=tmp_path / "cache")
+        .get_schema(schema_file)
+        .validate_data({"name": "Ada", "age": 36})
+    )
+
+
+def test_local_refs_resolved_and_tracked(tmp_path: Path) -> None:
+    """Test that $refs to other files are inlined and changes to them invalidate the cache."""
+    address = tmp_path / "address.schema.json"
+    address.write_text(
+        json.dumps({"$defs": {"city": {"type": "string"}}, "properties": {"city": {"$ref": "#/$defs/city"}}})
+    )
+    root = tmp_path / "contact.schema.json"
+    root.write_text(
+        json.dumps(
+            {
+                "type": "object",
+                "properties": {
+                    "address": {"$ref": "address.schema.json", "description": "Postal address"},
+                    "id": {"$ref": "#/$defs/id"},
+                },
+                "$defs": {"id": {"type": "integer"}},
+            }
+        )
+    )
+
+    manager = SchemaManager(cache_dir=tmp_path / "cache")
+    schema = manager.get_schema(root)
+    address_schema = schema.json_schema_data["properties"]["address"]
+    assert address_schema["description"] == "Postal address"
+    assert address_schema["properties"]["city"] == {"type": "string"}
+    # References within the top-level document are kept for the API to resolve
+    assert schema.json_schema_data["properties"]["id"] == {"$ref": "#/$defs/id"}
+    assert schema.validate_data({"address": {"city": "Wellington"}, "id": 1})
+
+    address.write_text(json.dumps({"type": "object", "properties": {"city": {"type": "integer"}}}))
+    assert not manager.get_schema(root).validate_data({"address": {"city": "Wellington"}})
+
+
+def test_circular_refs_rejected(tmp_path: Path) -> None:
+    """Test that circular file references raise a validation error."""
+    (tmp_path / "a.json").write_text(json.dumps({"$ref": "b.json"}))
+    (tmp_path / "b.json").write_text(json.dumps({"$ref": "a.json"}))
+
+    with pytest.raises(SchemaValidationError, match="Circular"):
+        resolve_local_refs({"$ref": "a.json"}, tmp_path / "root.json")
@@ -0,0 +1,90 @@
+"""Tests for logging.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from alleycat_core import logging
+
+
+@pytest.fixture(autouse=True)
+def reset_logging() -> Iterator[None]:
+    """Restore the default level and console output after each test."""
+    yield
+    logging.set_verbose(False)
+    logging.set_json_sink(None)
+
+
+def test_filtered_message_is_not_formatted() -> None:
+    """Test that messages below the level are neither built nor formatted."""
+    build = mock.Mock(return_value="expensive")
+    argument = mock.MagicMock()
+
+    logging.set_level(logging.Level.WARNING)
+    with mock.patch.object(logging.verbose_console, "print") as console_print:
+        logging.debug(build)
+        logging.info("Value: %s", argument)
+
+    build.assert_not_called()
+    argument.__str__.assert_not_called()
+    console_print.assert_not_called()
+
+
+def test_level_filtering() -> None:
+    """Test that messages at or above the level are shown and verbose maps to debug."""
+    logging.set_level("warning")
+    assert logging.is_enabled(logging.Level.ERROR) and logging.is_enabled(logging.Level.WARNING)
+    assert not logging.is_enabled(logging.Level.INFO) and not logging.is_verbose()
+
+    logging.set_verbose(True)
+    assert logging.is_enabled(logging.Level.DEBUG) and logging.is_verbose()
+
+    with pytest.raises(ValueError, match="Unknown log level"):
+        logging.set_level("loud")
+
+
+def test_lazy_message_is_formatted_when_shown() -> None:
+    """Test that %-style arguments and callables are applied to shown messages."""
+    logging.set_verbose(True)
+    with mock.patch.object(logging.verbose_console, "print") as console_print:
+        logging.info("Using %s tools", 2)
+        logging.warning(lambda: "built late")
+
+    assert "Using 2 tools" in console_print.call_args_list[0].args[0]
+    assert "built late" in console_print.call_args_list[1].args[0]
+
+
+def test_json_sink_writes_plain_records() -> None:
+    """Test that the JSON sink replaces console output with one plain-text record per line."""
+    sink = io.StringIO()
+    logging.set_level("info")
+    logging.set_json_sink(sink)
+    with mock.patch.object(logging.error_console, "print") as console_print:
+        logging.info("Uploaded [cyan]%s[/cyan]", "notes.md")
+        logging.error("Failed: %d%%", 50)
+        logging.debug("hidden")
+
+    records = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert [(record["level"], record["message"]) for record in records] == [
+        ("info", "Uploaded notes.md"),
+        ("error", "Failed: 50%"),
+    ]
+    assert all(isinstance(record["ts"], float) for record in records)
+    console_print.assert_not_called()
+
+
+def test_json_sink_to_path(tmp_path: Path) -> None:
+    """Test that a path target is appended to."""
+    path = tmp_path / "log.jsonl"
+    logging.set_json_sink(str(path))
+    logging.error("first")
+    logging.set_json_sink(None)
+
+    assert json.loads(path.read_text())["message"] == "first"
@@ -0,0 +1,6 @@
+"""Tests for the usage module.
+
+This module contains tests for the usage ledger.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
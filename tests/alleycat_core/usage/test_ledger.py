@@ -0,0 +1,172 @@
+"""Tests for the usage ledger.
+
+Author: Andrew Watkins <andrew@groat.nz>
+"""
+
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from alleycat_core.llm.openai import OpenAIConfig, OpenAIProvider
+from alleycat_core.usage import UsageLedger, UsageRecord
+from alleycat_core.usage.ledger import percentile
+
+
+@pytest.fixture
+def ledger(tmp_path: Path) -> UsageLedger:
+    """Create a ledger in a temporary directory."""
+    ledger = UsageLedger(tmp_path / "usage.db")
+    yield ledger
+    ledger.close()
+
+
+def test_percentile() -> None:
+    """Test nearest-rank percentiles."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([7.0], 95) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_latency_percentile(ledger: UsageLedger) -> None:
+    """Test latency percentiles over completed requests."""
+    for ttft in (100.0, 200.0, 300.0):
+        ledger.record(UsageRecord(model="gpt-4o", latency_ms=ttft * 2, ttft_ms=ttft, streamed=True))
+    ledger.record(UsageRecord(model="gpt-4o", latency_ms=9000.0, ttft_ms=9000.0, status="cancelled"))
+    ledger.record(UsageRecord(model="gpt-4o", latency_ms=50.0))
+
+    assert ledger.latency_percentile(95, model="gpt-4o", first_token=True) == 300.0
+    assert ledger.latency_percentile(50, model="gpt-4o") == 200.0
+    assert ledger.latency_percentile(95, model="gpt-4o", first_token=True, min_samples=4) is None
+    assert ledger.latency_percentile(95, model="other") is None
+
+
+def test_older_ledger_gains_new_columns(tmp_path: Path) -> None:
+    """Test that a ledger created before the stalls column is upgraded on open."""
+    import sqlite3
+
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE usage (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, model TEXT NOT NULL, "
+            "tag TEXT, response_id TEXT, prompt_tokens INTEGER NOT NULL DEFAULT 0, "
+            "completion_tokens INTEGER NOT NULL DEFAULT 0, total_tokens INTEGER NOT NULL DEFAULT 0, "
+            "cached_tokens INTEGER NOT NULL DEFAULT 0, latency_ms REAL NOT NULL, ttft_ms REAL, "
+            "streamed INTEGER NOT NULL DEFAULT 0, kb TEXT NOT NULL DEFAULT '', tools TEXT NOT NULL DEFAULT '', "
+            "status TEXT NOT NULL DEFAULT 'completed')"
+        )
+        conn.execute("INSERT INTO usage (created_at, model, latency_ms) VALUES (1.0, 'gpt-4o', 10.0)")
+    conn.close()
+
+    ledger = UsageLedger(path)
+    ledger.record(UsageRecord(model="gpt-4o", latency_ms=20.0, stalls=2))
+    assert [record.stalls for record in ledger.records()] == [0, 2]
+    assert ledger.summarize("model")[0].stalls == 2
+    ledger.close()
+
+
+def test_record_and_read_back(ledger: UsageLedger) -> None:
+    """Test that records round trip through the database."""
+    ledger.record(UsageRecord(model="gpt-4o-mini", prompt_tokens=10, completion_tokens=5, total_tokens=15))
+    ledger.record(UsageRecord(model="gpt-4o", tag="nightly", streamed=True, ttft_ms=120.0, kb="vs_1"))
+
+    records = list(ledger.records())
+    assert len(records) == 2
+    assert records[0].total_tokens == 15
+    assert records[1].streamed is True
+    assert records[1].kb == "vs_1"
+
+    assert [r.model for r in ledger.records(tag="nightly")] == ["gpt-4o"]
+    assert [r.model for r in ledger.records(model="gpt-4o-mini")] == ["gpt-4o-mini"]
+
+
+def test_summarize_by_model(ledger: UsageLedger) -> None:
+    """Test aggregation of latency and tokens per model."""
+    for latency in (100.0, 200.0, 300.0, 400.0):
+        ledger.record(UsageRecord(model="fast", latency_ms=latency, completion_tokens=50, total_tokens=60))
+    ledger.record(UsageRecord(model="slow", latency_ms=2000.0, completion_tokens=100, total_tokens=150))
+
+    summaries = {s.key: s for s in ledger.summarize("model")}
+    assert summaries["fast"].requests == 4
+    assert summaries["fast"].p50_latency_ms == 200.0
+    assert summaries["fast"].p95_latency_ms == 400.0
+    assert summaries["fast"].total_tokens == 240
+    # 200 completion tokens over one second of total latency
+    assert summaries["fast"].tokens_per_second == pytest.approx(200.0)
+    assert summaries["slow"].tokens_per_second == pytest.approx(50.0)
+
+
+def test_summarize_cache_hit_rate(ledger: UsageLedger) -> None:
+    """Test the share of prompt tokens served from the prompt cache."""
+    ledger.record(UsageRecord(model="cached", prompt_tokens=1000, cached_tokens=0))
+    ledger.record(UsageRecord(model="cached", prompt_tokens=1000, cached_tokens=500))
+    ledger.record(UsageRecord(model="empty"))
+
+    summaries = {s.key: s for s in ledger.summarize("model")}
+    assert summaries["cached"].cache_hit_rate == pytest.approx(0.25)
+    assert summaries["empty"].cache_hit_rate == 0.0
+
+
+def test_summarize_since_and_invalid_group(ledger: UsageLedger) -> None:
+    """Test filtering by time and rejecting unknown groupings."""
+    ledger.record(UsageRecord(model="old", created_at=time.time() - 10 * 86400))
+    ledger.record(UsageRecord(model="new"))
+
+    summaries = ledger.summarize("day", since=time.time() - 86400)
+    assert sum(s.requests for s in summaries) == 1
+
+    with pytest.raises(ValueError):
+        ledger.summarize("week")
+
+
+@pytest.mark.asyncio
+async def test_provider_records_usage(tmp_path: Path) -> None:
+    """Test that a non-streaming provider call is appended to the ledger."""
+    db_path = tmp_path / "usage.db"
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key", usage_db=db_path, usage_tag="job-1"))
+
+    provider.client = mock.AsyncMock()
+    mock_response = mock.Mock()
+    mock_response.output_text = "42"
+    mock_response.id = "resp_1"
+    mock_response.usage = mock.Mock(
+        input_tokens=12,
+        output_tokens=3,
+        total_tokens=15,
+        input_tokens_details=mock.Mock(cached_tokens=8),
+    )
+    mock_response.refusal = None
+    provider.client.responses.create.return_value = mock_response
+
+    response = await provider.respond("test prompt", vector_store_id="vs_abc")
+    assert response.usage is not None
+    assert response.usage.cached_tokens == 8
+    assert response.usage.cache_hit_rate == pytest.approx(8 / 12)
+    await provider.close()
+
+    records = list(UsageLedger(db_path).records())
+    assert len(records) == 1
+    assert records[0].response_id == "resp_1"
+    assert records[0].tag == "job-1"
+    assert records[0].prompt_tokens == 12
+    assert records[0].cached_tokens == 8
+    assert records[0].kb == "vs_abc"
+    assert records[0].tools == "file_search"
+    assert records[0].streamed is False
+
+
+def test_records_are_dated_when_the_request_started(tmp_path: Path) -> None:
+    """Test that a record's time is when its request was sent, not when it was written."""
+    db_path = tmp_path / "usage.db"
+    provider = OpenAIProvider(OpenAIConfig(api_key="test-key", usage_db=db_path))
+
+    provider._record_usage({"model": "gpt-4o"}, None, started=time.perf_counter() - 60)
+    assert provider.usage_ledger is not None
+    provider.usage_ledger.close()
+
+    (record,) = UsageLedger(db_path).records()
+    assert record.latency_ms == pytest.approx(60_000, abs=1000)
+    assert record.created_at == pytest.approx(time.time() - 60, abs=1)
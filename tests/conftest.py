@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 from pytest import Config, Item, Parser
 
 # Import fixtures to make them available to all tests
+from .fixtures.batch_fixtures import batch_server  # noqa: F401
 from .fixtures.cli_fixtures import cli_runner  # noqa: F401
 from .fixtures.openai_fixtures import (  # noqa: F401
     mock_openai_client,
@@ -0,0 +1,160 @@
+"""Local stand-in for the OpenAI Files and Batch APIs."""
+
+import json
+import threading
+import time
+from collections.abc import Generator
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+
+
+class BatchStandIn:
+    """In-memory state of the stand-in server.
+
+    Each request is answered with its input upper-cased. Inputs containing "fail"
+    produce an error file line, and output lines are written in reverse order to
+    check that results are returned in input order. A batch reports `in_progress`
+    the first `polls_until_done` times it is retrieved.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty state."""
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict[str, Any]] = {}
+        self.polls_until_done = 1
+        self.polls: dict[str, int] = {}
+
+    def create_file(self, content: bytes, purpose: str, filename: str) -> dict[str, Any]:
+        """Store an uploaded file."""
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, params: dict[str, Any]) -> dict[str, Any]:
+        """Create a batch and compute its output up front."""
+        batch_id = f"batch_{len(self.batches) + 1}"
+        requests = [json.loads(line) for line in self.files[params["input_file_id"]].decode().splitlines()]
+        outputs, errors = [], []
+        for request in requests:
+            text = request["body"]["input"]
+            if "fail" in text:
+                errors.append(
+                    {
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 400, "body": {"error": {"message": "Bad request"}}},
+                        "error": None,
+                    }
+                )
+                continue
+            output_text = json.dumps({"upper": text.upper()}) if "text" in request["body"] else text.upper()
+            body = {
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": output_text}]}],
+                "usage": {"input_tokens": 3, "output_tokens": 2, "total_tokens": 5},
+            }
+            outputs.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}})
+
+        output_file = self.create_file(
+            "".join(json.dumps(line) + "\n" for line in reversed(outputs)).encode(), "batch_output", "output.jsonl"
+        )
+        error_file = (
+            self.create_file("".join(json.dumps(line) + "\n" for line in errors).encode(), "batch_output", "err.jsonl")
+            if errors
+            else None
+        )
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": params["endpoint"],
+            "completion_window": params["completion_window"],
+            "input_file_id": params["input_file_id"],
+            "created_at": int(time.time()),
+            "metadata": params.get("metadata"),
+            "request_counts": {"total": len(requests), "completed": len(outputs), "failed": len(errors)},
+            "_output_file_id": output_file["id"],
+            "_error_file_id": error_file["id"] if error_file else None,
+        }
+        self.polls[batch_id] = 0
+        return self.get_batch(batch_id, poll=False)
+
+    def get_batch(self, batch_id: str, poll: bool = True) -> dict[str, Any]:
+        """Get a batch, completing it after enough polls."""
+        if poll:
+            self.polls[batch_id] += 1
+        stored = self.batches[batch_id]
+        done = self.polls[batch_id] > self.polls_until_done
+        batch = {key: value for key, value in stored.items() if not key.startswith("_")}
+        batch["status"] = "completed" if done else "in_progress"
+        if done:
+            batch["output_file_id"] = stored["_output_file_id"]
+            batch["error_file_id"] = stored["_error_file_id"]
+        return batch
+
+
+def _handler(state: BatchStandIn) -> type[BaseHTTPRequestHandler]:
+    """Create a request handler bound to the stand-in state."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path == "/v1/files":
+                header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+                message = BytesParser(policy=HTTP).parsebytes(header + body)
+                parts = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+                upload = parts["file"]
+                result = state.create_file(
+                    upload.get_payload(decode=True),
+                    parts["purpose"].get_payload(decode=True).decode(),
+                    upload.get_filename() or "upload.jsonl",
+                )
+            elif self.path == "/v1/batches":
+                result = state.create_batch(json.loads(body))
+            else:
+                self._send(404, b"{}")
+                return
+            self._send(200, json.dumps(result).encode())
+
+        def do_GET(self) -> None:
+            if self.path.startswith("/v1/batches/"):
+                self._send(200, json.dumps(state.get_batch(self.path.rsplit("/", 1)[1])).encode())
+            elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+                self._send(200, state.files[self.path.split("/")[3]], "application/octet-stream")
+            else:
+                self._send(404, b"{}")
+
+    return Handler
+
+
+@pytest.fixture
+def batch_server() -> Generator[tuple[str, BatchStandIn], None, None]:
+    """Run the stand-in server and return its base URL and state."""
+    state = BatchStandIn()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1", state
+    finally:
+        server.shutdown()
+        server.server_close()